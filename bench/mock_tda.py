@@ -0,0 +1,500 @@
+"""Local stand-in for the TDAmeritrade REST API.
+
+Serves the endpoints used by the integration with generated data, and can
+add latency and inject 429 and 5xx responses.  Run it on its own with
+
+    python -m bench.mock_tda --accounts 3 --symbols 50 --port 8080
+"""
+import argparse
+import asyncio
+import random
+import re
+import time
+
+from collections import Counter
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+from aiohttp import web
+
+EASTERN = ZoneInfo("America/New_York")
+
+
+def _symbol(index):
+    """Return a generated ticker symbol."""
+    letters = ""
+    index += 26
+    while index:
+        index, rem = divmod(index, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+class MockTDA:
+    """An aiohttp server that answers like the TDA API."""
+
+    def __init__(
+        self,
+        accounts=1,
+        symbols=10,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        throttle_rate=0.0,
+        always_open=False,
+        fill_after=2.0,
+        seed=None,
+    ):
+        """Initialize the mock API."""
+        self.account_ids = [str(100000000 + i) for i in range(accounts)]
+        self.symbols = [_symbol(i) for i in range(symbols)]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.always_open = always_open
+        self.fill_after = fill_after
+        self.counts = Counter()
+        self.statuses = Counter()
+        self.orders = {}
+        self._random = random.Random(seed)
+        self._order_id = 1000
+        self._runner = None
+        self._routes = [
+            ("GET", r"/accounts", self._accounts),
+            ("GET", r"/accounts/watchlists", self._watchlists),
+            ("GET", r"/accounts/(?P<account_id>\d+)/watchlists", self._watchlists),
+            ("GET", r"/accounts/(?P<account_id>\d+)", self._account),
+            ("GET", r"/accounts/(?P<account_id>\d+)/orders", self._orders),
+            ("POST", r"/accounts/(?P<account_id>\d+)/orders", self._place_order),
+            (
+                "GET",
+                r"/accounts/(?P<account_id>\d+)/orders/(?P<order_id>\d+)",
+                self._order,
+            ),
+            ("GET", r"/marketdata/quotes", self._quotes),
+            ("GET", r"/marketdata/chains", self._chains),
+            ("GET", r"/marketdata/(?P<market>[A-Z_]+)/hours", self._hours),
+            ("GET", r"/marketdata/(?P<index>\$[A-Z.]+)/movers", self._movers),
+            ("GET", r"/marketdata/(?P<symbol>[A-Z.$]+)/quotes", self._quote),
+            (
+                "GET",
+                r"/marketdata/(?P<symbol>[A-Z.$]+)/pricehistory",
+                self._price_history,
+            ),
+            ("GET", r"/userprincipals", self._user_principals),
+            ("POST", r"/oauth2/token", self._token),
+        ]
+
+    @property
+    def total_requests(self):
+        """Return the number of requests served."""
+        return sum(self.counts.values())
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start serving, returning the base URL."""
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self._dispatch)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self):
+        """Stop serving."""
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _dispatch(self, request):
+        """Route a request, collapsing the double slashes the client sends."""
+        path = re.sub("/+", "/", request.path)
+        if path.startswith("/v1/"):
+            path = path[3:]
+        for method, pattern, handler in self._routes:
+            match = re.fullmatch(pattern, path)
+            if match and method == request.method:
+                name = f"{method} {pattern}"
+                self.counts[name] += 1
+                resp = await self._inject(request)
+                if resp is None:
+                    resp = await handler(request, **match.groupdict())
+                self.statuses[resp.status] += 1
+                return resp
+        self.statuses[404] += 1
+        return web.json_response({"error": f"No route for {path}"}, status=404)
+
+    async def _inject(self, request):
+        """Add latency and return an injected error response, if any."""
+        delay = self.latency + self._random.random() * self.jitter
+        if delay:
+            await asyncio.sleep(delay)
+        if self._random.random() < self.throttle_rate:
+            return web.json_response({"error": "Too many requests"}, status=429)
+        if self._random.random() < self.error_rate:
+            return web.json_response({"error": "Service unavailable"}, status=503)
+        return None
+
+    @staticmethod
+    def base_price(symbol):
+        """Return the price a symbol moves around, its previous close."""
+        return 20 + (sum(map(ord, symbol)) % 400)
+
+    def _price(self, symbol):
+        """Return a slowly moving price for a symbol."""
+        base = self.base_price(symbol)
+        return round(base * (1 + 0.01 * self._random.uniform(-1, 1)), 2)
+
+    def _account_body(self, account_id, positions):
+        """Return an account response."""
+        index = self.account_ids.index(account_id)
+        held = self.symbols[index::len(self.account_ids)][:20]
+        account = {
+            "type": "MARGIN" if index % 2 else "CASH",
+            "accountId": account_id,
+            "roundTrips": 0,
+            "isDayTrader": False,
+            "isClosingOnlyRestricted": False,
+            "currentBalances": {
+                "availableFunds": 1000.0 + index,
+                "cashAvailableForTrading": 1000.0 + index,
+                "cashBalance": 1000.0 + index,
+                "buyingPower": 2000.0 + index,
+                "liquidationValue": 10000.0 + index,
+                "longMarketValue": 9000.0 + index,
+            },
+        }
+        if positions:
+            account["positions"] = []
+            for symbol in held:
+                price = self._price(symbol)
+                account["positions"].append(
+                    {
+                        "shortQuantity": 0,
+                        "averagePrice": round(price * 0.9, 2),
+                        "currentDayProfitLoss": round(price * 0.01, 2),
+                        "longQuantity": 10,
+                        "instrument": {"assetType": "EQUITY", "symbol": symbol},
+                        "marketValue": round(price * 10, 2),
+                    }
+                )
+        return {"securitiesAccount": account}
+
+    async def _accounts(self, request):
+        """Return every account."""
+        positions = request.query.get("fields") == "positions"
+        return web.json_response(
+            [self._account_body(account_id, positions) for account_id in self.account_ids]
+        )
+
+    async def _account(self, request, account_id):
+        """Return one account."""
+        if account_id not in self.account_ids:
+            return web.json_response({"error": "Not found"}, status=404)
+        positions = request.query.get("fields") == "positions"
+        return web.json_response(self._account_body(account_id, positions))
+
+    async def _watchlists(self, request, account_id=None):
+        """Return a watchlist of 10 symbols per account, overlapping the next."""
+        account_ids = [account_id] if account_id else self.account_ids
+        if account_id not in self.account_ids + [None]:
+            return web.json_response({"error": "Not found"}, status=404)
+        watchlists = []
+        for account_id in account_ids:
+            start = 10 + 5 * self.account_ids.index(account_id)
+            watchlists.append(
+                {
+                    "name": f"Watchlist {account_id[-4:]}",
+                    "watchlistId": account_id[-4:],
+                    "accountId": account_id,
+                    "watchlistItems": [
+                        {"instrument": {"symbol": symbol, "assetType": "EQUITY"}}
+                        for symbol in self.symbols[start : start + 10]
+                    ],
+                }
+            )
+        return web.json_response(watchlists)
+
+    async def _movers(self, request, index):
+        """Return 10 random symbols per direction, so movers change each call."""
+        directions = ["up", "down"]
+        if "direction" in request.query:
+            directions = [request.query["direction"]]
+        movers = []
+        for direction in directions:
+            for symbol in self._random.sample(self.symbols, min(10, len(self.symbols))):
+                price = self._price(symbol)
+                change = price / self.base_price(symbol) - 1
+                movers.append(
+                    {
+                        "symbol": symbol,
+                        "description": f"{symbol} Inc",
+                        "direction": direction,
+                        "change": round(change, 4),
+                        "last": price,
+                        "totalVolume": 1000,
+                    }
+                )
+        return web.json_response(movers)
+
+    async def _orders(self, request, account_id):
+        """Return the orders of an account."""
+        return web.json_response(
+            [
+                self._order_body(order)
+                for order in self.orders.values()
+                if order["accountId"] == account_id
+            ]
+        )
+
+    async def _order(self, request, account_id, order_id):
+        """Return one order."""
+        order = self.orders.get(int(order_id))
+        if order is None:
+            return web.json_response({"error": "Not found"}, status=404)
+        return web.json_response(self._order_body(order))
+
+    def _order_body(self, order):
+        """Return an order, filled once it is fill_after seconds old."""
+        filled = time.monotonic() - order["placed"] >= self.fill_after
+        quantity = order["orderLegCollection"][0]["quantity"]
+        body = {key: value for key, value in order.items() if key != "placed"}
+        body["status"] = "FILLED" if filled else "WORKING"
+        body["filledQuantity"] = quantity if filled else 0
+        body["remainingQuantity"] = 0 if filled else quantity
+        return body
+
+    async def _place_order(self, request, account_id):
+        """Accept an order and return its location."""
+        body = await request.json()
+        self._order_id += 1
+        self.orders[self._order_id] = {
+            **body,
+            "accountId": account_id,
+            "orderId": self._order_id,
+            "placed": time.monotonic(),
+            "enteredTime": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S+0000"),
+        }
+        return web.Response(
+            status=201,
+            headers={"Location": f"/v1/accounts/{account_id}/orders/{self._order_id}"},
+        )
+
+    async def _quotes(self, request):
+        """Return quotes for a comma separated list of symbols."""
+        symbols = [x for x in request.query.get("symbol", "").split(",") if x]
+        return web.json_response({symbol: self._quote_body(symbol) for symbol in symbols})
+
+    async def _quote(self, request, symbol):
+        """Return a quote for one symbol."""
+        return web.json_response({symbol: self._quote_body(symbol)})
+
+    def _quote_body(self, symbol):
+        """Return a quote response for a symbol."""
+        price = self._price(symbol)
+        half_spread = self._random.choice([0.01, 0.01, 0.02, 0.05])
+        return {
+            "assetType": "EQUITY",
+            "symbol": symbol,
+            "bidPrice": round(price - half_spread, 2),
+            "askPrice": round(price + half_spread, 2),
+            "lastPrice": price,
+            "openPrice": price,
+            "highPrice": price,
+            "lowPrice": price,
+            "closePrice": self.base_price(symbol),
+            "netChange": 0.0,
+            "totalVolume": 1000,
+            "quoteTimeInLong": int(time.time() * 1000),
+        }
+
+    async def _price_history(self, request, symbol):
+        """Return candles between startDate and endDate."""
+        step = {
+            "minute": 60 * 1000,
+            "daily": 86400 * 1000,
+            "weekly": 7 * 86400 * 1000,
+            "monthly": 30 * 86400 * 1000,
+        }[request.query.get("frequencyType", "minute")]
+        step *= int(request.query.get("frequency", 1))
+        end = int(request.query.get("endDate", time.time() * 1000))
+        start = int(request.query.get("startDate", end - 10 * step))
+        candles = []
+        for stamp in range(start - start % step, end, step):
+            price = self._price(symbol)
+            candles.append(
+                {
+                    "open": price,
+                    "high": round(price * 1.01, 2),
+                    "low": round(price * 0.99, 2),
+                    "close": price,
+                    "volume": 1000,
+                    "datetime": stamp,
+                }
+            )
+        return web.json_response({"symbol": symbol, "empty": not candles, "candles": candles})
+
+    async def _chains(self, request):
+        """Return an option chain with weekly expirations around the price."""
+        symbol = request.query["symbol"]
+        price = self._price(symbol)
+        contract_type = request.query.get("contractType", "ALL")
+        strike_count = int(request.query.get("strikeCount", 20))
+        today = datetime.now(EASTERN).date()
+        expirations = [
+            today + timedelta(days=(4 - today.weekday()) % 7 + 7 * week) for week in range(8)
+        ]
+        if "fromDate" in request.query:
+            start = datetime.strptime(request.query["fromDate"], "%Y-%m-%d").date()
+            expirations = [x for x in expirations if x >= start]
+        if "toDate" in request.query:
+            end = datetime.strptime(request.query["toDate"], "%Y-%m-%d").date()
+            expirations = [x for x in expirations if x <= end]
+        step = 5 if price > 100 else 1
+        atm = round(price / step) * step
+        strikes = [atm + step * i for i in range(-(strike_count // 2), strike_count - strike_count // 2)]
+        if "strike" in request.query:
+            strikes = [float(request.query["strike"])]
+
+        def exp_map(put_call):
+            result = {}
+            for expiration in expirations:
+                days = (expiration - today).days
+                key = f"{expiration.isoformat()}:{days}"
+                result[key] = {}
+                for strike in strikes:
+                    intrinsic = max(0, price - strike) if put_call == "CALL" else max(0, strike - price)
+                    mark = round(intrinsic + 0.5 + days * 0.05, 2)
+                    result[key][f"{float(strike):.1f}"] = [
+                        {
+                            "putCall": put_call,
+                            "symbol": f"{symbol}_{expiration:%m%d%y}{put_call[0]}{strike:g}",
+                            "bid": round(mark - 0.05, 2),
+                            "ask": round(mark + 0.05, 2),
+                            "last": mark,
+                            "mark": mark,
+                            "totalVolume": 100,
+                            "openInterest": 1000,
+                            "volatility": 25.0,
+                            "delta": 0.5 if put_call == "CALL" else -0.5,
+                            "gamma": 0.05,
+                            "theta": -0.02,
+                            "vega": 0.1,
+                            "rho": "NaN",
+                            "strikePrice": float(strike),
+                            "expirationDate": int(
+                                datetime.combine(expiration, dt_time(16, 0), EASTERN).timestamp()
+                                * 1000
+                            ),
+                            "daysToExpiration": days,
+                        }
+                    ]
+            return result
+
+        body = {"symbol": symbol, "status": "SUCCESS", "underlyingPrice": price}
+        body["callExpDateMap"] = exp_map("CALL") if contract_type in ("ALL", "CALL") else {}
+        body["putExpDateMap"] = exp_map("PUT") if contract_type in ("ALL", "PUT") else {}
+        return web.json_response(body)
+
+    async def _hours(self, request, market):
+        """Return the session hours for today."""
+        now = datetime.now(EASTERN)
+        day = now.date()
+        if self.always_open:
+            sessions = {
+                "preMarket": (now - timedelta(hours=6), now - timedelta(hours=4)),
+                "regularMarket": (now - timedelta(hours=4), now + timedelta(hours=4)),
+                "postMarket": (now + timedelta(hours=4), now + timedelta(hours=6)),
+            }
+        elif day.weekday() >= 5:
+            return web.json_response(
+                {"equity": {"equity": {"date": day.isoformat(), "isOpen": False}}}
+            )
+        else:
+
+            def at(hour, minute):
+                return datetime.combine(day, dt_time(hour, minute), EASTERN)
+
+            sessions = {
+                "preMarket": (at(7, 0), at(9, 30)),
+                "regularMarket": (at(9, 30), at(16, 0)),
+                "postMarket": (at(16, 0), at(20, 0)),
+            }
+        return web.json_response(
+            {
+                "equity": {
+                    "EQ": {
+                        "date": day.isoformat(),
+                        "marketType": market,
+                        "isOpen": True,
+                        "sessionHours": {
+                            name: [{"start": start.isoformat(), "end": end.isoformat()}]
+                            for name, (start, end) in sessions.items()
+                        },
+                    }
+                }
+            }
+        )
+
+    async def _user_principals(self, request):
+        """Return the user principals."""
+        return web.json_response(
+            {
+                "accounts": [{"accountId": account_id} for account_id in self.account_ids],
+                "streamerInfo": {},
+            }
+        )
+
+    async def _token(self, request):
+        """Return a new access token."""
+        return web.json_response(
+            {
+                "access_token": f"mock-access-{time.time()}",
+                "refresh_token": "mock-refresh",
+                "token_type": "Bearer",
+                "expires_in": 1800,
+                "scope": "PlaceTrades AccountAccess MoveMoney",
+            }
+        )
+
+
+async def _serve(args):
+    """Run the mock until interrupted."""
+    mock = MockTDA(
+        accounts=args.accounts,
+        symbols=args.symbols,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        always_open=args.always_open,
+    )
+    url = await mock.start(port=args.port)
+    print(f"Mock TDA API listening on {url}")
+    print(f"Accounts: {', '.join(mock.account_ids)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await mock.stop()
+
+
+def add_arguments(parser):
+    """Add the mock options to an argument parser."""
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--always-open", action="store_true")
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(PARSER)
+    PARSER.add_argument("--port", type=int, default=8080)
+    try:
+        asyncio.run(_serve(PARSER.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,377 @@
+"""Benchmark the TDAmeritrade integration against the local mock API.
+
+Boots a bare Home Assistant instance, sets up a config entry through
+async_setup_entry pointed at bench.mock_tda, drives account refreshes and
+get_quote calls for a while and reports request counts, update latency and
+event loop lag.  Needs homeassistant installed, run from the repo root with
+
+    python -m bench.run_bench --accounts 12 --symbols 200 --duration 60
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+from bench.mock_tda import EASTERN, MockTDA, add_arguments
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAIN = "tdameritrade"
+
+
+def percentile(values, pct):
+    """Return the pct percentile of values."""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summary(values, scale=1000):
+    """Format the p50/p99/max of a list of seconds as milliseconds."""
+    return (
+        f"n={len(values):<6} p50={percentile(values, 50) * scale:8.2f}ms "
+        f"p99={percentile(values, 99) * scale:8.2f}ms "
+        f"max={max(values, default=float('nan')) * scale:8.2f}ms"
+    )
+
+
+async def monitor_loop_lag(samples, interval=0.05):
+    """Record how late the event loop wakes a sleeping task."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
+
+
+async def start_hass(config_dir):
+    """Return a minimal running Home Assistant instance."""
+    # pylint: disable=import-outside-toplevel
+    from homeassistant import bootstrap, config_entries, core, loader
+
+    try:
+        hass = core.HomeAssistant(config_dir)
+    except TypeError:
+        hass = core.HomeAssistant()
+        hass.config.config_dir = config_dir
+    hass.config.skip_pip = True
+    hass.config.set_time_zone("America/New_York")
+    if hasattr(loader, "async_setup"):
+        loader.async_setup(hass)
+    await bootstrap.load_registries(hass)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    # The manifest depends on http for the OAuth callback, which the
+    # benchmark never uses.
+    hass.config.components.add("http")
+    await hass.async_start()
+    return hass
+
+
+async def run(args):
+    """Run the benchmark and print the report."""
+    # pylint: disable=import-outside-toplevel
+    from homeassistant import config_entries
+
+    mock = MockTDA(
+        accounts=args.accounts,
+        symbols=args.symbols,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        always_open=args.always_open,
+        seed=1,
+    )
+    url = await mock.start()
+
+    config_dir = tempfile.mkdtemp(prefix="tda-bench-")
+    os.symlink(
+        os.path.join(REPO_ROOT, "custom_components"),
+        os.path.join(config_dir, "custom_components"),
+    )
+    sys.path.insert(0, config_dir)
+
+    from custom_components import tdameritrade
+    from custom_components.tdameritrade import api, const, streamer
+
+    # Point the integration at the mock instead of api.tdameritrade.com.
+    api.TDA_URL = const.TDA_URL = url
+    tdameritrade.OAUTH2_TOKEN = const.OAUTH2_TOKEN = f"{url}/oauth2/token"
+    # The mock has no streamer, watchlist quotes come from get_quote calls.
+    streamer.QuoteStreamer.async_start = lambda self: None
+
+    lag = []
+    lag_task = asyncio.create_task(monitor_loop_lag(lag))
+    hass = await start_hass(config_dir)
+
+    today = datetime.now(EASTERN).date()
+    option_expiry = today + timedelta(days=(4 - today.weekday()) % 7)
+    option_strike = round(20 + sum(map(ord, mock.symbols[0])) % 400)
+    options = {
+        "debug_sensors": True,
+        "watchlist": mock.symbols[:10],
+        "import_watchlists": args.import_watchlists,
+        "movers": ["$SPX.X:up", "$COMPX"] if args.import_watchlists else [],
+        "quote_threshold": args.quote_threshold,
+        "alerts": [
+            f"{symbol}:{alert}"
+            for symbol in mock.symbols[:10]
+            for alert in (
+                f"above:{mock.base_price(symbol)}",
+                f"below:{mock.base_price(symbol)}",
+                "move:0.5%",
+                "spread:0.05",
+            )
+        ],
+        "option_contracts": [f"{mock.symbols[0]}_{option_expiry:%m%d%y}C{option_strike:g}"],
+        "price_history": [f"{symbol}:5min" for symbol in mock.symbols[:5]],
+        "indicators": [
+            f"{symbol}:5min:{indicator}"
+            for symbol in mock.symbols[:5]
+            for indicator in ("sma", "ema", "rsi", "vwap", "bollinger", "atr")
+        ],
+    }
+    # Split the accounts between logins, market data options go to the first.
+    entries = [
+        config_entries.ConfigEntry(
+            version=1,
+            domain=DOMAIN,
+            title="TDAmeritrade",
+            data={
+                "auth_implementation": DOMAIN,
+                "consumer_key": "BENCH@AMER.OAUTHAP",
+                "accounts": mock.account_ids[login :: args.logins],
+                "token": {
+                    "access_token": "mock-access",
+                    "refresh_token": "mock-refresh",
+                    "token_type": "Bearer",
+                    "expires_in": 1800,
+                    "expires_at": time.time() + 1800,
+                },
+            },
+            source=config_entries.SOURCE_USER,
+            options=options if login == 0 else {},
+        )
+        for login in range(args.logins)
+    ]
+    entry = entries[0]
+    setup_start = time.monotonic()
+    for config_entry in entries:
+        await hass.config_entries.async_add(config_entry)
+    await hass.async_block_till_done()
+    setup_time = time.monotonic() - setup_start
+    setup_requests = mock.total_requests
+
+    quote_writes = []
+    hass.bus.async_listen(
+        "state_changed",
+        lambda event: quote_writes.append(event.data["entity_id"])
+        if event.data["entity_id"].endswith("_quote")
+        else None,
+    )
+    order_events = []
+    hass.bus.async_listen(
+        const.EVENT_ORDER_UPDATED, lambda event: order_events.append(event.data)
+    )
+    if args.orders:
+        await hass.services.async_call(
+            DOMAIN,
+            "place_orders",
+            {
+                "orders": [
+                    {
+                        "symbol": mock.symbols[i % len(mock.symbols)],
+                        "instruction": "BUY",
+                        "quantity": 1,
+                        "price": 10,
+                        "account_id": mock.account_ids[i % len(mock.account_ids)],
+                    }
+                    for i in range(args.orders)
+                ]
+            },
+            blocking=True,
+        )
+
+    coordinators = [
+        hass.data[DOMAIN][config_entry.entry_id][const.COORDINATOR]
+        for config_entry in entries
+    ]
+    refresh_latency = []
+    quote_latency = []
+    failures = 0
+    deadline = time.monotonic() + args.duration
+
+    async def refresh_accounts():
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            await asyncio.gather(
+                *[coordinator.async_refresh() for coordinator in coordinators]
+            )
+            refresh_latency.append(time.monotonic() - start)
+            await asyncio.sleep(args.refresh_interval)
+
+    imported_added = []
+    imported_removed = []
+
+    def count_quote_sensors(event):
+        if not event.data["entity_id"].endswith("_quote"):
+            return
+        if event.data["new_state"] is None:
+            imported_removed.append(event.data["entity_id"])
+        elif event.data["old_state"] is None:
+            imported_added.append(event.data["entity_id"])
+
+    hass.bus.async_listen("state_changed", count_quote_sensors)
+    import_coordinator = hass.data[DOMAIN][entry.entry_id][const.IMPORT_COORDINATOR]
+
+    async def refresh_imported():
+        while args.import_watchlists and time.monotonic() < deadline:
+            await import_coordinator.async_refresh()
+            await asyncio.sleep(args.import_interval)
+
+    async def refresh_quotes():
+        nonlocal failures
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                await hass.services.async_call(
+                    DOMAIN, "get_quote", {"symbol": mock.symbols}, blocking=True
+                )
+            except Exception:  # pylint: disable=broad-except
+                failures += 1
+            quote_latency.append(time.monotonic() - start)
+            await asyncio.sleep(args.quote_interval)
+
+    await asyncio.gather(refresh_accounts(), refresh_quotes(), refresh_imported())
+    await hass.async_block_till_done()
+    lag_task.cancel()
+
+    limiter = hass.data[DOMAIN][entry.entry_id][const.LIMITER]
+    print(
+        f"Accounts: {args.accounts}, logins: {args.logins}, symbols: {args.symbols}, "
+        f"duration: {args.duration}s"
+    )
+    print(f"Setup: {setup_time * 1000:.1f}ms, {setup_requests} requests")
+    print(f"Account refresh  {summary(refresh_latency)}")
+    print(f"get_quote call   {summary(quote_latency)} failures={failures}")
+    print(f"Event loop lag   {summary(lag)}")
+    print(f"Entities: {len(hass.states.async_all())}")
+    print(
+        f"Quote sensor writes: {len(quote_writes)} for {len(quote_latency)} get_quote "
+        f"calls of {len(options['watchlist'])} watched symbols"
+    )
+    if args.import_watchlists:
+        print(
+            f"Imported symbols: {len(import_coordinator.data or {})} now, "
+            f"{len(imported_added)} quote sensors added, {len(imported_removed)} removed"
+        )
+    alert_engine = hass.data[DOMAIN][entry.entry_id][const.ALERT_ENGINE]
+    print(f"Alerts: {len(options['alerts'])} configured, {alert_engine.fired} fired")
+    portfolio = hass.data[DOMAIN][entry.entry_id][const.PORTFOLIO]
+    print(
+        f"Portfolio: {', '.join(f'{key}={value:.2f}' for key, value in portfolio.totals.items())}"
+    )
+    history_events = []
+    hass.bus.async_listen(
+        const.EVENT_HISTORY, lambda event: history_events.append(event.data)
+    )
+    await hass.data[DOMAIN][const.TIMESERIES].async_flush()
+    start = time.monotonic()
+    await hass.services.async_call(
+        DOMAIN,
+        "get_history",
+        {"series": [mock.symbols[0], f"{mock.account_ids[0]}_liquidation_value"]},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    print(
+        "Time series: "
+        + ", ".join(
+            f"{result['series']} {len(result['points'])} {result['resolution']} points"
+            for result in history_events[0]["results"]
+        )
+        + f" in {(time.monotonic() - start) * 1000:.1f}ms"
+    )
+    history = hass.data[DOMAIN][entry.entry_id][const.HISTORY_COORDINATOR]
+    print(f"Price history series: {len(history.data or {})}")
+    engine = hass.data[DOMAIN][entry.entry_id][const.INDICATOR_ENGINE]
+    chain_events = []
+    hass.bus.async_listen(
+        const.EVENT_OPTION_CONTRACTS, lambda event: chain_events.append(event.data)
+    )
+    start = time.monotonic()
+    await hass.services.async_call(
+        DOMAIN, "get_option_chain", {"symbol": mock.symbols[0]}, blocking=True
+    )
+    await hass.services.async_call(
+        DOMAIN,
+        "get_option_contracts",
+        {"symbol": mock.symbols[0], "contract_type": "PUT", "expiration": option_expiry},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    chain = hass.data[DOMAIN][entry.entry_id][const.OPTION_CHAINS].chain(mock.symbols[0])
+    print(
+        f"Option chain: {len(chain)} contracts, {chain.contracts.nbytes} bytes, "
+        f"{len(chain_events[0]['contracts'])} puts queried in "
+        f"{(time.monotonic() - start) * 1000:.1f}ms"
+    )
+    option = hass.states.get(
+        f"sensor.{mock.symbols[0].lower()}_{option_expiry:%m%d%y}c{option_strike:g}_option"
+    )
+    print(f"Option sensor: {option.state if option else None}")
+    print(f"Indicators: {sum(1 for value in engine.values.values() if value[0] is not None)}")
+    if args.orders:
+        filled = sum(1 for event in order_events if event["status"] == "FILLED")
+        print(f"Orders: {args.orders} placed, {len(order_events)} updates, {filled} filled")
+    print(f"Requests: {mock.total_requests} total, status codes {dict(mock.statuses)}")
+    for name, count in mock.counts.most_common():
+        print(f"  {count:6d}  {name}")
+    print(f"Limiter: {limiter.metrics}")
+    client = hass.data[DOMAIN][entry.entry_id][const.CLIENT]
+    for name, metrics in client.metrics.as_dict().items():
+        print(
+            f"  {name:20s} calls={metrics['calls']:<5d} requests={metrics['requests']:<5d} "
+            f"retries={metrics['retries']:<4d} "
+            f"errors={metrics['errors']:<3d} throttled={metrics['throttled']:<3d} "
+            f"p50<={metrics['p50_latency']}s p95<={metrics['p95_latency']}s"
+        )
+
+    await hass.async_stop()
+    await mock.stop()
+
+
+def main():
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--orders", type=int, default=0, help="orders to place at the start")
+    parser.add_argument(
+        "--quote-threshold", default="0", help="quote sensor threshold, e.g. 0.1%%"
+    )
+    parser.add_argument("--logins", type=int, default=1, help="config entries to set up")
+    parser.add_argument(
+        "--import-watchlists",
+        action="store_true",
+        help="import the watchlists and movers as quote sensors",
+    )
+    parser.add_argument(
+        "--import-interval", type=float, default=5.0, help="seconds between imports"
+    )
+    parser.add_argument(
+        "--refresh-interval", type=float, default=1.0, help="seconds between account refreshes"
+    )
+    parser.add_argument(
+        "--quote-interval", type=float, default=1.0, help="seconds between get_quote calls"
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,45 @@
 """The TDAmeritrade integration."""
 import asyncio
 import logging
+import random
+
+from datetime import timedelta
 
 import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry, ConfigEntryState
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_STARTED
+from homeassistant.core import CoreState, HomeAssistant, callback
 from homeassistant.helpers import (
     aiohttp_client,
     config_entry_oauth2_flow,
     config_validation as cv,
 )
-
-from tdameritrade_api import AmeritradeAPI
+from homeassistant.helpers.event import async_call_later
 
 from . import api, config_flow
+from .alerts import AlertEngine, parse_alert_option
+from .chains import OptionChainStore
+from .coordinator import (
+    AccountsCoordinator,
+    ImportedQuotesCoordinator,
+    ImportedSymbolsCoordinator,
+    OptionContractsCoordinator,
+    PriceHistoryCoordinator,
+)
+from .history import PriceHistoryStore, parse_history_option
+from .indicators import IndicatorEngine, parse_indicator_option
+from .cache import QuoteCache
+from .market import MarketHours
+from .portfolio import PortfolioAggregator
+from .quotes import QuoteStateWriter
+from .scheduler import ScanScheduler
+from .services import async_setup_services
+from .limiter import RequestLimiter
+from .orders import OrderSubmitter, OrderTracker
+from .streamer import QuoteStreamer
+from .timeseries import TimeSeriesRecorder, TimeSeriesStore
+from .watchlists import parse_movers_option
 
 from .const import (
     DOMAIN,
@@ -22,6 +47,51 @@ from .const import (
     OAUTH2_AUTHORIZE,
     OAUTH2_TOKEN,
     CONF_ACCOUNTS,
+    CONF_WATCHLIST,
+    CONF_QUOTE_TTL_OPEN,
+    CONF_QUOTE_TTL_CLOSED,
+    DEFAULT_QUOTE_TTL_OPEN,
+    DEFAULT_QUOTE_TTL_CLOSED,
+    CLIENT,
+    COORDINATOR,
+    MARKET_HOURS,
+    STREAMER,
+    LIMITER,
+    QUOTE_CACHE,
+    QUOTE_STATES,
+    CONF_QUOTE_FIELD,
+    CONF_QUOTE_THRESHOLD,
+    CONF_QUOTE_ATTRIBUTE_INTERVAL,
+    DEFAULT_QUOTE_FIELD,
+    DEFAULT_QUOTE_THRESHOLD,
+    DEFAULT_QUOTE_ATTRIBUTE_INTERVAL,
+    OPTIONS,
+    ORDER_SUBMITTER,
+    ORDER_TRACKER,
+    SCHEDULER,
+    CONF_PRICE_HISTORY,
+    CONF_INDICATORS,
+    CONF_STALE_GRACE_PERIOD,
+    CONF_OPTION_CONTRACTS,
+    DEFAULT_STALE_GRACE_PERIOD,
+    PRICE_HISTORY,
+    HISTORY_COORDINATOR,
+    INDICATOR_ENGINE,
+    STARTUP,
+    OPTION_CHAINS,
+    OPTION_COORDINATOR,
+    UNIQUE_ID_SUFFIX,
+    PORTFOLIO,
+    TIMESERIES,
+    TIMESERIES_RECORDER,
+    CONF_ALERTS,
+    ALERT_ENGINE,
+    CONF_IMPORT_WATCHLISTS,
+    CONF_MOVERS,
+    IMPORT_COORDINATOR,
+    IMPORT_QUOTES_COORDINATOR,
+    STARTUP_DELAY,
+    STARTUP_HISTORY_DELAY,
 )
 
 CONFIG_SCHEMA = vol.Schema(
@@ -43,7 +113,10 @@ _LOGGER = logging.getLogger(__name__)
 
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the TDAmeritrade component."""
-    hass.data[DOMAIN] = {}
+    # Every login shares one rate budget.
+    hass.data[DOMAIN] = {LIMITER: RequestLimiter(), TIMESERIES: TimeSeriesStore(hass)}
+    hass.data[DOMAIN][TIMESERIES].async_start()
+    async_setup_services(hass)
 
     if DOMAIN not in config:
         return True
@@ -58,7 +131,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         hass,
         config_entry_oauth2_flow.LocalOAuth2Implementation(
             hass,
-            entry.domain,
+            entry.data["auth_implementation"],
             entry.data["consumer_key"],
             None,
             OAUTH2_AUTHORIZE,
@@ -78,58 +151,160 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         aiohttp_client.async_get_clientsession(hass), session
     )
 
-    client = AmeritradeAPI(auth)
-
-    async def place_order_service(call):
-        """Handle a place trade service call."""
-
-        price = call.data["price"]
-        instruction = call.data["instruction"]
-        quantity = call.data["quantity"]
-        symbol = call.data["symbol"]
-        account_id = call.data["account_id"]
-        order_type = call.data["order_type"]
-        session = call.data["session"]
-        duration = call.data["duration"]
-        order_strategy_type = call.data["orderStrategyType"]
-        asset_type = call.data["assetType"]
-
-        return await client.async_place_order(
-            price,
-            instruction,
-            quantity,
-            symbol,
-            account_id,
-            order_type=order_type,
-            session=session,
-            duration=duration,
-            orderStrategyType=order_strategy_type,
-            assetType=asset_type,
-        )
-
-    async def get_quote_service(call):
-        """Handle a place trade service call."""
-        symbol = call.data["symbol"]
-        res = await client.async_get_quote(ticker=symbol)
-
-        hass.states.async_set(
-            f"get_quote_service.{symbol}",
-            res[symbol]["lastPrice"],
-            attributes=res[symbol],
-        )
-
-        return True
-
-    _LOGGER.debug("Registering Services")
-    hass.services.async_register(DOMAIN, "place_order", place_order_service)
-    hass.services.async_register(DOMAIN, "get_quote", get_quote_service)
+    auth.async_schedule_refresh()
+    client = api.TDAmeritradeAPI(auth, hass.data[DOMAIN][LIMITER])
+    grace_period = entry.options.get(
+        CONF_STALE_GRACE_PERIOD, DEFAULT_STALE_GRACE_PERIOD
+    )
+    coordinator = AccountsCoordinator(
+        hass, client, entry.data[CONF_ACCOUNTS], grace_period
+    )
+    market_hours = MarketHours(hass, client)
+    await market_hours.async_restore()
+    quote_cache = QuoteCache(
+        client,
+        market_hours,
+        entry.options.get(CONF_QUOTE_TTL_OPEN, DEFAULT_QUOTE_TTL_OPEN),
+        entry.options.get(CONF_QUOTE_TTL_CLOSED, DEFAULT_QUOTE_TTL_CLOSED),
+    )
+    portfolio = PortfolioAggregator(hass, coordinator, entry.entry_id)
+    portfolio.async_start()
+    order_tracker = OrderTracker(hass, client)
+    order_submitter = OrderSubmitter(client, order_tracker)
+    scheduler = ScanScheduler(hass, coordinator, market_hours)
+    price_history = PriceHistoryStore(hass, client)
+    history_series = [
+        parse_history_option(x) for x in entry.options.get(CONF_PRICE_HISTORY, [])
+    ]
+    indicators = [
+        parse_indicator_option(x) for x in entry.options.get(CONF_INDICATORS, [])
+    ]
+    history_coordinator = PriceHistoryCoordinator(
+        hass,
+        price_history,
+        market_hours,
+        list(dict.fromkeys(history_series + [x[:2] for x in indicators])),
+        grace_period,
+    )
+    indicator_engine = IndicatorEngine(hass, history_coordinator, indicators)
+    indicator_engine.async_start()
+    alerts = [parse_alert_option(x) for x in entry.options.get(CONF_ALERTS, [])]
+    alert_engine = AlertEngine(hass, alerts)
+    alert_engine.async_start()
+    option_chains = OptionChainStore(client)
+    option_contracts = entry.options.get(CONF_OPTION_CONTRACTS, [])
+    option_coordinator = OptionContractsCoordinator(
+        hass, option_chains, market_hours, option_contracts, grace_period
+    )
 
-    hass.data.setdefault(DOMAIN, {})
     hass_data = dict(entry.data)
     entry.update_listeners = []
     hass_data["unsub"] = entry.add_update_listener(options_update_listener)
-    hass_data["client"] = AmeritradeAPI(auth)
+    hass_data[CLIENT] = client
+    hass_data[LIMITER] = client.limiter
+    hass_data[COORDINATOR] = coordinator
+    hass_data[PORTFOLIO] = portfolio
+    hass_data[MARKET_HOURS] = market_hours
+    hass_data[QUOTE_CACHE] = quote_cache
+    hass_data[QUOTE_STATES] = QuoteStateWriter(
+        hass,
+        entry.options.get(CONF_QUOTE_FIELD, DEFAULT_QUOTE_FIELD),
+        entry.options.get(CONF_QUOTE_THRESHOLD, DEFAULT_QUOTE_THRESHOLD),
+        entry.options.get(
+            CONF_QUOTE_ATTRIBUTE_INTERVAL, DEFAULT_QUOTE_ATTRIBUTE_INTERVAL
+        ),
+    )
+    hass_data[ORDER_SUBMITTER] = order_submitter
+    hass_data[ORDER_TRACKER] = order_tracker
+    hass_data[SCHEDULER] = scheduler
+    hass_data[PRICE_HISTORY] = price_history
+    hass_data[HISTORY_COORDINATOR] = history_coordinator
+    hass_data[CONF_PRICE_HISTORY] = history_series
+    hass_data[INDICATOR_ENGINE] = indicator_engine
+    hass_data[CONF_INDICATORS] = indicators
+    hass_data[ALERT_ENGINE] = alert_engine
+    hass_data[OPTION_CHAINS] = option_chains
+    hass_data[OPTION_COORDINATOR] = option_coordinator
+    hass_data[CONF_OPTION_CONTRACTS] = option_contracts
+    hass_data[OPTIONS] = dict(entry.options)
+    hass_data[CONF_WATCHLIST] = entry.options.get(CONF_WATCHLIST, [])
+    # Symbols with alerts are streamed too, without getting a sensor.
+    hass_data[STREAMER] = QuoteStreamer(
+        hass,
+        client,
+        list(dict.fromkeys(hass_data[CONF_WATCHLIST] + [x[0] for x in alerts])),
+    )
+    hass_data[TIMESERIES_RECORDER] = TimeSeriesRecorder(
+        hass, hass.data[DOMAIN][TIMESERIES], coordinator, hass_data[CONF_WATCHLIST]
+    )
+    hass_data[TIMESERIES_RECORDER].async_start()
+    import_watchlists = entry.options.get(CONF_IMPORT_WATCHLISTS, False)
+    movers = [parse_movers_option(x) for x in entry.options.get(CONF_MOVERS, [])]
+    import_coordinator = ImportedSymbolsCoordinator(
+        hass,
+        client,
+        entry.data[CONF_ACCOUNTS],
+        import_watchlists,
+        movers,
+        grace_period,
+    )
+    hass_data[IMPORT_COORDINATOR] = import_coordinator
+    hass_data[IMPORT_QUOTES_COORDINATOR] = ImportedQuotesCoordinator(
+        hass,
+        quote_cache,
+        market_hours,
+        import_coordinator,
+        hass_data[STREAMER].symbols,
+        grace_period,
+    )
+    hass_data[STARTUP] = []
+    # Entries set up before several logins were supported keep their ids.
+    hass_data[UNIQUE_ID_SUFFIX] = (
+        "" if entry.unique_id == DOMAIN else f"_{entry.entry_id}"
+    )
     hass.data[DOMAIN][entry.entry_id] = hass_data
+
+    async def async_refresh_history(now):
+        """Fetch the price history and option contracts for the first time."""
+        if history_series or indicators:
+            await history_coordinator.async_refresh()
+        if option_contracts:
+            await option_coordinator.async_refresh()
+
+    async def async_refresh_imported(now):
+        """Fetch the watchlists and movers for the first time."""
+        await import_coordinator.async_refresh()
+
+    @callback
+    def async_start_updates(event=None):
+        """Start fetching in the background, staggered, once HA has started."""
+        hass_data[STARTUP].clear()
+        scheduler.async_start(timedelta(seconds=random.uniform(0, STARTUP_DELAY)))
+        hass_data[STREAMER].async_start()
+        if import_watchlists or movers:
+            hass_data[STARTUP].append(
+                async_call_later(
+                    hass,
+                    random.uniform(0, STARTUP_DELAY),
+                    async_refresh_imported,
+                )
+            )
+        if history_series or indicators or option_contracts:
+            hass_data[STARTUP].append(
+                async_call_later(
+                    hass,
+                    STARTUP_HISTORY_DELAY + random.uniform(0, STARTUP_DELAY),
+                    async_refresh_history,
+                )
+            )
+
+    # Entities restore their last state, so nothing is fetched during setup.
+    if hass.state == CoreState.running:
+        async_start_updates()
+    else:
+        hass_data[STARTUP].append(
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STARTED, async_start_updates)
+        )
     if entry.state in [ConfigEntryState.NOT_LOADED, ConfigEntryState.SETUP_IN_PROGRESS]:
         for component in PLATFORMS:
             _LOGGER.debug("Setting up %s component", component)
@@ -144,11 +319,13 @@ async def options_update_listener(hass, config_entry):
     old_config = hass.data[DOMAIN][config_entry.entry_id]
     old_accounts = old_config[CONF_ACCOUNTS]
     new_accounts = config_entry.data[CONF_ACCOUNTS]
-    if old_accounts != new_accounts:
+    old_options = old_config[OPTIONS]
+    new_options = dict(config_entry.options)
+    if old_accounts != new_accounts or old_options != new_options:
         _LOGGER.debug("Options Updated, reloading.")
         await hass.config_entries.async_reload(config_entry.entry_id)
     else:
-        _LOGGER.debug("No change to accounts, ignoring option update")
+        _LOGGER.debug("No change to options, ignoring option update")
 
 
 async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry):
@@ -167,6 +344,17 @@ async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry):
     )
     unload_ok = all(unload_res)
     if unload_ok:
+        await hass.data[DOMAIN][config_entry.entry_id][STREAMER].async_stop()
+        hass.data[DOMAIN][config_entry.entry_id][CLIENT].auth.async_cancel_refresh()
+        hass.data[DOMAIN][config_entry.entry_id][ORDER_TRACKER].async_stop()
+        hass.data[DOMAIN][config_entry.entry_id][QUOTE_STATES].async_stop()
+        hass.data[DOMAIN][config_entry.entry_id][SCHEDULER].async_stop()
+        hass.data[DOMAIN][config_entry.entry_id][INDICATOR_ENGINE].async_stop()
+        hass.data[DOMAIN][config_entry.entry_id][ALERT_ENGINE].async_stop()
+        hass.data[DOMAIN][config_entry.entry_id][PORTFOLIO].async_stop()
+        hass.data[DOMAIN][config_entry.entry_id][TIMESERIES_RECORDER].async_stop()
+        for unsub in hass.data[DOMAIN][config_entry.entry_id][STARTUP]:
+            unsub()
         hass.data[DOMAIN].pop(config_entry.entry_id)
         _LOGGER.debug("Unload Completed")
         return True
@@ -0,0 +1,146 @@
+"""Price alerts evaluated against quotes for the TDAmeritrade integration."""
+import bisect
+import logging
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from .const import EVENT_ALERT, SIGNAL_QUOTE_UPDATE
+
+ABOVE = "above"
+BELOW = "below"
+MOVE = "move"
+SPREAD = "spread"
+ALERTS = [ABOVE, BELOW, MOVE, SPREAD]
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_alert_option(value):
+    """Return the (symbol, alert, threshold) of SYMBOL:alert:threshold."""
+    parts = [x.strip() for x in value.split(":")]
+    if len(parts) != 3 or not parts[0]:
+        raise ValueError(f"Expected SYMBOL:alert:threshold, got {value}")
+    symbol, alert, threshold = parts
+    alert = alert.lower()
+    if alert not in ALERTS:
+        raise ValueError(f"Unknown alert {alert}")
+    threshold = float(threshold.rstrip("%"))
+    if alert in (MOVE, SPREAD) and threshold <= 0:
+        raise ValueError(f"{alert} alerts need a positive threshold, got {value}")
+    return symbol.upper(), alert, threshold
+
+
+def format_alert_option(key):
+    """Return the option string of an alert key."""
+    symbol, alert, threshold = key
+    suffix = "%" if alert == MOVE else ""
+    return f"{symbol}:{alert}:{threshold:g}{suffix}"
+
+
+class ThresholdIndex:
+    """Sorted thresholds of one measure, and the measure's last value.
+
+    A new value is compared with the thresholds between it and the last
+    value only, found by bisection.  A value equal to a threshold is past
+    it going up, and not yet back below it going down.
+    """
+
+    def __init__(self, thresholds):
+        """Initialize the index."""
+        self.thresholds = sorted(set(thresholds))
+        self.value = None
+
+    def update(self, value):
+        """Return the (risen past, fallen past) thresholds since the last value."""
+        last, self.value = self.value, value
+        if last is None or value is None or value == last:
+            return [], []
+        if value > last:
+            low = bisect.bisect_right(self.thresholds, last)
+            high = bisect.bisect_right(self.thresholds, value)
+            return self.thresholds[low:high], []
+        low = bisect.bisect_right(self.thresholds, value)
+        high = bisect.bisect_right(self.thresholds, last)
+        return [], self.thresholds[low:high]
+
+
+def _measure(alert, quote):
+    """Return the value of a quote an alert is checked against."""
+    price = quote.get("lastPrice")
+    if alert in (ABOVE, BELOW):
+        return price
+    if alert == MOVE:
+        close = quote.get("closePrice")
+        if price is None or not close:
+            return None
+        return abs(price / close - 1) * 100
+    bid, ask = quote.get("bidPrice"), quote.get("askPrice")
+    if bid is None or ask is None:
+        return None
+    return ask - bid
+
+
+class AlertEngine:
+    """Fire an event when a quote crosses an alert's threshold.
+
+    Price alerts fire when the last price crosses above or below their
+    threshold, move alerts when the change from the previous close grows
+    past a percentage, and spread alerts when the bid ask spread widens
+    past an amount.  An alert fires again only after crossing back.
+    """
+
+    def __init__(self, hass, keys):
+        """Initialize the alert engine."""
+        self._hass = hass
+        self._indexes = {}
+        for symbol, alert, threshold in keys:
+            self._indexes.setdefault(symbol, {}).setdefault(alert, []).append(
+                threshold
+            )
+        for alerts in self._indexes.values():
+            for alert, thresholds in alerts.items():
+                alerts[alert] = ThresholdIndex(thresholds)
+        self._unsubs = []
+        self.fired = 0
+
+    @callback
+    def async_start(self):
+        """Listen for quotes of the symbols with alerts."""
+        for symbol in self._indexes:
+            self._unsubs.append(
+                async_dispatcher_connect(
+                    self._hass,
+                    SIGNAL_QUOTE_UPDATE.format(symbol),
+                    self._async_handle_quote,
+                )
+            )
+
+    @callback
+    def async_stop(self):
+        """Stop listening."""
+        while self._unsubs:
+            self._unsubs.pop()()
+
+    @callback
+    def _async_handle_quote(self, quote):
+        """Check the thresholds a quote moved past."""
+        symbol = quote.get("symbol")
+        for alert, index in self._indexes.get(symbol, {}).items():
+            value = _measure(alert, quote)
+            if value is None:
+                continue
+            risen, fallen = index.update(value)
+            for threshold in fallen if alert == BELOW else risen:
+                self.fired += 1
+                _LOGGER.debug("%s %s alert at %s fired: %s", symbol, alert, threshold, value)
+                self._hass.bus.async_fire(
+                    EVENT_ALERT,
+                    {
+                        "symbol": symbol,
+                        "alert": alert,
+                        "threshold": threshold,
+                        "value": value,
+                        "price": quote.get("lastPrice"),
+                    },
+                )
@@ -1,11 +1,39 @@
 """API for TDAmeritrade bound to Home Assistant OAuth."""
+import asyncio
+import logging
+import time
+
+from datetime import timedelta
 
 from aiohttp import ClientSession
+from aiohttp.client_exceptions import ClientError
 import tdameritrade_api as td
 
-from .const import TDA_URL
+from .const import (
+    TDA_URL,
+    QUOTE_CHUNK_SIZE,
+    MAX_CONCURRENT_QUOTE_REQUESTS,
+    PRIORITY_ORDER,
+    PRIORITY_QUOTE,
+    PRIORITY_ACCOUNT,
+    PRIORITY_HISTORY,
+    TOKEN_REFRESH_MARGIN,
+    RETRY_ATTEMPTS,
+    RETRY_BACKOFF_MIN,
+    RETRY_BACKOFF_MAX,
+)
+from .limiter import RequestLimiter
+from .metrics import RequestMetrics
+from .resilience import CircuitBreaker, backoff, is_transient
 
+from homeassistant.core import callback
 from homeassistant.helpers import config_entry_oauth2_flow
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt
+
+TOKEN_RETRY_INTERVAL = timedelta(seconds=30)
+
+_LOGGER = logging.getLogger(__name__)
 
 
 class AsyncConfigEntryAuth(td.AbstractAuth):
@@ -19,10 +47,379 @@ class AsyncConfigEntryAuth(td.AbstractAuth):
         """Initialize TDAmeritrade auth."""
         super().__init__(websession, TDA_URL)
         self._oauth_session = oauth_session
+        self._refresh_lock = asyncio.Lock()
+        self._remove_refresh = None
+        self._refreshes = 0
+        self._refresh_failures = 0
+        self._refresh_time = 0.0
+        self._last_refresh_latency = None
+        self._max_refresh_latency = 0.0
+
+    @property
+    def metrics(self):
+        """Return the token refresh counters."""
+        return {
+            "refreshes": self._refreshes,
+            "failures": self._refresh_failures,
+            "last_latency": self._last_refresh_latency,
+            "max_latency": self._max_refresh_latency,
+            "average_latency": self._refresh_time / self._refreshes
+            if self._refreshes
+            else None,
+        }
 
     async def async_get_access_token(self) -> str:
         """Return a valid access token."""
         if not self._oauth_session.valid_token:
-            await self._oauth_session.async_ensure_token_valid()
+            await self.async_refresh_token(force=False)
 
         return self._oauth_session.token["access_token"]
+
+    async def async_refresh_token(self, force=True):
+        """Refresh the token, only one refresh runs at a time."""
+        async with self._refresh_lock:
+            if not force and self._oauth_session.valid_token:
+                return
+            if (
+                force
+                and self._oauth_session.token["expires_at"] - TOKEN_REFRESH_MARGIN
+                > time.time()
+            ):
+                return
+            start = time.monotonic()
+            try:
+                new_token = await self._oauth_session.implementation.async_refresh_token(
+                    self._oauth_session.token
+                )
+            except Exception:
+                self._refresh_failures += 1
+                raise
+            finally:
+                latency = time.monotonic() - start
+                self._last_refresh_latency = latency
+                self._max_refresh_latency = max(self._max_refresh_latency, latency)
+            self._refreshes += 1
+            self._refresh_time += latency
+            entry = self._oauth_session.config_entry
+            self._oauth_session.hass.config_entries.async_update_entry(
+                entry, data={**entry.data, "token": new_token}
+            )
+            _LOGGER.debug("Refreshed access token in %.2f seconds", latency)
+        self.async_schedule_refresh()
+
+    @callback
+    def async_schedule_refresh(self):
+        """Refresh the token in the background ahead of its expiry."""
+        self.async_cancel_refresh()
+        refresh_at = self._oauth_session.token["expires_at"] - TOKEN_REFRESH_MARGIN
+        self._remove_refresh = async_track_point_in_utc_time(
+            self._oauth_session.hass,
+            self._async_handle_refresh,
+            dt.utc_from_timestamp(max(refresh_at, time.time())),
+        )
+
+    @callback
+    def async_cancel_refresh(self):
+        """Cancel the background refresh."""
+        if self._remove_refresh:
+            self._remove_refresh()
+            self._remove_refresh = None
+
+    async def _async_handle_refresh(self, now=None):
+        """Refresh the token from the background timer."""
+        self._remove_refresh = None
+        try:
+            await self.async_refresh_token()
+        except (ClientError, asyncio.TimeoutError) as error:
+            _LOGGER.warning("Failed to refresh access token: %s", error)
+            self._remove_refresh = async_track_point_in_utc_time(
+                self._oauth_session.hass,
+                self._async_handle_refresh,
+                dt.utcnow() + TOKEN_RETRY_INTERVAL,
+            )
+
+
+class TDAmeritradeAPI(td.AmeritradeAPI):
+    """Extend the AmeritradeAPI client with bulk endpoints and rate limiting."""
+
+    def __init__(self, auth, limiter=None):
+        """Initialize the API with the limiter shared by its requests.
+
+        Pass the same limiter to every client sharing a rate budget.
+        """
+        super().__init__(auth)
+        self.limiter = limiter or RequestLimiter()
+        self.metrics = RequestMetrics()
+        self.breakers = {}
+
+    async def _async_request(self, endpoint, method, url, priority, **kwargs):
+        """Make a rate limited request and return the decoded response.
+
+        GETs are retried on transient failures, and no request is sent
+        while the endpoint's circuit is open.
+        """
+        self.metrics.endpoint(endpoint).calls += 1
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(endpoint)
+        breaker.before_call()
+        try:
+            result = await self._async_retry(endpoint, method, url, priority, **kwargs)
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+        except Exception as error:
+            if is_transient(error):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+    async def _async_retry(self, endpoint, method, url, priority, **kwargs):
+        """Send a request through the limiter, retrying idempotent ones."""
+        key = None
+        attempts = 1
+        if method == "get":
+            key = (url, tuple(sorted((kwargs.get("params") or {}).items())))
+            if not url.startswith("/marketdata"):
+                # The limiter is shared by every login, only market data
+                # is the same for all of them.
+                key = (self,) + key
+            attempts = RETRY_ATTEMPTS
+        for attempt in range(attempts):
+            try:
+                return await self.limiter.async_call(
+                    priority,
+                    lambda: self._async_send(endpoint, method, url, **kwargs),
+                    key,
+                )
+            except (ClientError, asyncio.TimeoutError) as error:
+                if attempt + 1 == attempts or not is_transient(error):
+                    raise
+                delay = backoff(attempt, RETRY_BACKOFF_MIN, RETRY_BACKOFF_MAX)
+                _LOGGER.debug(
+                    "%s failed, retrying in %.1f seconds: %s", endpoint, delay, error
+                )
+                self.metrics.endpoint(endpoint).retries += 1
+                await asyncio.sleep(delay)
+
+    async def _async_send(self, endpoint, method, url, **kwargs):
+        """Send a request, recording its latency and status.
+
+        Returns the JSON body of GETs, and the Location header (or True) of
+        other requests.
+        """
+        metrics = self.metrics.endpoint(endpoint)
+        start = time.monotonic()
+        try:
+            resp = await self.auth.request(method, url, **kwargs)
+        except (ClientError, asyncio.TimeoutError):
+            metrics.record(time.monotonic() - start, error=True)
+            raise
+        metrics.record(time.monotonic() - start, resp.status, resp.status >= 400)
+        if resp.status == 429:
+            self.limiter.async_throttled()
+        resp.raise_for_status()
+        if method == "get":
+            return await resp.json()
+        return resp.headers.get("Location") or True
+
+    async def async_get_account(self, account_id, fields=None):
+        """Return the account details."""
+        params = {"fields": fields} if fields else None
+        return await self._async_request(
+            "get_account",
+            "get",
+            f"/accounts/{account_id}",
+            PRIORITY_ACCOUNT,
+            params=params,
+        )
+
+    async def async_get_accounts(self, fields=None):
+        """Return the details of every account linked to the login."""
+        params = {"fields": fields} if fields else None
+        return await self._async_request(
+            "get_accounts", "get", "/accounts", PRIORITY_ACCOUNT, params=params
+        )
+
+    async def async_get_quote(self, ticker):
+        """Return a quote for a specified ticker."""
+        return await self._async_request(
+            "get_quote", "get", f"/marketdata/{ticker}/quotes", PRIORITY_QUOTE
+        )
+
+    async def async_get_quotes(self, symbols):
+        """Return quotes for many symbols using as few requests as possible."""
+        symbols = list(dict.fromkeys(symbols))
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUOTE_REQUESTS)
+
+        async def _async_get_chunk(chunk):
+            async with semaphore:
+                return await self._async_request(
+                    "get_quotes",
+                    "get",
+                    "/marketdata/quotes",
+                    PRIORITY_QUOTE,
+                    params={"symbol": ",".join(chunk)},
+                )
+
+        results = await asyncio.gather(
+            *[
+                _async_get_chunk(symbols[i : i + QUOTE_CHUNK_SIZE])
+                for i in range(0, len(symbols), QUOTE_CHUNK_SIZE)
+            ]
+        )
+        quotes = {}
+        for result in results:
+            quotes.update(result)
+        return quotes
+
+    async def async_get_price_history(
+        self,
+        symbol,
+        period_type="day",
+        frequency_type="minute",
+        frequency=1,
+        start_date=None,
+        end_date=None,
+        need_extended_hours_data=False,
+    ):
+        """Return the candles for a symbol, dates are epoch milliseconds."""
+        params = {
+            "periodType": period_type,
+            "frequencyType": frequency_type,
+            "frequency": frequency,
+            "needExtendedHoursData": str(need_extended_hours_data).lower(),
+        }
+        if start_date is not None:
+            params["startDate"] = start_date
+        if end_date is not None:
+            params["endDate"] = end_date
+        return await self._async_request(
+            "get_price_history",
+            "get",
+            f"/marketdata/{symbol}/pricehistory",
+            PRIORITY_HISTORY,
+            params=params,
+        )
+
+    async def async_get_option_chain(
+        self,
+        symbol,
+        contract_type="ALL",
+        strike_count=None,
+        strike_range="ALL",
+        from_date=None,
+        to_date=None,
+        strike=None,
+    ):
+        """Return the option chain of a symbol, filtered by the API."""
+        params = {"symbol": symbol, "contractType": contract_type, "range": strike_range}
+        if strike_count is not None:
+            params["strikeCount"] = strike_count
+        if from_date is not None:
+            params["fromDate"] = from_date.isoformat()
+        if to_date is not None:
+            params["toDate"] = to_date.isoformat()
+        if strike is not None:
+            params["strike"] = strike
+        return await self._async_request(
+            "get_option_chain",
+            "get",
+            "/marketdata/chains",
+            PRIORITY_HISTORY,
+            params=params,
+        )
+
+    async def async_get_market_hours(self, market):
+        """Return the status of specified market."""
+        return await self._async_request(
+            "get_market_hours", "get", f"/marketdata/{market}/hours", PRIORITY_QUOTE
+        )
+
+    async def async_get_watchlists(self, account_id=None):
+        """Return the watchlists of an account, or of every linked account."""
+        url = "/accounts/watchlists"
+        if account_id:
+            url = f"/accounts/{account_id}/watchlists"
+        return await self._async_request("get_watchlists", "get", url, PRIORITY_HISTORY)
+
+    async def async_get_movers(self, index, direction=None, change="percent"):
+        """Return the top movers of an index, $COMPX, $DJI or $SPX.X."""
+        params = {"change": change}
+        if direction is not None:
+            params["direction"] = direction
+        return await self._async_request(
+            "get_movers",
+            "get",
+            f"/marketdata/{index}/movers",
+            PRIORITY_HISTORY,
+            params=params,
+        )
+
+    async def async_get_user_principals(self, fields=None):
+        """Return the user principals, including the streamer connection info."""
+        params = {"fields": fields} if fields else None
+        return await self._async_request(
+            "get_user_principals",
+            "get",
+            "/userprincipals",
+            PRIORITY_QUOTE,
+            params=params,
+        )
+
+    async def async_get_orders(self, account_id, from_entered_time=None, status=None):
+        """Return current orders for the specified account."""
+        params = {}
+        if from_entered_time:
+            params["fromEnteredTime"] = from_entered_time
+        if status:
+            params["status"] = status
+        return await self._async_request(
+            "get_orders",
+            "get",
+            f"/accounts/{account_id}/orders",
+            PRIORITY_ORDER,
+            params=params,
+        )
+
+    async def async_place_order(
+        self,
+        price,
+        instruction,
+        quantity,
+        symbol,
+        account_id,
+        order_type="LIMIT",
+        session="NORMAL",
+        duration="DAY",
+        orderStrategyType="SINGLE",
+        assetType="EQUITY",
+    ):
+        """Place an order, returning its order id when the API provides one."""
+        data = {
+            "orderType": order_type,
+            "price": price,
+            "session": session,
+            "duration": duration,
+            "orderStrategyType": orderStrategyType,
+            "orderLegCollection": [
+                {
+                    "instruction": instruction,
+                    "quantity": quantity,
+                    "instrument": {"symbol": symbol, "assetType": assetType},
+                }
+            ],
+        }
+        location = await self._async_request(
+            "place_order",
+            "post",
+            f"/accounts/{account_id}/orders",
+            PRIORITY_ORDER,
+            json=data,
+        )
+        if isinstance(location, str):
+            return location.rstrip("/").rsplit("/", 1)[-1]
+        return location
@@ -1,51 +1,76 @@
 """Platform for Market open sensor."""
 import asyncio
 import logging
+import random
+import time
 
 from homeassistant.components.binary_sensor import BinarySensorEntity
+from homeassistant.const import EVENT_HOMEASSISTANT_STARTED, STATE_ON, STATE_OFF
+from homeassistant.core import CoreState, callback
+from homeassistant.helpers.event import async_call_later, async_track_point_in_time
+from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.util import dt
 
 from datetime import timedelta
 
-from aiohttp.client_exceptions import ClientConnectorError, ClientResponseError, ServerDisconnectedError
+from aiohttp.client_exceptions import ClientError
 
 from .const import (
     DOMAIN,
     PRE_MARKET,
     POST_MARKET,
     REG_MARKET,
-    CLIENT,
-    EQUITY,
-    EQ,
-    START,
-    END,
-    SESSION_HOURS,
-    IS_OPEN,
-    EQUITY_MKT_TYPE,
+    MARKET_HOURS,
+    OPTIONS,
+    CONF_STALE_GRACE_PERIOD,
+    DEFAULT_STALE_GRACE_PERIOD,
+    STARTUP_DELAY,
+    UNIQUE_ID_SUFFIX,
 )
+from .resilience import backoff
 
-SCAN_INTERVAL = timedelta(seconds=30)
+RETRY_MIN = 30
+RETRY_MAX = 600
 
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(hass, config, async_add_entities, discovery_info=None):
     """Set up the TDAmeritrade binary sensor platform."""
-    sensors = [MarketOpenSensor(hass.data[DOMAIN][config.entry_id][CLIENT])]
+    data = hass.data[DOMAIN][config.entry_id]
+    sensors = [
+        MarketOpenSensor(
+            data[MARKET_HOURS],
+            data[OPTIONS].get(CONF_STALE_GRACE_PERIOD, DEFAULT_STALE_GRACE_PERIOD),
+            data[UNIQUE_ID_SUFFIX],
+        )
+    ]
     async_add_entities(sensors)
     return True
 
 
-class MarketOpenSensor(BinarySensorEntity):
+class MarketOpenSensor(BinarySensorEntity, RestoreEntity):
     """Representation of a Sensor."""
 
-    def __init__(self, client):
+    def __init__(
+        self, market_hours, grace_period=DEFAULT_STALE_GRACE_PERIOD, unique_id_suffix=""
+    ):
         """Initialize of a market binary sensor."""
         self._state = False
         self._name = "Market"
-        self._client = client
+        self._unique_id_suffix = unique_id_suffix
+        self._market_hours = market_hours
+        self._grace_period = grace_period
         self._attributes = {PRE_MARKET: None, POST_MARKET: None}
         self._available = False
+        self._remove_timer = None
+        self._failures = 0
+        self._last_loaded = None
+
+    @property
+    def should_poll(self):
+        """Return False, state changes are scheduled at session boundaries."""
+        return False
 
     @property
     def device_class(self):
@@ -60,7 +85,7 @@ class MarketOpenSensor(BinarySensorEntity):
     @property
     def unique_id(self):
         """Return the unique_id of the binary sensor."""
-        return f"{DOMAIN}.market_open_sensor"
+        return f"{DOMAIN}.market_open_sensor{self._unique_id_suffix}"
 
     @property
     def available(self):
@@ -82,55 +107,106 @@ class MarketOpenSensor(BinarySensorEntity):
         """Return the class of this binary sensor."""
         return "mdi:finance"
 
-    async def _is_market_open(self, market, resp):
-        if resp:
+    async def async_added_to_hass(self):
+        """Show the cached or last state, and update once HA has started.
+
+        Nothing is fetched during setup, the first update runs in the
+        background a little after HA has started.
+        """
+        if self._market_hours.loaded:
+            self._last_loaded = time.monotonic()
+            self._available = True
+            self._update_state()
+        else:
+            last_state = await self.async_get_last_state()
+            if last_state is not None and last_state.state in (STATE_ON, STATE_OFF):
+                self._state = last_state.state == STATE_ON
+                self._attributes[PRE_MARKET] = last_state.attributes.get(PRE_MARKET)
+                self._attributes[POST_MARKET] = last_state.attributes.get(POST_MARKET)
+                self._attributes["restored"] = True
+                self._available = True
+
+        @callback
+        def async_start_updates(event=None):
+            """Schedule the first update, staggered."""
+            self._remove_timer = async_call_later(
+                self.hass,
+                random.uniform(0, STARTUP_DELAY),
+                self._async_handle_transition,
+            )
+
+        if self.hass.state == CoreState.running:
+            async_start_updates()
+        else:
+            self._remove_timer = self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_STARTED, async_start_updates
+            )
+
+    async def async_will_remove_from_hass(self):
+        """Cancel the scheduled transition."""
+        if self._remove_timer:
+            self._remove_timer()
+            self._remove_timer = None
+
+    async def _async_handle_transition(self, now=None):
+        """Recompute the state and schedule the next change.
+
+        The next update is scheduled whatever happens, retrying with
+        backoff when the hours couldn't be refreshed.
+        """
+        self._remove_timer = None
+        next_update = None
+        try:
+            loaded = False
             try:
-                market_open = dt.parse_datetime(
-                    resp[EQUITY][EQ][SESSION_HOURS][market][0][START]
-                )
-                market_close = dt.parse_datetime(
-                    resp[EQUITY][EQ][SESSION_HOURS][market][0][END]
+                loaded = await self._market_hours.async_refresh()
+            except (ClientError, asyncio.TimeoutError) as error:
+                _LOGGER.warning("Client Exception: %s", error)
+
+            if loaded:
+                self._failures = 0
+                self._last_loaded = time.monotonic()
+                self._available = True
+                self._attributes.pop("stale", None)
+                self._attributes.pop("restored", None)
+                self._update_state()
+                next_update = self._market_hours.next_transition()
+                if next_update is None:
+                    next_update = dt.start_of_local_day() + timedelta(days=1)
+        finally:
+            if next_update is None:
+                # Keep the last state for the grace period and back off retries.
+                self._available = (
+                    self._last_loaded is not None
+                    and time.monotonic() - self._last_loaded <= self._grace_period
                 )
-                market_state = market_open < dt.now() < market_close
-                _LOGGER.debug(
-                    "%s Market Open: %s, Close: %s, Current Time: %s, Market Open: %s",
-                    market,
-                    market_open,
-                    market_close,
-                    dt.now(),
-                    market_state,
+                if self._available:
+                    self._attributes["stale"] = True
+                next_update = dt.now() + timedelta(
+                    seconds=backoff(self._failures, RETRY_MIN, RETRY_MAX)
                 )
-                return market_state
-            except KeyError:
-                pass
-            try:
-                market_state = resp[EQUITY][EQUITY][IS_OPEN]
-            except KeyError:
-                _LOGGER.warning("Failed to update '%s' sensor.", market)
-                return None
-        return None
-
-    async def async_update(self):
-        """Update the state of this sensor (Market Open)."""
-        _LOGGER.debug("Updating sensor: %s, id: %s", self._name, self.entity_id)
-        resp = None
-        try:
-            resp = await self._client.async_get_market_hours(EQUITY_MKT_TYPE)
-        except (ClientConnectorError, ClientResponseError, ServerDisconnectedError) as error:
-            _LOGGER.warning("Client Exception: %s", error)
+                self._failures += 1
 
-        if resp:
-            self._available = True
-            market_state = await asyncio.gather(
-                self._is_market_open(REG_MARKET, resp),
-                self._is_market_open(PRE_MARKET, resp),
-                self._is_market_open(POST_MARKET, resp),
+            self.async_write_ha_state()
+            _LOGGER.debug("Next market state update at %s", next_update)
+            self._remove_timer = async_track_point_in_time(
+                self.hass, self._async_handle_transition, next_update
             )
 
-            (
-                self._state,
-                self._attributes[PRE_MARKET],
-                self._attributes[POST_MARKET],
-            ) = market_state
-        else:
-            self._available = False
+    @callback
+    def _update_state(self):
+        """Compute the session states from the cached hours."""
+        now = dt.now()
+        self._state = self._market_hours.is_session_open(REG_MARKET, now)
+        self._attributes[PRE_MARKET] = self._market_hours.is_session_open(
+            PRE_MARKET, now
+        )
+        self._attributes[POST_MARKET] = self._market_hours.is_session_open(
+            POST_MARKET, now
+        )
+        _LOGGER.debug(
+            "Market Open: %s, Pre Market: %s, Post Market: %s",
+            self._state,
+            self._attributes[PRE_MARKET],
+            self._attributes[POST_MARKET],
+        )
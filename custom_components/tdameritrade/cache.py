@@ -0,0 +1,87 @@
+"""Short lived quote cache for the TDAmeritrade integration."""
+import asyncio
+import logging
+import time
+
+from collections import OrderedDict
+
+from .const import REG_MARKET, QUOTE_CACHE_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class QuoteCache:
+    """Cache quotes per symbol and share in flight requests."""
+
+    def __init__(self, client, market_hours, ttl_open, ttl_closed, max_size=QUOTE_CACHE_SIZE):
+        """Initialize the quote cache, TTLs are in seconds."""
+        self._client = client
+        self._market_hours = market_hours
+        self._ttl_open = ttl_open
+        self._ttl_closed = ttl_closed
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        """Return the TTL for the current market session."""
+        if self._market_hours.is_session_open(REG_MARKET) is False:
+            return self._ttl_closed
+        return self._ttl_open
+
+    async def async_get_quotes(self, symbols):
+        """Return quotes for the symbols, only fetching stale ones."""
+        now = time.monotonic()
+        quotes = {}
+        waiting = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            entry = self._entries.get(symbol)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(symbol)
+                quotes[symbol] = entry[1]
+                self.hits += 1
+            elif symbol in self._pending:
+                waiting[symbol] = self._pending[symbol]
+                self.hits += 1
+            else:
+                missing.append(symbol)
+                self.misses += 1
+
+        if missing:
+            future = asyncio.ensure_future(self._client.async_get_quotes(missing))
+            for symbol in missing:
+                self._pending[symbol] = future
+                waiting[symbol] = future
+            future.add_done_callback(
+                lambda done: self._async_fetched(missing, done)
+            )
+
+        for future in set(waiting.values()):
+            await asyncio.shield(future)
+        for symbol, future in waiting.items():
+            if symbol in future.result():
+                quotes[symbol] = future.result()[symbol]
+        return quotes
+
+    def async_store(self, symbol, quote, now=None):
+        """Cache a quote, evicting the least recently used symbols."""
+        expires = (now or time.monotonic()) + self.ttl
+        self._entries[symbol] = (expires, quote)
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def _async_fetched(self, symbols, future):
+        """Store the result of a finished fetch."""
+        for symbol in symbols:
+            if self._pending.get(symbol) is future:
+                del self._pending[symbol]
+        if future.cancelled() or future.exception() is not None:
+            return
+        now = time.monotonic()
+        for symbol, quote in future.result().items():
+            self.async_store(symbol, quote, now)
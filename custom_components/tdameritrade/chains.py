@@ -0,0 +1,266 @@
+"""Option chains for the TDAmeritrade integration."""
+import logging
+import re
+import time
+
+from datetime import datetime
+
+import numpy as np
+import voluptuous as vol
+
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt
+
+CONTRACT_TYPES = ["ALL", "CALL", "PUT"]
+STRIKE_RANGES = ["ALL", "ITM", "NTM", "OTM", "SAK", "SBK", "SNK"]
+
+CONTRACT_DTYPE = np.dtype(
+    [
+        ("put_call", "u1"),
+        ("strike", "<f8"),
+        ("expiration", "<i8"),
+        ("days_to_expiration", "<i4"),
+        ("bid", "<f8"),
+        ("ask", "<f8"),
+        ("last", "<f8"),
+        ("mark", "<f8"),
+        ("volume", "<f8"),
+        ("open_interest", "<f8"),
+        ("volatility", "<f8"),
+        ("delta", "<f8"),
+        ("gamma", "<f8"),
+        ("theta", "<f8"),
+        ("vega", "<f8"),
+        ("rho", "<f8"),
+    ]
+)
+CALL = 0
+PUT = 1
+
+# Response field of each column, other than put_call
+CONTRACT_FIELDS = {
+    "strike": "strikePrice",
+    "expiration": "expirationDate",
+    "days_to_expiration": "daysToExpiration",
+    "bid": "bid",
+    "ask": "ask",
+    "last": "last",
+    "mark": "mark",
+    "volume": "totalVolume",
+    "open_interest": "openInterest",
+    "volatility": "volatility",
+    "delta": "delta",
+    "gamma": "gamma",
+    "theta": "theta",
+    "vega": "vega",
+    "rho": "rho",
+}
+
+# Contract symbols look like SPY_061722C400 or SPY_061722P402.5
+CONTRACT_SYMBOL = re.compile(
+    r"^(?P<underlying>[A-Z.$]+)_(?P<date>\d{6})(?P<type>[CP])(?P<strike>[\d.]+)$"
+)
+
+MAX_CONTRACT_RESULTS = 50
+
+GET_OPTION_CHAIN_SCHEMA = vol.Schema(
+    {
+        vol.Required("symbol"): vol.All(cv.string, vol.Upper),
+        vol.Optional("contract_type", default="ALL"): vol.All(
+            vol.Upper, vol.In(CONTRACT_TYPES)
+        ),
+        vol.Optional("strike_count"): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional("strike_range", default="ALL"): vol.All(
+            vol.Upper, vol.In(STRIKE_RANGES)
+        ),
+        vol.Optional("from_date"): cv.date,
+        vol.Optional("to_date"): cv.date,
+    }
+)
+
+GET_OPTION_CONTRACTS_SCHEMA = vol.Schema(
+    {
+        vol.Required("symbol"): vol.All(cv.string, vol.Upper),
+        vol.Optional("contracts"): vol.All(cv.ensure_list, [vol.All(cv.string, vol.Upper)]),
+        vol.Optional("contract_type", default="ALL"): vol.All(
+            vol.Upper, vol.In(CONTRACT_TYPES)
+        ),
+        vol.Optional("expiration"): cv.date,
+        vol.Optional("min_strike"): vol.Coerce(float),
+        vol.Optional("max_strike"): vol.Coerce(float),
+    }
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_contract_symbol(symbol):
+    """Return the (underlying, expiration date, contract type, strike) of a contract."""
+    match = CONTRACT_SYMBOL.match(symbol.strip().upper())
+    if match is None:
+        raise ValueError(f"Not an option contract symbol: {symbol}")
+    expiration = datetime.strptime(match["date"], "%m%d%y").date()
+    contract_type = "CALL" if match["type"] == "C" else "PUT"
+    return match["underlying"], expiration, contract_type, float(match["strike"])
+
+
+class OptionChain:
+    """A parsed option chain, one row per contract.
+
+    The numbers of every contract are kept in a single structured array,
+    with an index from contract symbol to row.
+    """
+
+    def __init__(self, underlying, contracts, symbols, underlying_price=None):
+        """Initialize the chain."""
+        self.underlying = underlying
+        self.underlying_price = underlying_price
+        self.contracts = contracts
+        self.symbols = symbols
+        self.fetched = time.time()
+        self._rows = {symbol: row for row, symbol in enumerate(symbols)}
+
+    @classmethod
+    def from_response(cls, resp):
+        """Parse a /marketdata/chains response."""
+        legs = []
+        for put_call, exp_map in ((CALL, "callExpDateMap"), (PUT, "putExpDateMap")):
+            for strikes in (resp.get(exp_map) or {}).values():
+                for contracts in strikes.values():
+                    legs += [(put_call, contract) for contract in contracts]
+
+        contracts = np.zeros(len(legs), dtype=CONTRACT_DTYPE)
+        for column in CONTRACT_FIELDS:
+            if contracts.dtype[column].kind == "f":
+                contracts[column] = np.nan
+        symbols = []
+        for row, (put_call, contract) in enumerate(legs):
+            contracts["put_call"][row] = put_call
+            for column, field in CONTRACT_FIELDS.items():
+                value = contract.get(field)
+                # The API sends "NaN" strings for greeks it can't compute.
+                if isinstance(value, (int, float)):
+                    contracts[column][row] = value
+            symbols.append(contract.get("symbol"))
+        return cls(resp.get("symbol"), contracts, symbols, resp.get("underlyingPrice"))
+
+    def __len__(self):
+        """Return the number of contracts."""
+        return len(self.symbols)
+
+    @property
+    def summary(self):
+        """Return a small description of the chain."""
+        summary = {
+            "symbol": self.underlying,
+            "underlying_price": self.underlying_price,
+            "contracts": len(self),
+        }
+        if len(self):
+            expirations = np.unique(self.contracts["expiration"])
+            summary.update(
+                expirations=[
+                    dt.utc_from_timestamp(x / 1000).date().isoformat()
+                    for x in expirations
+                ],
+                min_strike=float(self.contracts["strike"].min()),
+                max_strike=float(self.contracts["strike"].max()),
+            )
+        return summary
+
+    def contract(self, symbol):
+        """Return one contract as a dict, or None if it isn't in the chain."""
+        row = self._rows.get(symbol)
+        if row is None:
+            return None
+        return self._as_dict(row)
+
+    def query(
+        self,
+        contract_type="ALL",
+        expiration=None,
+        min_strike=None,
+        max_strike=None,
+        limit=MAX_CONTRACT_RESULTS,
+    ):
+        """Return the contracts matching the filters as dicts."""
+        contracts = self.contracts
+        mask = np.ones(len(contracts), dtype=bool)
+        if contract_type != "ALL":
+            mask &= contracts["put_call"] == (CALL if contract_type == "CALL" else PUT)
+        if expiration is not None:
+            days = (contracts["expiration"] // 1000).astype("datetime64[s]").astype(
+                "datetime64[D]"
+            )
+            mask &= days == np.datetime64(expiration)
+        if min_strike is not None:
+            mask &= contracts["strike"] >= min_strike
+        if max_strike is not None:
+            mask &= contracts["strike"] <= max_strike
+        return [self._as_dict(row) for row in np.flatnonzero(mask)[:limit]]
+
+    def _as_dict(self, row):
+        """Return a row as a dict."""
+        contract = self.contracts[row]
+        result = {"symbol": self.symbols[row], "underlying": self.underlying}
+        for column in CONTRACT_DTYPE.names:
+            value = contract[column].item()
+            if column == "put_call":
+                value = "CALL" if value == CALL else "PUT"
+            elif column == "expiration":
+                value = dt.utc_from_timestamp(value / 1000).date().isoformat()
+            elif isinstance(value, float) and np.isnan(value):
+                value = None
+            result[column] = value
+        return result
+
+
+class OptionChainStore:
+    """Fetch option chains filtered by the API and keep the last of each."""
+
+    def __init__(self, client):
+        """Initialize the option chain store."""
+        self._client = client
+        self._chains = {}
+
+    def chain(self, symbol):
+        """Return the last chain fetched for an underlying, if any."""
+        return self._chains.get(symbol)
+
+    def contract(self, symbol):
+        """Return a contract from the fetched chains, if any."""
+        try:
+            underlying = parse_contract_symbol(symbol)[0]
+        except ValueError:
+            return None
+        chain = self._chains.get(underlying)
+        if chain is None:
+            return None
+        return chain.contract(symbol)
+
+    async def async_fetch(
+        self,
+        symbol,
+        contract_type="ALL",
+        strike_count=None,
+        strike_range="ALL",
+        from_date=None,
+        to_date=None,
+        strike=None,
+        store=True,
+    ):
+        """Fetch and parse a chain."""
+        resp = await self._client.async_get_option_chain(
+            symbol,
+            contract_type=contract_type,
+            strike_count=strike_count,
+            strike_range=strike_range,
+            from_date=from_date,
+            to_date=to_date,
+            strike=strike,
+        )
+        chain = OptionChain.from_response(resp or {})
+        _LOGGER.debug("Fetched %s option contracts for %s", len(chain), symbol)
+        if store:
+            self._chains[symbol] = chain
+        return chain
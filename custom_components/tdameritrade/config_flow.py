@@ -1,5 +1,6 @@
 """Config flow for TDAmeritrade."""
 
+import hashlib
 import logging
 import voluptuous as vol
 
@@ -18,8 +19,36 @@ from .const import (
     OAUTH2_TOKEN,
     CONF_CONSUMER_KEY,
     CONF_ACCOUNTS,
+    CONF_WATCHLIST,
+    CONF_QUOTE_TTL_OPEN,
+    CONF_QUOTE_TTL_CLOSED,
+    CONF_ACCOUNT_ATTRIBUTES,
+    CONF_PRICE_HISTORY,
+    CONF_INDICATORS,
+    CONF_DEBUG_SENSORS,
+    CONF_STALE_GRACE_PERIOD,
+    CONF_OPTION_CONTRACTS,
+    CONF_QUOTE_FIELD,
+    CONF_QUOTE_THRESHOLD,
+    CONF_QUOTE_ATTRIBUTE_INTERVAL,
+    CONF_ALERTS,
+    CONF_IMPORT_WATCHLISTS,
+    CONF_MOVERS,
+    DEFAULT_STALE_GRACE_PERIOD,
+    DEFAULT_ACCOUNT_ATTRIBUTES,
+    DEFAULT_QUOTE_TTL_OPEN,
+    DEFAULT_QUOTE_TTL_CLOSED,
+    DEFAULT_QUOTE_FIELD,
+    DEFAULT_QUOTE_THRESHOLD,
+    DEFAULT_QUOTE_ATTRIBUTE_INTERVAL,
     TITLE,
 )
+from .alerts import format_alert_option, parse_alert_option
+from .chains import parse_contract_symbol
+from .history import parse_history_option
+from .indicators import format_indicator_option, parse_indicator_option
+from .quotes import parse_quote_threshold
+from .watchlists import format_movers_option, parse_movers_option
 
 
 class LocalOAuth2Implementation(config_entry_oauth2_flow.LocalOAuth2Implementation):
@@ -58,21 +87,24 @@ class OAuth2FlowHandler(
 
     async def async_step_user(self, user_input=None):
         """Handle a flow started by a user."""
-        await self.async_set_unique_id(DOMAIN)
-
-        if self._async_current_entries():
-            return self.async_abort(reason="single_instance_allowed")
-
         if user_input:
             self.consumer_key = user_input[CONF_CONSUMER_KEY]
-            self.accounts = user_input[CONF_ACCOUNTS]
+            self.accounts = user_input.get(CONF_ACCOUNTS)
             if self.accounts and not isinstance(self.accounts, list):
                 self.accounts = [x.strip() for x in self.accounts.split(",") if x]
+            if self.accounts:
+                await self.async_set_unique_id(",".join(sorted(self.accounts)))
+                self._abort_if_unique_id_configured()
+            # Each consumer key gets its own implementation, so logins to
+            # different apps refresh their tokens with the right key.  The id
+            # is stored in the entry data, so it holds a hash of the key.
+            key_hash = hashlib.sha256(self.consumer_key.encode()).hexdigest()
+            implementation_id = f"{DOMAIN}_{key_hash[:16]}"
             OAuth2FlowHandler.async_register_implementation(
                 self.hass,
                 LocalOAuth2Implementation(
                     self.hass,
-                    DOMAIN,
+                    implementation_id,
                     self.consumer_key,
                     None,
                     OAUTH2_AUTHORIZE,
@@ -82,7 +114,7 @@ class OAuth2FlowHandler(
             implementations = await config_entry_oauth2_flow.async_get_implementations(
                 self.hass, self.DOMAIN
             )
-            self.flow_impl = implementations[DOMAIN]
+            self.flow_impl = implementations[implementation_id]
             return await self.async_step_auth()
 
         return self.async_show_form(
@@ -102,7 +134,10 @@ class OAuth2FlowHandler(
         """
         data[CONF_CONSUMER_KEY] = self.consumer_key
         data[CONF_ACCOUNTS] = self.accounts
-        return self.async_create_entry(title=TITLE, data=data)
+        title = TITLE
+        if self.accounts:
+            title = f"{TITLE} {', '.join('*' + x[-4:] for x in self.accounts)}"
+        return self.async_create_entry(title=title, data=data)
 
     @staticmethod
     @callback
@@ -117,18 +152,100 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
     def __init__(self, config_entry: config_entries.ConfigEntry):
         """Initialize options flow."""
         self.config_entry = config_entry
-        self.accounts = deepcopy(self.config_entry.data[CONF_ACCOUNTS])
+        # Entries for every linked account have no accounts.
+        self.accounts = deepcopy(self.config_entry.data.get(CONF_ACCOUNTS) or [])
         self.data = self.config_entry.data.copy()
+        self.options = dict(self.config_entry.options)
 
     async def async_step_init(self, user_input=None):
         """Update the accounts."""
+        errors = {}
         if user_input:
             if user_input.get(CONF_ACCOUNTS):
                 self.accounts = [
                     x.strip() for x in user_input[CONF_ACCOUNTS].split(",") if x
                 ]
-            self.data[CONF_ACCOUNTS] = self.accounts
-            return await self._update_accounts()
+            self.data[CONF_ACCOUNTS] = self.accounts or self.data.get(CONF_ACCOUNTS)
+            self.options[CONF_WATCHLIST] = [
+                x.strip().upper()
+                for x in user_input.get(CONF_WATCHLIST, "").split(",")
+                if x.strip()
+            ]
+            self.options[CONF_QUOTE_TTL_OPEN] = user_input.get(
+                CONF_QUOTE_TTL_OPEN, DEFAULT_QUOTE_TTL_OPEN
+            )
+            self.options[CONF_QUOTE_TTL_CLOSED] = user_input.get(
+                CONF_QUOTE_TTL_CLOSED, DEFAULT_QUOTE_TTL_CLOSED
+            )
+            self.options[CONF_ACCOUNT_ATTRIBUTES] = [
+                x.strip()
+                for x in user_input.get(CONF_ACCOUNT_ATTRIBUTES, "").split(",")
+                if x.strip()
+            ] or DEFAULT_ACCOUNT_ATTRIBUTES
+            try:
+                self.options[CONF_PRICE_HISTORY] = [
+                    ":".join(parse_history_option(x))
+                    for x in user_input.get(CONF_PRICE_HISTORY, "").split(",")
+                    if x.strip()
+                ]
+            except ValueError:
+                errors[CONF_PRICE_HISTORY] = "invalid_price_history"
+            self.options[CONF_STALE_GRACE_PERIOD] = user_input.get(
+                CONF_STALE_GRACE_PERIOD, DEFAULT_STALE_GRACE_PERIOD
+            )
+            self.options[CONF_DEBUG_SENSORS] = user_input.get(CONF_DEBUG_SENSORS, False)
+            try:
+                self.options[CONF_INDICATORS] = [
+                    format_indicator_option(parse_indicator_option(x))
+                    for x in user_input.get(CONF_INDICATORS, "").split(",")
+                    if x.strip()
+                ]
+            except ValueError:
+                errors[CONF_INDICATORS] = "invalid_indicator"
+            self.options[CONF_OPTION_CONTRACTS] = [
+                x.strip().upper()
+                for x in user_input.get(CONF_OPTION_CONTRACTS, "").split(",")
+                if x.strip()
+            ]
+            try:
+                for contract in self.options[CONF_OPTION_CONTRACTS]:
+                    parse_contract_symbol(contract)
+            except ValueError:
+                errors[CONF_OPTION_CONTRACTS] = "invalid_option_contract"
+            try:
+                self.options[CONF_ALERTS] = [
+                    format_alert_option(parse_alert_option(x))
+                    for x in user_input.get(CONF_ALERTS, "").split(",")
+                    if x.strip()
+                ]
+            except ValueError:
+                errors[CONF_ALERTS] = "invalid_alert"
+            self.options[CONF_IMPORT_WATCHLISTS] = user_input.get(
+                CONF_IMPORT_WATCHLISTS, False
+            )
+            try:
+                self.options[CONF_MOVERS] = [
+                    format_movers_option(parse_movers_option(x))
+                    for x in user_input.get(CONF_MOVERS, "").split(",")
+                    if x.strip()
+                ]
+            except ValueError:
+                errors[CONF_MOVERS] = "invalid_movers"
+            self.options[CONF_QUOTE_FIELD] = (
+                user_input.get(CONF_QUOTE_FIELD, "").strip() or DEFAULT_QUOTE_FIELD
+            )
+            self.options[CONF_QUOTE_THRESHOLD] = user_input.get(
+                CONF_QUOTE_THRESHOLD, DEFAULT_QUOTE_THRESHOLD
+            ).strip()
+            try:
+                parse_quote_threshold(self.options[CONF_QUOTE_THRESHOLD])
+            except ValueError:
+                errors[CONF_QUOTE_THRESHOLD] = "invalid_quote_threshold"
+            self.options[CONF_QUOTE_ATTRIBUTE_INTERVAL] = user_input.get(
+                CONF_QUOTE_ATTRIBUTE_INTERVAL, DEFAULT_QUOTE_ATTRIBUTE_INTERVAL
+            )
+            if not errors:
+                return await self._update_accounts()
 
         data_schema = vol.Schema(
             {
@@ -136,11 +253,87 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                     CONF_ACCOUNTS,
                     default=",".join(self.accounts),
                 ): str,
+                vol.Optional(
+                    CONF_WATCHLIST,
+                    default=",".join(self.options.get(CONF_WATCHLIST, [])),
+                ): str,
+                vol.Optional(
+                    CONF_IMPORT_WATCHLISTS,
+                    default=self.options.get(CONF_IMPORT_WATCHLISTS, False),
+                ): bool,
+                vol.Optional(
+                    CONF_MOVERS,
+                    default=",".join(self.options.get(CONF_MOVERS, [])),
+                ): str,
+                vol.Optional(
+                    CONF_QUOTE_TTL_OPEN,
+                    default=self.options.get(
+                        CONF_QUOTE_TTL_OPEN, DEFAULT_QUOTE_TTL_OPEN
+                    ),
+                ): int,
+                vol.Optional(
+                    CONF_QUOTE_TTL_CLOSED,
+                    default=self.options.get(
+                        CONF_QUOTE_TTL_CLOSED, DEFAULT_QUOTE_TTL_CLOSED
+                    ),
+                ): int,
+                vol.Optional(
+                    CONF_QUOTE_FIELD,
+                    default=self.options.get(CONF_QUOTE_FIELD, DEFAULT_QUOTE_FIELD),
+                ): str,
+                vol.Optional(
+                    CONF_QUOTE_THRESHOLD,
+                    default=self.options.get(
+                        CONF_QUOTE_THRESHOLD, DEFAULT_QUOTE_THRESHOLD
+                    ),
+                ): str,
+                vol.Optional(
+                    CONF_QUOTE_ATTRIBUTE_INTERVAL,
+                    default=self.options.get(
+                        CONF_QUOTE_ATTRIBUTE_INTERVAL, DEFAULT_QUOTE_ATTRIBUTE_INTERVAL
+                    ),
+                ): int,
+                vol.Optional(
+                    CONF_ACCOUNT_ATTRIBUTES,
+                    default=",".join(
+                        self.options.get(
+                            CONF_ACCOUNT_ATTRIBUTES, DEFAULT_ACCOUNT_ATTRIBUTES
+                        )
+                    ),
+                ): str,
+                vol.Optional(
+                    CONF_PRICE_HISTORY,
+                    default=",".join(self.options.get(CONF_PRICE_HISTORY, [])),
+                ): str,
+                vol.Optional(
+                    CONF_INDICATORS,
+                    default=",".join(self.options.get(CONF_INDICATORS, [])),
+                ): str,
+                vol.Optional(
+                    CONF_OPTION_CONTRACTS,
+                    default=",".join(self.options.get(CONF_OPTION_CONTRACTS, [])),
+                ): str,
+                vol.Optional(
+                    CONF_ALERTS,
+                    default=",".join(self.options.get(CONF_ALERTS, [])),
+                ): str,
+                vol.Optional(
+                    CONF_STALE_GRACE_PERIOD,
+                    default=self.options.get(
+                        CONF_STALE_GRACE_PERIOD, DEFAULT_STALE_GRACE_PERIOD
+                    ),
+                ): int,
+                vol.Optional(
+                    CONF_DEBUG_SENSORS,
+                    default=self.options.get(CONF_DEBUG_SENSORS, False),
+                ): bool,
             }
         )
-        return self.async_show_form(step_id="init", data_schema=data_schema)
+        return self.async_show_form(
+            step_id="init", data_schema=data_schema, errors=errors
+        )
 
     async def _update_accounts(self):
         """Update config entry options."""
         self.hass.config_entries.async_update_entry(self.config_entry, data=self.data)
-        return self.async_create_entry(title="", data={})
+        return self.async_create_entry(title="", data=self.options)
@@ -11,19 +11,67 @@ TDA_URL = "https://api.tdameritrade.com/v1"
 
 CONF_CONSUMER_KEY = "consumer_key"
 CONF_ACCOUNTS = "accounts"
+CONF_WATCHLIST = "watchlist"
+CONF_QUOTE_TTL_OPEN = "quote_ttl_open"
+CONF_QUOTE_TTL_CLOSED = "quote_ttl_closed"
+CONF_ACCOUNT_ATTRIBUTES = "account_attributes"
+CONF_IDEMPOTENCY_KEY = "idempotency_key"
+CONF_PRICE_HISTORY = "price_history"
+CONF_INDICATORS = "indicators"
+CONF_DEBUG_SENSORS = "debug_sensors"
+CONF_STALE_GRACE_PERIOD = "stale_grace_period"
+CONF_OPTION_CONTRACTS = "option_contracts"
+CONF_QUOTE_FIELD = "quote_field"
+CONF_QUOTE_THRESHOLD = "quote_threshold"
+CONF_QUOTE_ATTRIBUTE_INTERVAL = "quote_attribute_interval"
+CONF_ALERTS = "alerts"
+CONF_IMPORT_WATCHLISTS = "import_watchlists"
+CONF_MOVERS = "movers"
 
 # API const
 CLIENT = "client"
+COORDINATOR = "coordinator"
+MARKET_HOURS = "market_hours"
+STREAMER = "streamer"
+LIMITER = "limiter"
+QUOTE_CACHE = "quote_cache"
+QUOTE_STATES = "quote_states"
+OPTIONS = "options"
+ORDER_SUBMITTER = "order_submitter"
+ORDER_TRACKER = "order_tracker"
+SCHEDULER = "scheduler"
+PRICE_HISTORY = "price_history"
+HISTORY_COORDINATOR = "history_coordinator"
+INDICATOR_ENGINE = "indicator_engine"
+STARTUP = "startup"
+OPTION_CHAINS = "option_chains"
+OPTION_COORDINATOR = "option_coordinator"
+UNIQUE_ID_SUFFIX = "unique_id_suffix"
+PORTFOLIO = "portfolio"
+TIMESERIES = "timeseries"
+TIMESERIES_RECORDER = "timeseries_recorder"
+ALERT_ENGINE = "alert_engine"
+IMPORT_COORDINATOR = "import_coordinator"
+IMPORT_QUOTES_COORDINATOR = "import_quotes_coordinator"
 PRE_MARKET = "preMarket"
 POST_MARKET = "postMarket"
 REG_MARKET = "regularMarket"
 EQUITY = "equity"
 EQ = "EQ"
 SECURITIES_ACCOUNT = "securitiesAccount"
+ACCOUNT_ID = "accountId"
 TYPE = "type"
 CASH_AVAILABLE_FOR_TRADEING = "cashAvailableForTrading"
 CURRENT_BALANCES = "currentBalances"
 AVAILABLE_FUNDS = "availableFunds"
+POSITIONS = "positions"
+INSTRUMENT = "instrument"
+SYMBOL = "symbol"
+LONG_QUANTITY = "longQuantity"
+SHORT_QUANTITY = "shortQuantity"
+MARKET_VALUE = "marketValue"
+AVERAGE_PRICE = "averagePrice"
+CURRENT_DAY_PROFIT_LOSS = "currentDayProfitLoss"
 MARGIN = "MARGIN"
 CASH = "CASH"
 SESSION_HOURS = "sessionHours"
@@ -34,3 +82,109 @@ EQUITY_MKT_TYPE = "EQUITY"
 
 OPEN_SCAN_INTERVAL = 10
 CLOSED_SCAN_INTERVAL = 300
+# Up to this fraction of the interval is added to spread refreshes out
+SCAN_JITTER = 0.1
+
+QUOTE_CHUNK_SIZE = 100
+MAX_CONCURRENT_QUOTE_REQUESTS = 4
+QUOTE_CACHE_SIZE = 500
+DEFAULT_QUOTE_TTL_OPEN = 1
+DEFAULT_QUOTE_TTL_CLOSED = 60
+# Quote sensors write their state when the field moves by the threshold,
+# given in dollars or as a percentage like 0.5%, and their other
+# attributes at most once per interval.
+DEFAULT_QUOTE_FIELD = "lastPrice"
+DEFAULT_QUOTE_THRESHOLD = "0"
+DEFAULT_QUOTE_ATTRIBUTE_INTERVAL = 60
+
+# Account fields copied into the account sensor attributes, nested fields
+# are given as dotted paths and exposed under their last key, or their full
+# path when several fields share a last key.
+DEFAULT_ACCOUNT_ATTRIBUTES = [
+    "accountId",
+    "type",
+    "roundTrips",
+    "isDayTrader",
+    "isClosingOnlyRestricted",
+    "currentBalances.liquidationValue",
+    "currentBalances.cashBalance",
+    "currentBalances.buyingPower",
+    "currentBalances.availableFunds",
+    "currentBalances.cashAvailableForTrading",
+    "currentBalances.longMarketValue",
+]
+
+# Client side rate limit, TDA allows 120 requests per minute
+REQUESTS_PER_MINUTE = 120
+REQUEST_BURST = 10
+PRIORITY_ORDER = 0
+PRIORITY_QUOTE = 1
+PRIORITY_ACCOUNT = 2
+PRIORITY_HISTORY = 3
+
+MAX_CONCURRENT_ORDERS = 5
+# Seconds an idempotency key is remembered after its order was submitted
+IDEMPOTENCY_TTL = 86400
+
+EVENT_ORDERS_PLACED = "tdameritrade_orders_placed"
+EVENT_ORDER_UPDATED = "tdameritrade_order_updated"
+EVENT_PRICE_HISTORY = "tdameritrade_price_history"
+EVENT_OPTION_CHAIN = "tdameritrade_option_chain"
+EVENT_OPTION_CONTRACTS = "tdameritrade_option_contracts"
+EVENT_HISTORY = "tdameritrade_history"
+EVENT_ALERT = "tdameritrade_alert"
+
+# Open orders are polled every ORDER_POLL_MIN seconds after a submission,
+# doubling while nothing changes up to ORDER_POLL_MAX seconds.
+ORDER_POLL_MIN = 1
+ORDER_POLL_MAX = 60
+# Orders missing from this many successful polls are no longer tracked
+ORDER_MISSING_POLLS = 5
+# Orders are listed from this many seconds before the oldest tracked one
+# was submitted, allowing for clock skew with the API
+ORDER_ENTERED_SLACK = 300
+
+# Days of candles fetched the first time a series is requested
+DEFAULT_HISTORY_DAYS = {
+    "1min": 10,
+    "5min": 30,
+    "10min": 30,
+    "15min": 30,
+    "30min": 30,
+    "daily": 730,
+    "weekly": 3650,
+    "monthly": 3650,
+}
+HISTORY_SCAN_INTERVAL = 300
+OPTION_SCAN_INTERVAL = 60
+# Imported watchlists and movers are refreshed every IMPORT_SCAN_INTERVAL
+# seconds, and the quotes of their symbols polled every OPEN_SCAN_INTERVAL.
+IMPORT_SCAN_INTERVAL = 300
+
+# Balances and prices are written to the local time series every
+# TIMESERIES_FLUSH_INTERVAL seconds and rolled up into coarser buckets
+# every TIMESERIES_COMPACT_INTERVAL seconds.
+TIMESERIES_FLUSH_INTERVAL = 30
+TIMESERIES_COMPACT_INTERVAL = 3600
+
+# Spread the first fetches over this many seconds after HA has started, and
+# fetch price history after the accounts
+STARTUP_DELAY = 10
+STARTUP_HISTORY_DELAY = 30
+
+# Retry transient failures of idempotent requests with a jittered backoff
+# and stop calling an endpoint for a while after repeated failures
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF_MIN = 0.5
+RETRY_BACKOFF_MAX = 10
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 60
+# Keep serving the last good data, flagged stale, for this many seconds
+DEFAULT_STALE_GRACE_PERIOD = 900
+
+# Refresh the 30 minute access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
+
+SIGNAL_QUOTE_UPDATE = "tdameritrade_quote_update_{}"
+SIGNAL_INDICATOR_UPDATE = "tdameritrade_indicator_update_{}"
+SIGNAL_PORTFOLIO_UPDATE = "tdameritrade_portfolio_update_{}"
@@ -0,0 +1,386 @@
+"""Data update coordinator for the TDAmeritrade accounts."""
+import asyncio
+import logging
+import time
+
+from abc import ABC, abstractmethod
+from datetime import timedelta
+
+from aiohttp.client_exceptions import ClientConnectorError, ClientResponseError, ServerDisconnectedError
+
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .const import (
+    DOMAIN,
+    ACCOUNT_ID,
+    SECURITIES_ACCOUNT,
+    POSITIONS,
+    PRE_MARKET,
+    REG_MARKET,
+    POST_MARKET,
+    HISTORY_SCAN_INTERVAL,
+    OPTION_SCAN_INTERVAL,
+    IMPORT_SCAN_INTERVAL,
+    OPEN_SCAN_INTERVAL,
+    DEFAULT_STALE_GRACE_PERIOD,
+)
+from .chains import parse_contract_symbol
+from .resilience import CircuitOpenError
+from .watchlists import add_movers_symbols, add_watchlist_symbols
+
+CLIENT_EXCEPTIONS = (
+    ClientConnectorError,
+    ClientResponseError,
+    ServerDisconnectedError,
+    CircuitOpenError,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _market_closed(market_hours):
+    """Return True if today's hours are known and no session is open."""
+    return market_hours.loaded and not any(
+        market_hours.is_session_open(session)
+        for session in (PRE_MARKET, REG_MARKET, POST_MARKET)
+    )
+
+
+class StaleDataCoordinator(DataUpdateCoordinator, ABC):
+    """Keep serving the last good data for a grace period after failures.
+
+    Subclasses implement _async_fetch_data.  While a failed update is
+    within grace_period seconds of the last successful one the previous
+    data is kept and stale is set, so entities stay available.
+    """
+
+    def __init__(self, hass, name, update_interval, grace_period):
+        """Initialize the coordinator."""
+        super().__init__(hass, _LOGGER, name=name, update_interval=update_interval)
+        self.stale = False
+        self._grace_period = grace_period
+        self._last_success = None
+
+    async def _async_update_data(self):
+        """Fetch the data, falling back to the last good data."""
+        try:
+            data = await self._async_fetch_data()
+        except (UpdateFailed, asyncio.TimeoutError, *CLIENT_EXCEPTIONS) as error:
+            if (
+                self.data is None
+                or self._last_success is None
+                or time.monotonic() - self._last_success > self._grace_period
+            ):
+                self.stale = False
+                if isinstance(error, UpdateFailed):
+                    raise
+                raise UpdateFailed(f"Client Exception: {error}") from error
+            _LOGGER.warning(
+                "Update of %s failed, keeping data from %.0f seconds ago: %s",
+                self.name,
+                time.monotonic() - self._last_success,
+                error,
+            )
+            self.stale = True
+            return self.data
+        self.stale = False
+        self._last_success = time.monotonic()
+        return data
+
+    @abstractmethod
+    async def _async_fetch_data(self):
+        """Return fresh data."""
+
+
+class AccountsCoordinator(StaleDataCoordinator):
+    """Fetch every configured account in one request and share the result.
+
+    Refreshes are driven by the ScanScheduler rather than an update interval.
+    """
+
+    def __init__(
+        self, hass, client, accounts, grace_period=DEFAULT_STALE_GRACE_PERIOD
+    ):
+        """Initialize the accounts coordinator."""
+        super().__init__(hass, f"{DOMAIN} accounts", None, grace_period)
+        self._client = client
+        self._accounts = list(accounts or [])
+
+    async def _async_fetch_data(self):
+        """Return the account responses keyed by account id."""
+        try:
+            resp = await self._client.async_get_accounts(fields=POSITIONS)
+        except CLIENT_EXCEPTIONS as error:
+            _LOGGER.debug("Bulk account request failed, fetching individually: %s", error)
+            resp = []
+
+        data = {}
+        for account in resp or []:
+            account_id = str(account[SECURITIES_ACCOUNT][ACCOUNT_ID])
+            if account_id in self._accounts:
+                data[account_id] = account
+
+        missing = [account_id for account_id in self._accounts if account_id not in data]
+        if missing:
+            data.update(await self._async_fetch_each(missing))
+
+        if self._accounts and not data:
+            raise UpdateFailed("Failed to update any account")
+        return data
+
+    async def _async_fetch_each(self, account_ids):
+        """Fall back to one request per account."""
+        results = await asyncio.gather(
+            *[
+                self._client.async_get_account(account_id, fields=POSITIONS)
+                for account_id in account_ids
+            ],
+            return_exceptions=True,
+        )
+        data = {}
+        for account_id, result in zip(account_ids, results):
+            if isinstance(result, CLIENT_EXCEPTIONS):
+                _LOGGER.warning("Client Exception: %s", result)
+            elif isinstance(result, Exception):
+                raise result
+            elif result:
+                data[account_id] = result
+        return data
+
+
+class PriceHistoryCoordinator(StaleDataCoordinator):
+    """Keep the configured price history series up to date."""
+
+    def __init__(
+        self,
+        hass,
+        store,
+        market_hours,
+        series,
+        grace_period=DEFAULT_STALE_GRACE_PERIOD,
+    ):
+        """Initialize the price history coordinator."""
+        super().__init__(
+            hass,
+            f"{DOMAIN} price history",
+            timedelta(seconds=HISTORY_SCAN_INTERVAL),
+            grace_period,
+        )
+        self._store = store
+        self._market_hours = market_hours
+        self._series = series
+
+    async def _async_fetch_data(self):
+        """Return the candles keyed by (symbol, frequency)."""
+        if self.data and _market_closed(self._market_hours):
+            return self.data
+
+        results = await asyncio.gather(
+            *[
+                self._store.async_update(symbol, frequency)
+                for symbol, frequency in self._series
+            ],
+            return_exceptions=True,
+        )
+        data = dict(self.data or {})
+        for key, result in zip(self._series, results):
+            if isinstance(result, CLIENT_EXCEPTIONS):
+                _LOGGER.warning("Client Exception: %s", result)
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                data[key] = result
+
+        if self._series and not data:
+            raise UpdateFailed("Failed to update any price history")
+        return data
+
+
+class OptionContractsCoordinator(StaleDataCoordinator):
+    """Keep the configured option contracts up to date.
+
+    Contracts are fetched from chains filtered down to their expiration
+    and strike, one request per underlying, expiration and strike.
+    """
+
+    def __init__(
+        self,
+        hass,
+        store,
+        market_hours,
+        contracts,
+        grace_period=DEFAULT_STALE_GRACE_PERIOD,
+    ):
+        """Initialize the option contracts coordinator."""
+        super().__init__(
+            hass,
+            f"{DOMAIN} option contracts",
+            timedelta(seconds=OPTION_SCAN_INTERVAL),
+            grace_period,
+        )
+        self._store = store
+        self._market_hours = market_hours
+        self._contracts = contracts
+        self._groups = {}
+        for symbol in contracts:
+            underlying, expiration, contract_type, strike = parse_contract_symbol(symbol)
+            types = self._groups.setdefault((underlying, expiration, strike), set())
+            types.add(contract_type)
+
+    async def _async_fetch_data(self):
+        """Return the contracts keyed by contract symbol."""
+        if self.data and _market_closed(self._market_hours):
+            return self.data
+
+        results = await asyncio.gather(
+            *[
+                self._store.async_fetch(
+                    underlying,
+                    contract_type=next(iter(types)) if len(types) == 1 else "ALL",
+                    from_date=expiration,
+                    to_date=expiration,
+                    strike=strike,
+                    store=False,
+                )
+                for (underlying, expiration, strike), types in self._groups.items()
+            ],
+            return_exceptions=True,
+        )
+        data = dict(self.data or {})
+        for result in results:
+            if isinstance(result, CLIENT_EXCEPTIONS):
+                _LOGGER.warning("Client Exception: %s", result)
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                for symbol in self._contracts:
+                    contract = result.contract(symbol)
+                    if contract is not None:
+                        data[symbol] = contract
+
+        if self._contracts and not data:
+            raise UpdateFailed("Failed to update any option contract")
+        return data
+
+
+class ImportedSymbolsCoordinator(StaleDataCoordinator):
+    """Keep the symbols of the login's watchlists and the market movers.
+
+    The data maps each symbol to the watchlists and movers it came from.
+    A list that fails to refresh keeps its last symbols.
+    """
+
+    def __init__(
+        self,
+        hass,
+        client,
+        accounts,
+        watchlists,
+        movers,
+        grace_period=DEFAULT_STALE_GRACE_PERIOD,
+    ):
+        """Initialize the imported symbols coordinator."""
+        super().__init__(
+            hass,
+            f"{DOMAIN} imported symbols",
+            timedelta(seconds=IMPORT_SCAN_INTERVAL),
+            grace_period,
+        )
+        self._client = client
+        self._lists = []
+        if watchlists:
+            # Without configured accounts every linked account's watchlists
+            # come back from one request.
+            self._lists += [("watchlists", x) for x in accounts or [None]]
+        self._lists += [("movers", x) for x in movers]
+        self._responses = {}
+
+    async def _async_fetch_data(self):
+        """Return the sources of each imported symbol, keyed by symbol."""
+        results = await asyncio.gather(
+            *[
+                self._client.async_get_watchlists(key)
+                if kind == "watchlists"
+                else self._client.async_get_movers(*key)
+                for kind, key in self._lists
+            ],
+            return_exceptions=True,
+        )
+        for key, result in zip(self._lists, results):
+            if isinstance(result, CLIENT_EXCEPTIONS):
+                _LOGGER.warning("Client Exception: %s", result)
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                self._responses[key] = result
+
+        if self._lists and not self._responses:
+            raise UpdateFailed("Failed to update any watchlist or movers")
+        data = {}
+        for (kind, key), result in self._responses.items():
+            if kind == "watchlists":
+                add_watchlist_symbols(data, result)
+            else:
+                add_movers_symbols(data, key, result)
+        return data
+
+
+class ImportedQuotesCoordinator(StaleDataCoordinator):
+    """Poll the quotes of the imported symbols that are not streamed.
+
+    Every symbol is fetched through the quote cache at once, which asks
+    for them in as few bulk quote requests as possible.
+    """
+
+    def __init__(
+        self,
+        hass,
+        quote_cache,
+        market_hours,
+        symbols_coordinator,
+        streamed,
+        grace_period=DEFAULT_STALE_GRACE_PERIOD,
+    ):
+        """Initialize the imported quotes coordinator."""
+        super().__init__(
+            hass,
+            f"{DOMAIN} imported quotes",
+            timedelta(seconds=OPEN_SCAN_INTERVAL),
+            grace_period,
+        )
+        self._quote_cache = quote_cache
+        self._market_hours = market_hours
+        self._symbols_coordinator = symbols_coordinator
+        self._streamed = set(streamed)
+
+    @property
+    def symbols(self):
+        """Return the polled symbols."""
+        return [
+            symbol
+            for symbol in self._symbols_coordinator.data or {}
+            if symbol not in self._streamed
+        ]
+
+    @property
+    def quotes(self):
+        """Return the latest quote polled for each symbol."""
+        return self.data or {}
+
+    async def _async_fetch_data(self):
+        """Return the quotes keyed by symbol."""
+        symbols = self.symbols
+        previous = self.data or {}
+        if (
+            previous
+            and _market_closed(self._market_hours)
+            and all(symbol in previous for symbol in symbols)
+        ):
+            return {symbol: previous[symbol] for symbol in symbols}
+
+        quotes = await self._quote_cache.async_get_quotes(symbols) if symbols else {}
+        return {
+            symbol: quotes.get(symbol, previous.get(symbol))
+            for symbol in symbols
+            if symbol in quotes or symbol in previous
+        }
@@ -0,0 +1,45 @@
+"""Diagnostics support for TDAmeritrade."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    CLIENT,
+    COORDINATOR,
+    MARKET_HOURS,
+    CONF_ACCOUNTS,
+    CONF_CONSUMER_KEY,
+)
+
+TO_REDACT = {CONF_ACCOUNTS, CONF_CONSUMER_KEY, "token"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """Return diagnostics for a config entry."""
+    config = hass.data[DOMAIN][entry.entry_id]
+    client = config[CLIENT]
+    coordinator = config[COORDINATOR]
+    market_hours = config[MARKET_HOURS]
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "requests": client.metrics.as_dict(),
+        "request_totals": client.metrics.totals,
+        "circuit_breakers": {
+            name: breaker.metrics for name, breaker in client.breakers.items()
+        },
+        "limiter": client.limiter.metrics,
+        "token_refresh": client.auth.metrics,
+        "accounts": {
+            "last_update_success": coordinator.last_update_success,
+            "stale": coordinator.stale,
+            "accounts": len(coordinator.data or {}),
+        },
+        "market_hours": {
+            "loaded": market_hours.loaded,
+            "date": str(market_hours.date),
+        },
+    }
@@ -0,0 +1,172 @@
+"""Price history candles cached on disk for the TDAmeritrade integration."""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+
+import numpy as np
+
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .const import DOMAIN, DEFAULT_HISTORY_DAYS
+
+CANDLE_DTYPE = np.dtype(
+    [
+        ("datetime", "<i8"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+
+# Frequency: (periodType, frequencyType, frequency)
+FREQUENCIES = {
+    "1min": ("day", "minute", 1),
+    "5min": ("day", "minute", 5),
+    "10min": ("day", "minute", 10),
+    "15min": ("day", "minute", 15),
+    "30min": ("day", "minute", 30),
+    "daily": ("year", "daily", 1),
+    "weekly": ("year", "weekly", 1),
+    "monthly": ("year", "monthly", 1),
+}
+
+DAY_MS = 86400 * 1000
+
+UNSAFE_CHARACTERS = re.compile(r"[^A-Za-z0-9]+")
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_history_option(value):
+    """Return the (symbol, frequency) pair of a SYMBOL:frequency string."""
+    symbol, _, frequency = value.partition(":")
+    frequency = frequency.strip().lower() or "daily"
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown price history frequency {frequency}")
+    return symbol.strip().upper(), frequency
+
+
+def candles_from_response(resp):
+    """Convert a pricehistory response into a candle array."""
+    candles = resp.get("candles") or []
+    array = np.empty(len(candles), dtype=CANDLE_DTYPE)
+    for index, candle in enumerate(candles):
+        array[index] = (
+            candle["datetime"],
+            candle["open"],
+            candle["high"],
+            candle["low"],
+            candle["close"],
+            candle.get("volume", 0),
+        )
+    return array
+
+
+def merge_candles(cached, fetched):
+    """Replace the cached candles from the first fetched one onwards."""
+    if not len(fetched):
+        return cached
+    if not len(cached):
+        return fetched
+    keep = cached[cached["datetime"] < fetched["datetime"][0]]
+    return np.concatenate([keep, fetched])
+
+
+class PriceHistoryStore:
+    """Keep candles per symbol and frequency, fetching only missing bars.
+
+    Each series is stored as a NumPy file under .storage and memory mapped
+    when loaded.  Updates refetch from the last cached bar, which may have
+    been incomplete, to now.
+    """
+
+    def __init__(self, hass, client):
+        """Initialize the price history store."""
+        self._hass = hass
+        self._client = client
+        self._path = hass.config.path(STORAGE_DIR, f"{DOMAIN}_history")
+        self._candles = {}
+        self._locks = {}
+
+    def candles(self, symbol, frequency):
+        """Return the cached candles, or None if they were never loaded."""
+        return self._candles.get((symbol, frequency))
+
+    async def async_update(self, symbol, frequency, days=None):
+        """Fetch the bars missing from the cache and return all candles."""
+        key = (symbol, frequency)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = self._candles.get(key)
+            if cached is None:
+                cached = await self._hass.async_add_executor_job(self._load, key)
+
+            now = int(time.time() * 1000)
+            start = now - (days or DEFAULT_HISTORY_DAYS[frequency]) * DAY_MS
+            if len(cached) and (days is None or cached["datetime"][0] <= start):
+                start = int(cached["datetime"][-1])
+            elif len(cached):
+                # A longer lookback than cached was asked for, refetch it all.
+                cached = cached[:0]
+
+            period_type, frequency_type, interval = FREQUENCIES[frequency]
+            resp = await self._client.async_get_price_history(
+                symbol,
+                period_type=period_type,
+                frequency_type=frequency_type,
+                frequency=interval,
+                start_date=start,
+                end_date=now,
+            )
+            fetched = candles_from_response(resp)
+            candles = merge_candles(cached, fetched)
+            _LOGGER.debug(
+                "Fetched %s %s bars for %s, %s cached",
+                len(fetched),
+                frequency,
+                symbol,
+                len(candles),
+            )
+            if len(fetched):
+                await self._hass.async_add_executor_job(self._save, key, candles)
+            self._candles[key] = candles
+            return candles
+
+    def _file(self, key):
+        """Return the path of a series.
+
+        Symbols with characters other than letters and digits, like $SPX.X
+        or BRK/B, are named with those replaced and a hash of the symbol,
+        so they can't leave the directory or collide.
+        """
+        symbol, frequency = key
+        name = UNSAFE_CHARACTERS.sub("_", symbol)
+        if name != symbol:
+            name = f"{name}_{hashlib.sha256(symbol.encode()).hexdigest()[:8]}"
+        return os.path.join(self._path, f"{name}_{frequency}.npy")
+
+    def _load(self, key):
+        """Load a series from disk."""
+        try:
+            candles = np.load(self._file(key), mmap_mode="r")
+        except (FileNotFoundError, ValueError) as error:
+            if not isinstance(error, FileNotFoundError):
+                _LOGGER.warning("Discarding unreadable price history %s: %s", key, error)
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        if candles.dtype != CANDLE_DTYPE:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return candles
+
+    def _save(self, key, candles):
+        """Write a series to disk atomically."""
+        os.makedirs(self._path, exist_ok=True)
+        path = self._file(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, np.ascontiguousarray(candles))
+        os.replace(tmp_path, path)
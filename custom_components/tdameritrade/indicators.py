@@ -0,0 +1,429 @@
+"""Technical indicators computed over the cached price history candles."""
+import logging
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import (
+    async_dispatcher_connect,
+    async_dispatcher_send,
+)
+from homeassistant.util import dt
+
+from .const import SIGNAL_QUOTE_UPDATE, SIGNAL_INDICATOR_UPDATE
+from .history import parse_history_option
+
+EXCHANGE_TIME_ZONE = "America/New_York"
+DAY_MS = 86400 * 1000
+BOLLINGER_WIDTH = 2
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _ewm(values, alpha, seed=None):
+    """Return the last exponentially weighted mean of values from seed."""
+    if not len(values):
+        return seed
+    if seed is None:
+        seed, values = values[0], values[1:]
+    decay = (1 - alpha) ** np.arange(len(values) - 1, -1, -1)
+    return float(alpha * np.dot(decay, values) + (1 - alpha) ** len(values) * seed)
+
+
+class Indicator(ABC):
+    """An indicator advanced over complete bars only.
+
+    The last candle of a series may still be forming, so it is evaluated
+    against the committed state without being folded into it, as is a bar
+    patched with a streamed price.
+    """
+
+    name = None
+    unit = "Dollars"
+
+    def __init__(self, window):
+        """Initialize the indicator."""
+        self.window = window
+        self._last = None
+        self._bar = None
+
+    @property
+    def lookback(self):
+        """Return the number of bars needed to seed the indicator."""
+        return self.window
+
+    def update(self, candles):
+        """Commit the bars completed since the last update, return the value."""
+        if self._last is None:
+            bars = candles[-(self.lookback + 1):] if self.lookback else candles
+        else:
+            start = np.searchsorted(candles["datetime"], self._last, side="right")
+            bars = candles[start:]
+        if len(bars) > 1:
+            self._commit(bars[:-1])
+            self._last = int(bars["datetime"][-2])
+        if len(bars):
+            self._bar = bars[-1:].copy()
+        return self.evaluate()
+
+    def evaluate(self, price=None):
+        """Return the value with the forming bar, optionally at price."""
+        if self._bar is None:
+            return None, {}
+        bar = self._bar
+        if price is not None:
+            bar = bar.copy()
+            bar["close"] = price
+            bar["high"] = np.maximum(bar["high"], price)
+            bar["low"] = np.minimum(bar["low"], price)
+        return self._evaluate(bar)
+
+    @abstractmethod
+    def _commit(self, bars):
+        """Fold complete bars into the state."""
+
+    @abstractmethod
+    def _evaluate(self, bar):
+        """Return the value and attributes given the forming bar."""
+
+
+class SMA(Indicator):
+    """Simple moving average of the close."""
+
+    name = "sma"
+
+    def __init__(self, window):
+        """Initialize the indicator."""
+        super().__init__(window)
+        self._closes = np.empty(0)
+
+    def _commit(self, bars):
+        """Keep the closes of the last window bars."""
+        self._closes = np.concatenate([self._closes, bars["close"]])[-self.window:]
+
+    def _window(self, bar):
+        """Return the window of closes ending at bar."""
+        return np.concatenate([self._closes, bar["close"]])[-self.window:]
+
+    def _evaluate(self, bar):
+        """Return the mean close."""
+        closes = self._window(bar)
+        if len(closes) < self.window:
+            return None, {}
+        return float(closes.mean()), {}
+
+
+class Bollinger(SMA):
+    """Bollinger bands two standard deviations around the moving average."""
+
+    name = "bollinger"
+
+    def _evaluate(self, bar):
+        """Return the middle band, with the upper and lower bands."""
+        closes = self._window(bar)
+        if len(closes) < self.window:
+            return None, {}
+        middle = float(closes.mean())
+        width = BOLLINGER_WIDTH * float(closes.std())
+        return middle, {"upper": middle + width, "lower": middle - width}
+
+
+class EMA(Indicator):
+    """Exponential moving average of the close."""
+
+    name = "ema"
+
+    def __init__(self, window):
+        """Initialize the indicator."""
+        super().__init__(window)
+        self._alpha = 2 / (window + 1)
+        self._ema = None
+
+    @property
+    def lookback(self):
+        """Return enough bars for the seed to have decayed away."""
+        return 10 * self.window
+
+    def _commit(self, bars):
+        """Advance the average over the bars."""
+        self._ema = _ewm(bars["close"], self._alpha, self._ema)
+
+    def _evaluate(self, bar):
+        """Return the average including the forming bar."""
+        return _ewm(bar["close"], self._alpha, self._ema), {}
+
+
+class RSI(Indicator):
+    """Wilder's relative strength index."""
+
+    name = "rsi"
+    unit = "%"
+
+    def __init__(self, window):
+        """Initialize the indicator."""
+        super().__init__(window)
+        self._alpha = 1 / window
+        self._close = None
+        self._gain = None
+        self._loss = None
+
+    @property
+    def lookback(self):
+        """Return enough bars for the seed to have decayed away."""
+        return 10 * self.window
+
+    def _changes(self, bars):
+        """Return the gains and losses of the bars."""
+        closes = bars["close"]
+        if self._close is not None:
+            closes = np.concatenate([[self._close], closes])
+        changes = np.diff(closes)
+        return np.clip(changes, 0, None), np.clip(-changes, 0, None)
+
+    def _commit(self, bars):
+        """Advance the average gain and loss over the bars."""
+        gains, losses = self._changes(bars)
+        self._gain = _ewm(gains, self._alpha, self._gain)
+        self._loss = _ewm(losses, self._alpha, self._loss)
+        self._close = float(bars["close"][-1])
+
+    def _evaluate(self, bar):
+        """Return the index including the forming bar."""
+        if self._close is None:
+            return None, {}
+        gains, losses = self._changes(bar)
+        gain = _ewm(gains, self._alpha, self._gain)
+        loss = _ewm(losses, self._alpha, self._loss)
+        if not loss:
+            return 100.0, {}
+        return 100 - 100 / (1 + gain / loss), {}
+
+
+class ATR(Indicator):
+    """Wilder's average true range."""
+
+    name = "atr"
+
+    def __init__(self, window):
+        """Initialize the indicator."""
+        super().__init__(window)
+        self._alpha = 1 / window
+        self._close = None
+        self._atr = None
+
+    @property
+    def lookback(self):
+        """Return enough bars for the seed to have decayed away."""
+        return 10 * self.window
+
+    def _true_ranges(self, bars):
+        """Return the true range of each bar."""
+        high, low = bars["high"], bars["low"]
+        previous = np.concatenate(
+            [[np.nan if self._close is None else self._close], bars["close"][:-1]]
+        )
+        return np.fmax(
+            high - low, np.fmax(np.abs(high - previous), np.abs(low - previous))
+        )
+
+    def _commit(self, bars):
+        """Advance the average over the bars."""
+        self._atr = _ewm(self._true_ranges(bars), self._alpha, self._atr)
+        self._close = float(bars["close"][-1])
+
+    def _evaluate(self, bar):
+        """Return the average including the forming bar."""
+        return _ewm(self._true_ranges(bar), self._alpha, self._atr), {}
+
+
+class VWAP(Indicator):
+    """Volume weighted average typical price since the start of the day."""
+
+    name = "vwap"
+
+    def __init__(self, window=None):
+        """Initialize the indicator."""
+        super().__init__(None)
+        self._day = None
+        self._value = 0.0
+        self._volume = 0.0
+
+    @property
+    def lookback(self):
+        """Return None, the whole day is needed."""
+        return None
+
+    @staticmethod
+    def _days(bars):
+        """Return the exchange date of each bar as a day number."""
+        last = dt.utc_from_timestamp(bars["datetime"][-1] / 1000)
+        offset = last.astimezone(dt.get_time_zone(EXCHANGE_TIME_ZONE)).utcoffset()
+        return (bars["datetime"] + int(offset.total_seconds() * 1000)) // DAY_MS
+
+    @staticmethod
+    def _sums(bars):
+        """Return the volume weighted typical price and the volume."""
+        typical = (bars["high"] + bars["low"] + bars["close"]) / 3
+        return float(np.dot(typical, bars["volume"])), float(bars["volume"].sum())
+
+    def _commit(self, bars):
+        """Add the bars of the latest day, starting over on a new day."""
+        days = self._days(bars)
+        if days[-1] != self._day:
+            self._day, self._value, self._volume = days[-1], 0.0, 0.0
+        value, volume = self._sums(bars[days == self._day])
+        self._value += value
+        self._volume += volume
+
+    def _evaluate(self, bar):
+        """Return the average including the forming bar."""
+        value, volume = self._sums(bar)
+        if self._days(bar)[-1] == self._day:
+            value += self._value
+            volume += self._volume
+        if not volume:
+            return float(bar["close"][-1]), {}
+        return value / volume, {}
+
+
+INDICATORS = {
+    indicator.name: indicator for indicator in [SMA, EMA, RSI, VWAP, Bollinger, ATR]
+}
+DEFAULT_WINDOWS = {"sma": 20, "ema": 20, "rsi": 14, "vwap": None, "bollinger": 20, "atr": 14}
+
+
+def parse_indicator_option(value):
+    """Return the (symbol, frequency, indicator, window) of SYMBOL:frequency:indicator[:window]."""
+    parts = [x.strip() for x in value.split(":")]
+    if len(parts) not in (3, 4):
+        raise ValueError(f"Expected SYMBOL:frequency:indicator[:window], got {value}")
+    symbol, frequency = parse_history_option(":".join(parts[:2]))
+    name = parts[2].lower()
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator {name}")
+    window = DEFAULT_WINDOWS[name]
+    if window is not None and len(parts) == 4:
+        window = int(parts[3])
+        if window < 1:
+            raise ValueError(f"Indicator window must be positive, got {window}")
+    return symbol, frequency, name, window
+
+
+def format_indicator_option(key):
+    """Return the option string of an indicator key."""
+    return ":".join(str(x) for x in key if x is not None)
+
+
+class IndicatorEngine:
+    """Keep the configured indicators current in the executor.
+
+    Indicators are advanced over new candles when the price history
+    coordinator updates and re-evaluated at streamed prices between
+    fetches.  Updates that arrive while a computation runs are coalesced
+    into the next one.
+    """
+
+    def __init__(self, hass, coordinator, keys):
+        """Initialize the indicator engine."""
+        self._hass = hass
+        self._coordinator = coordinator
+        self._indicators = {key: INDICATORS[key[2]](key[3]) for key in keys}
+        self._candles = {}
+        self._prices = {}
+        self._running = False
+        self._dirty = False
+        self._unsubs = []
+        self.values = {}
+
+    @property
+    def series(self):
+        """Return the (symbol, frequency) series the indicators need."""
+        return list(dict.fromkeys(key[:2] for key in self._indicators))
+
+    @callback
+    def async_start(self):
+        """Listen for new candles and streamed quotes."""
+        if not self._indicators:
+            return
+        self._unsubs.append(
+            self._coordinator.async_add_listener(self._async_request_update)
+        )
+        for symbol in dict.fromkeys(key[0] for key in self._indicators):
+            self._unsubs.append(
+                async_dispatcher_connect(
+                    self._hass,
+                    SIGNAL_QUOTE_UPDATE.format(symbol),
+                    self._async_handle_quote,
+                )
+            )
+
+    @callback
+    def async_stop(self):
+        """Stop listening."""
+        while self._unsubs:
+            self._unsubs.pop()()
+
+    @callback
+    def _async_handle_quote(self, quote):
+        """Re-evaluate the indicators of a symbol at a streamed price."""
+        price = quote.get("lastPrice")
+        if price is None:
+            return
+        self._prices[quote.get("symbol")] = price
+        self._async_request_update()
+
+    @callback
+    def _async_request_update(self):
+        """Start an update, or flag one if an update is running."""
+        if self._running:
+            self._dirty = True
+            return
+        self._running = True
+        self._hass.async_create_task(self._async_update())
+
+    async def _async_update(self):
+        """Run updates in the executor until nothing changed meanwhile."""
+        try:
+            while True:
+                self._dirty = False
+                candles = dict(self._coordinator.data or {})
+                prices, self._prices = self._prices, {}
+                changed = await self._hass.async_add_executor_job(
+                    self._update, candles, prices
+                )
+                # The state read by the sensors is only written on the loop.
+                self._candles = {key: candles.get(key[:2]) for key in self._indicators}
+                self.values.update(changed)
+                for key in changed:
+                    async_dispatcher_send(
+                        self._hass,
+                        SIGNAL_INDICATOR_UPDATE.format(format_indicator_option(key)),
+                    )
+                if not self._dirty:
+                    break
+        finally:
+            self._running = False
+
+    def _update(self, candles, prices):
+        """Advance and evaluate the indicators, return the values that changed."""
+        changed = {}
+        for key, indicator in self._indicators.items():
+            symbol, frequency = key[:2]
+            series = candles.get((symbol, frequency))
+            if series is None or not len(series):
+                continue
+            try:
+                if series is not self._candles.get(key):
+                    value = indicator.update(series)
+                elif symbol in prices:
+                    value = indicator.evaluate(prices[symbol])
+                else:
+                    continue
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Failed to compute %s", format_indicator_option(key))
+                continue
+            if value != self.values.get(key):
+                changed[key] = value
+        return changed
@@ -0,0 +1,122 @@
+"""Client side rate limiting for the TDAmeritrade API."""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from .const import REQUESTS_PER_MINUTE, REQUEST_BURST
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RequestLimiter:
+    """Token bucket that releases queued requests in priority order."""
+
+    def __init__(self, rate=REQUESTS_PER_MINUTE / 60, burst=REQUEST_BURST):
+        """Initialize the limiter with a rate in requests per second."""
+        self._rate = rate
+        self._capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._queue = []
+        self._counter = itertools.count()
+        self._waker = None
+        self._inflight = {}
+        self._requests = 0
+        self._coalesced = 0
+        self._throttled = 0
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @property
+    def queue_depth(self):
+        """Return the number of requests waiting for a token."""
+        return len(self._queue)
+
+    @property
+    def metrics(self):
+        """Return the limiter counters."""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self._max_queue_depth,
+            "requests": self._requests,
+            "coalesced": self._coalesced,
+            "throttled": self._throttled,
+            "average_wait": self._total_wait / self._requests if self._requests else 0.0,
+            "max_wait": self._max_wait,
+            "tokens": round(self._tokens, 2),
+        }
+
+    async def async_call(self, priority, func, key=None):
+        """Run func once a token is available.
+
+        Calls sharing a key while one is already in flight wait for that
+        call's result instead of making another request.
+        """
+        if key is not None and key in self._inflight:
+            self._coalesced += 1
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.ensure_future(self._async_call(priority, func))
+        if key is not None:
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _async_call(self, priority, func):
+        """Wait for a token then run func."""
+        await self.async_acquire(priority)
+        return await func()
+
+    async def async_acquire(self, priority):
+        """Wait until a token is available for a request of this priority."""
+        start = time.monotonic()
+        self._refill(start)
+        if not self._queue and self._tokens >= 1:
+            self._tokens -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._counter), future))
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._schedule()
+            await future
+        wait = time.monotonic() - start
+        self._requests += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        if wait > 1:
+            _LOGGER.debug("Request waited %.1f seconds for the rate limit", wait)
+
+    def async_throttled(self):
+        """Drain the bucket after the server rejected a request with a 429."""
+        self._throttled += 1
+        self._refill(time.monotonic())
+        self._tokens = min(self._tokens, 0)
+
+    def _refill(self, now):
+        """Add the tokens accrued since the last refill."""
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    def _schedule(self):
+        """Wake up when the next token will be available."""
+        if self._waker is not None or not self._queue:
+            return
+        delay = max(0, (1 - self._tokens) / self._rate)
+        self._waker = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        """Hand out the available tokens to the highest priority waiters."""
+        self._waker = None
+        self._refill(time.monotonic())
+        while self._queue and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        self._schedule()
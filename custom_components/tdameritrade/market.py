@@ -0,0 +1,140 @@
+"""Cached market session hours for the TDAmeritrade integration."""
+import asyncio
+import logging
+
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt
+
+from .const import (
+    DOMAIN,
+    EQUITY,
+    EQ,
+    START,
+    END,
+    SESSION_HOURS,
+    IS_OPEN,
+    EQUITY_MKT_TYPE,
+)
+
+STORAGE_KEY = f"{DOMAIN}_market_hours"
+STORAGE_VERSION = 1
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class MarketHours:
+    """Fetch the equity session hours once per trading date.
+
+    The last response is saved in .storage so a restart on the same date
+    reuses it instead of fetching it again.
+    """
+
+    def __init__(self, hass, client):
+        """Initialize the market hours cache."""
+        self._client = client
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._restored = False
+        self._lock = asyncio.Lock()
+        self._date = None
+        self._is_open = None
+        self._sessions = {}
+
+    @property
+    def date(self):
+        """Return the trading date of the cached hours."""
+        return self._date
+
+    @property
+    def loaded(self):
+        """Return True if the hours for today are cached."""
+        return self._date is not None and self._date == dt.now().date()
+
+    async def async_restore(self):
+        """Load the saved session hours if they are for today."""
+        async with self._lock:
+            await self._async_restore()
+        return self.loaded
+
+    async def _async_restore(self):
+        """Load the saved session hours once."""
+        if self._restored:
+            return
+        self._restored = True
+        saved = await self._store.async_load()
+        if not saved:
+            return
+        date = dt.parse_date(saved.get("date") or "")
+        if date == dt.now().date():
+            self.async_load(date, saved.get("response"))
+
+    async def async_refresh(self):
+        """Fetch the session hours unless today's are already cached."""
+        async with self._lock:
+            await self._async_restore()
+            if self.loaded:
+                return True
+            date = dt.now().date()
+            resp = await self._client.async_get_market_hours(EQUITY_MKT_TYPE)
+            if not self.async_load(date, resp):
+                return False
+            await self._store.async_save({"date": date.isoformat(), "response": resp})
+            return True
+
+    def async_load(self, date, resp):
+        """Parse a market hours response for the given date."""
+        if not resp:
+            return False
+        sessions = {}
+        try:
+            market = resp[EQUITY][EQ]
+        except KeyError:
+            market = None
+        if market is not None:
+            for name, hours in market.get(SESSION_HOURS, {}).items():
+                if hours:
+                    sessions[name] = (
+                        dt.parse_datetime(hours[0][START]),
+                        dt.parse_datetime(hours[0][END]),
+                    )
+            is_open = market.get(IS_OPEN, bool(sessions))
+        else:
+            try:
+                is_open = resp[EQUITY][EQUITY][IS_OPEN]
+            except KeyError:
+                _LOGGER.warning("Unexpected market hours response: %s", resp)
+                return False
+
+        self._date = date
+        self._is_open = is_open
+        self._sessions = sessions
+        _LOGGER.debug("Cached market hours for %s: %s", date, sessions)
+        return True
+
+    def session(self, market):
+        """Return the (start, end) of a session, or None if there is none."""
+        return self._sessions.get(market)
+
+    def is_session_open(self, market, now=None):
+        """Return True if the given session is in progress."""
+        if self._date is None:
+            return None
+        hours = self._sessions.get(market)
+        if hours is None:
+            return False
+        now = now or dt.now()
+        return hours[0] <= now < hours[1]
+
+    def is_trading_day(self):
+        """Return True if the market has any session on the cached date."""
+        return bool(self._is_open) or bool(self._sessions)
+
+    def next_transition(self, now=None):
+        """Return the next session boundary after now, if any."""
+        now = now or dt.now()
+        boundaries = [
+            point
+            for hours in self._sessions.values()
+            for point in hours
+            if point > now
+        ]
+        return min(boundaries, default=None)
@@ -0,0 +1,103 @@
+"""Request counters for the TDAmeritrade API client."""
+import bisect
+
+from collections import Counter
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+class EndpointMetrics:
+    """Counters and a latency histogram for one endpoint."""
+
+    def __init__(self):
+        """Initialize the endpoint counters."""
+        self.calls = 0
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.throttled = 0
+        self.statuses = Counter()
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, latency, status=None, error=False):
+        """Record a request sent to the API."""
+        self.requests += 1
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if status is not None:
+            self.statuses[status] += 1
+        if status == 429:
+            self.throttled += 1
+        if error:
+            self.errors += 1
+
+    def percentile(self, pct):
+        """Return the bucket bound below which pct percent of requests took."""
+        if not self.requests:
+            return None
+        rank = pct / 100 * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max_latency
+
+    def as_dict(self):
+        """Return the counters."""
+        return {
+            "calls": self.calls,
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "statuses": dict(self.statuses),
+            "average_latency": self.total_latency / self.requests
+            if self.requests
+            else None,
+            "p50_latency": self.percentile(50),
+            "p95_latency": self.percentile(95),
+            "max_latency": self.max_latency,
+            "histogram": {
+                f"le_{bound}": count
+                for bound, count in zip(LATENCY_BUCKETS + ["inf"], self.buckets)
+            },
+        }
+
+
+class RequestMetrics:
+    """Per endpoint request counters.
+
+    Calls count every client call, including those coalesced with an
+    identical request in flight; requests count what was sent to the API.
+    """
+
+    def __init__(self):
+        """Initialize the request metrics."""
+        self._endpoints = {}
+
+    def endpoint(self, name):
+        """Return the counters of an endpoint."""
+        if name not in self._endpoints:
+            self._endpoints[name] = EndpointMetrics()
+        return self._endpoints[name]
+
+    @property
+    def totals(self):
+        """Return the counters summed over the endpoints."""
+        endpoints = self._endpoints.values()
+        return {
+            "calls": sum(x.calls for x in endpoints),
+            "requests": sum(x.requests for x in endpoints),
+            "retries": sum(x.retries for x in endpoints),
+            "errors": sum(x.errors for x in endpoints),
+            "throttled": sum(x.throttled for x in endpoints),
+        }
+
+    def as_dict(self):
+        """Return the counters of every endpoint."""
+        return {name: x.as_dict() for name, x in sorted(self._endpoints.items())}
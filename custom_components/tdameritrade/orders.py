@@ -0,0 +1,362 @@
+"""Order submission for the TDAmeritrade integration."""
+import asyncio
+import logging
+import time
+
+from collections import OrderedDict
+from datetime import timedelta
+
+import voluptuous as vol
+
+from aiohttp.client_exceptions import (
+    ClientConnectorError,
+    ClientError,
+    ClientResponseError,
+)
+
+from homeassistant.core import callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt
+
+from .const import (
+    CONF_IDEMPOTENCY_KEY,
+    MAX_CONCURRENT_ORDERS,
+    IDEMPOTENCY_TTL,
+    ORDER_POLL_MIN,
+    ORDER_POLL_MAX,
+    ORDER_MISSING_POLLS,
+    ORDER_ENTERED_SLACK,
+    EVENT_ORDER_UPDATED,
+)
+from .resilience import CircuitOpenError
+
+INSTRUCTIONS = [
+    "BUY",
+    "SELL",
+    "BUY_TO_COVER",
+    "SELL_SHORT",
+    "BUY_TO_OPEN",
+    "BUY_TO_CLOSE",
+    "SELL_TO_OPEN",
+    "SELL_TO_CLOSE",
+    "EXCHANGE",
+]
+ORDER_TYPES = [
+    "MARKET",
+    "LIMIT",
+    "STOP",
+    "STOP_LIMIT",
+    "TRAILING_STOP",
+    "MARKET_ON_CLOSE",
+    "EXERCISE",
+    "TRAILING_STOP_LIMIT",
+    "NET_DEBIT",
+    "NET_CREDIT",
+    "NET_ZERO",
+]
+PRICED_ORDER_TYPES = ["LIMIT", "STOP", "STOP_LIMIT", "NET_DEBIT", "NET_CREDIT"]
+SESSIONS = ["NORMAL", "AM", "PM", "SEAMLESS"]
+DURATIONS = ["DAY", "GOOD_TILL_CANCEL", "FILL_OR_KILL"]
+ORDER_STRATEGY_TYPES = ["SINGLE", "OCO", "TRIGGER"]
+TERMINAL_STATUSES = ["FILLED", "CANCELED", "REJECTED", "EXPIRED", "REPLACED"]
+ASSET_TYPES = [
+    "EQUITY",
+    "OPTION",
+    "INDEX",
+    "MUTUAL_FUND",
+    "CASH_EQUIVALENT",
+    "FIXED_INCOME",
+    "CURRENCY",
+]
+
+
+def _require_price(order):
+    """Ensure priced order types carry a price."""
+    if order["order_type"] in PRICED_ORDER_TYPES and order.get("price") is None:
+        raise vol.Invalid(f"A price is required for {order['order_type']} orders")
+    return order
+
+
+def _quantity(value):
+    """Return a positive quantity, as an int when it is a whole number."""
+    value = float(value)
+    if value <= 0:
+        raise vol.Invalid("Quantity must be positive")
+    return int(value) if value.is_integer() else value
+
+
+ORDER_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional("price"): vol.Coerce(float),
+            vol.Required("instruction"): vol.All(vol.Upper, vol.In(INSTRUCTIONS)),
+            vol.Required("quantity"): _quantity,
+            vol.Required("symbol"): vol.All(cv.string, vol.Upper),
+            vol.Required("account_id"): cv.string,
+            vol.Optional("order_type", default="LIMIT"): vol.All(
+                vol.Upper, vol.In(ORDER_TYPES)
+            ),
+            vol.Optional("session", default="NORMAL"): vol.All(
+                vol.Upper, vol.In(SESSIONS)
+            ),
+            vol.Optional("duration", default="DAY"): vol.All(
+                vol.Upper, vol.In(DURATIONS)
+            ),
+            vol.Optional("orderStrategyType", default="SINGLE"): vol.All(
+                vol.Upper, vol.In(ORDER_STRATEGY_TYPES)
+            ),
+            vol.Optional("assetType", default="EQUITY"): vol.All(
+                vol.Upper, vol.In(ASSET_TYPES)
+            ),
+            vol.Optional(CONF_IDEMPOTENCY_KEY): cv.string,
+        }
+    ),
+    _require_price,
+)
+
+PLACE_ORDERS_SCHEMA = vol.Schema(
+    {vol.Required("orders"): vol.All(cv.ensure_list, [ORDER_SCHEMA])}
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _not_placed(error):
+    """Return True if a failed order certainly never reached the broker.
+
+    Orders rejected with a 4xx status, or never sent because the circuit
+    was open or the connection failed, can be sent again.  After timeouts
+    and 5xx responses the order may have been placed.
+    """
+    if isinstance(error, ClientResponseError):
+        return 400 <= error.status < 500
+    return isinstance(error, (CircuitOpenError, ClientConnectorError))
+
+
+class OrderSubmitter:
+    """Submit orders concurrently, at most once per idempotency key."""
+
+    def __init__(
+        self,
+        client,
+        tracker=None,
+        max_concurrent=MAX_CONCURRENT_ORDERS,
+        ttl=IDEMPOTENCY_TTL,
+    ):
+        """Initialize the order submitter."""
+        self._client = client
+        self._tracker = tracker
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._ttl = ttl
+        self._submitted = OrderedDict()
+
+    async def async_place_orders(self, orders):
+        """Submit validated orders, returning a result per order."""
+        return list(
+            await asyncio.gather(*[self.async_place_order(order) for order in orders])
+        )
+
+    async def async_place_order(self, order):
+        """Submit one order unless its idempotency key was already used.
+
+        Orders without an idempotency key are always sent.
+        """
+        self._expire()
+        key = order.get(CONF_IDEMPOTENCY_KEY)
+        result = {
+            CONF_IDEMPOTENCY_KEY: key,
+            "account_id": order["account_id"],
+            "symbol": order["symbol"],
+        }
+        duplicate = key is not None and key in self._submitted
+        if duplicate:
+            _LOGGER.debug("Order %s was already submitted, not sending again", key)
+            future = self._submitted[key][1]
+        else:
+            future = asyncio.ensure_future(self._async_submit(order))
+            if key is not None:
+                self._submitted[key] = (time.monotonic() + self._ttl, future)
+
+        try:
+            result["order_id"] = await asyncio.shield(future)
+            result["status"] = "duplicate" if duplicate else "submitted"
+        except (ClientError, asyncio.TimeoutError) as error:
+            # An order that may have been placed keeps its key, so a retry
+            # can't place it twice.
+            not_placed = _not_placed(error)
+            if not_placed and self._submitted.get(key, (None, None))[1] is future:
+                del self._submitted[key]
+            rejected = not_placed and isinstance(error, ClientResponseError)
+            result["status"] = "rejected" if rejected else "error"
+            result["error"] = str(error)
+        return result
+
+    async def _async_submit(self, order):
+        """Send an order to the API."""
+        async with self._semaphore:
+            order_id = await self._client.async_place_order(
+                order.get("price"),
+                order["instruction"],
+                order["quantity"],
+                order["symbol"],
+                order["account_id"],
+                order_type=order["order_type"],
+                session=order["session"],
+                duration=order["duration"],
+                orderStrategyType=order["orderStrategyType"],
+                assetType=order["assetType"],
+            )
+        if self._tracker is not None:
+            self._tracker.async_track(order["account_id"], order_id)
+        return order_id
+
+    def _expire(self):
+        """Forget idempotency keys older than the TTL."""
+        now = time.monotonic()
+        while self._submitted:
+            key, (expires, future) = next(iter(self._submitted.items()))
+            if expires > now or not future.done():
+                break
+            del self._submitted[key]
+
+
+class OrderTracker:
+    """Poll open orders until they reach a terminal status.
+
+    Polling starts fast after an order is submitted and backs off while
+    nothing changes or polls fail, and stops once no tracked order is
+    open.  Orders the API stops returning are dropped after a few polls.
+    """
+
+    def __init__(self, hass, client):
+        """Initialize the order tracker."""
+        self._hass = hass
+        self._client = client
+        self._orders = {}
+        self._interval = ORDER_POLL_MIN
+        self._remove_poll = None
+
+    @property
+    def open_orders(self):
+        """Return the tracked orders keyed by order id."""
+        return self._orders
+
+    @callback
+    def async_track(self, account_id, order_id):
+        """Start tracking a submitted order."""
+        if not isinstance(order_id, str):
+            _LOGGER.debug("No order id returned for account %s, not tracking", account_id)
+            return
+        self._orders[order_id] = {
+            "account_id": account_id,
+            "order_id": order_id,
+            "status": None,
+            "entered": dt.utcnow() - timedelta(seconds=ORDER_ENTERED_SLACK),
+            "missing": 0,
+        }
+        self._interval = ORDER_POLL_MIN
+        self._async_schedule()
+
+    @callback
+    def async_stop(self):
+        """Stop polling."""
+        if self._remove_poll:
+            self._remove_poll()
+            self._remove_poll = None
+
+    @callback
+    def _async_schedule(self):
+        """Schedule the next poll."""
+        self.async_stop()
+        if self._orders:
+            self._remove_poll = async_call_later(
+                self._hass, self._interval, self._async_poll
+            )
+
+    async def _async_poll(self, now=None):
+        """Fetch the orders of each account with tracked orders.
+
+        Only the orders entered since the oldest tracked order of an account
+        are listed, so finished orders from earlier in the day aren't
+        downloaded on every poll.  The next poll is scheduled while orders
+        are open, whatever happens.
+        """
+        self._remove_poll = None
+        changed = False
+        try:
+            accounts = {}
+            for order in self._orders.values():
+                entered = accounts.get(order["account_id"])
+                if entered is None or order["entered"] < entered:
+                    accounts[order["account_id"]] = order["entered"]
+
+            results = await asyncio.gather(
+                *[
+                    self._client.async_get_orders(
+                        account_id,
+                        from_entered_time=entered.isoformat(timespec="seconds"),
+                    )
+                    for account_id, entered in accounts.items()
+                ],
+                return_exceptions=True,
+            )
+            for account_id, result in zip(accounts, results):
+                if isinstance(result, Exception):
+                    _LOGGER.warning(
+                        "Failed to poll orders for %s: %s", account_id, result
+                    )
+                    continue
+                returned = set()
+                for order in result or []:
+                    order_id = str(order.get("orderId"))
+                    returned.add(order_id)
+                    changed |= self._async_update_order(order_id, order)
+                self._async_expire_missing(account_id, returned)
+        finally:
+            self._interval = (
+                ORDER_POLL_MIN if changed else min(self._interval * 2, ORDER_POLL_MAX)
+            )
+            self._async_schedule()
+
+    @callback
+    def _async_expire_missing(self, account_id, returned):
+        """Drop the orders of an account the API no longer returns."""
+        for order_id, tracked in list(self._orders.items()):
+            if tracked["account_id"] != account_id:
+                continue
+            if order_id in returned:
+                tracked["missing"] = 0
+                continue
+            tracked["missing"] += 1
+            if tracked["missing"] >= ORDER_MISSING_POLLS:
+                _LOGGER.warning(
+                    "Order %s was not returned by %s polls, no longer tracking",
+                    order_id,
+                    tracked["missing"],
+                )
+                del self._orders[order_id]
+
+    @callback
+    def _async_update_order(self, order_id, order):
+        """Fire an event if a tracked order changed status."""
+        tracked = self._orders.get(order_id)
+        status = order.get("status")
+        if tracked is None or status == tracked["status"]:
+            return False
+        self._hass.bus.async_fire(
+            EVENT_ORDER_UPDATED,
+            {
+                "account_id": tracked["account_id"],
+                "order_id": order_id,
+                "status": status,
+                "previous_status": tracked["status"],
+                "filled_quantity": order.get("filledQuantity"),
+                "remaining_quantity": order.get("remainingQuantity"),
+            },
+        )
+        tracked["status"] = status
+        if status in TERMINAL_STATUSES:
+            _LOGGER.debug("Order %s is %s, no longer tracking", order_id, status)
+            del self._orders[order_id]
+        return True
@@ -0,0 +1,118 @@
+"""Portfolio totals across the accounts of a TDAmeritrade login."""
+import logging
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .const import (
+    SECURITIES_ACCOUNT,
+    TYPE,
+    CASH,
+    CURRENT_BALANCES,
+    CASH_AVAILABLE_FOR_TRADEING,
+    POSITIONS,
+    INSTRUMENT,
+    MARKET_VALUE,
+    CURRENT_DAY_PROFIT_LOSS,
+    SIGNAL_PORTFOLIO_UPDATE,
+)
+
+LIQUIDATION_VALUE = "liquidation_value"
+BUYING_POWER = "buying_power"
+DAY_CHANGE = "day_change"
+TOTALS = (LIQUIDATION_VALUE, BUYING_POWER, DAY_CHANGE)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def account_contribution(account):
+    """Return the totals and allocation by asset type of one account."""
+    balances = account.get(CURRENT_BALANCES, {})
+    if account.get(TYPE) == CASH:
+        buying_power = balances.get(CASH_AVAILABLE_FOR_TRADEING, 0.0)
+    else:
+        buying_power = balances.get("buyingPower", 0.0)
+    totals = {
+        LIQUIDATION_VALUE: balances.get("liquidationValue", 0.0),
+        BUYING_POWER: buying_power,
+        DAY_CHANGE: 0.0,
+    }
+    allocation = {CASH: balances.get("cashBalance", 0.0)}
+    for position in account.get(POSITIONS, []):
+        totals[DAY_CHANGE] += position.get(CURRENT_DAY_PROFIT_LOSS, 0.0)
+        asset_type = position[INSTRUMENT].get("assetType", "UNKNOWN")
+        allocation[asset_type] = allocation.get(asset_type, 0.0) + position.get(
+            MARKET_VALUE, 0.0
+        )
+    return totals, allocation
+
+
+class PortfolioAggregator:
+    """Keep portfolio totals current as accounts refresh.
+
+    Each account's contribution is kept, and when an account's response
+    changes its old contribution is subtracted from the totals and the new
+    one added, so the other accounts and their positions are not walked.
+    Accounts missing from an update keep their last contribution.
+    """
+
+    def __init__(self, hass, coordinator, entry_id):
+        """Initialize the aggregator."""
+        self._hass = hass
+        self._coordinator = coordinator
+        self._signal = SIGNAL_PORTFOLIO_UPDATE.format(entry_id)
+        self._contributions = {}
+        self._unsub = None
+        self.totals = dict.fromkeys(TOTALS, 0.0)
+        self.allocation = {}
+
+    @property
+    def loaded(self):
+        """Return True once an account has been added up."""
+        return bool(self._contributions)
+
+    @callback
+    def async_start(self):
+        """Listen for account updates."""
+        self._unsub = self._coordinator.async_add_listener(self._async_handle_update)
+        self._async_handle_update()
+
+    @callback
+    def async_stop(self):
+        """Stop listening."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_handle_update(self):
+        """Apply the accounts that changed and notify the sensors."""
+        changed = False
+        for account_id, resp in (self._coordinator.data or {}).items():
+            changed |= self.update(account_id, resp[SECURITIES_ACCOUNT])
+        if changed:
+            async_dispatcher_send(self._hass, self._signal)
+
+    def update(self, account_id, account):
+        """Replace the contribution of an account, return True if it changed."""
+        new = account_contribution(account)
+        old = self._contributions.get(account_id)
+        if new == old:
+            return False
+        self._contributions[account_id] = new
+        if old is not None:
+            self._add(old, -1)
+        self._add(new, 1)
+        return True
+
+    def _add(self, contribution, sign):
+        """Add or subtract a contribution from the totals."""
+        totals, allocation = contribution
+        for key, value in totals.items():
+            self.totals[key] += sign * value
+        for asset_type, value in allocation.items():
+            total = self.allocation.get(asset_type, 0.0) + sign * value
+            if abs(total) < 0.005 and sign < 0:
+                self.allocation.pop(asset_type, None)
+            else:
+                self.allocation[asset_type] = total
@@ -0,0 +1,128 @@
+"""Throttling of quote state writes for the TDAmeritrade integration."""
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    DEFAULT_QUOTE_FIELD,
+    DEFAULT_QUOTE_THRESHOLD,
+    DEFAULT_QUOTE_ATTRIBUTE_INTERVAL,
+)
+
+
+def parse_quote_threshold(value):
+    """Return the (amount, percent) of a threshold like 0.05 or 0.5%."""
+    value = str(value).strip()
+    percent = value.endswith("%")
+    try:
+        amount = float(value.rstrip("%").strip() or 0)
+    except ValueError as error:
+        raise ValueError(f"Not a quote threshold: {value}") from error
+    if amount < 0:
+        raise ValueError(f"Quote thresholds can't be negative: {value}")
+    return amount, percent
+
+
+class QuoteThrottle:
+    """Decide which quote updates are worth writing to the state machine.
+
+    An update is written when the field has moved by at least the
+    threshold since the last write.  Updates that only change the other
+    fields are written at most once every attribute_interval seconds.
+    """
+
+    def __init__(
+        self,
+        field=DEFAULT_QUOTE_FIELD,
+        threshold=DEFAULT_QUOTE_THRESHOLD,
+        attribute_interval=DEFAULT_QUOTE_ATTRIBUTE_INTERVAL,
+    ):
+        """Initialize the throttle."""
+        self.field = field
+        self._amount, self._percent = parse_quote_threshold(threshold)
+        self._attribute_interval = attribute_interval
+        self._value = None
+        self._written = None
+
+    def _moved(self, value):
+        """Return True if value is past the threshold from the last write."""
+        if not isinstance(value, (int, float)) or not isinstance(
+            self._value, (int, float)
+        ):
+            return value != self._value
+        change = abs(value - self._value)
+        if self._percent:
+            return change > 0 and change >= abs(self._value) * self._amount / 100
+        return change > 0 and change >= self._amount
+
+    def should_write(self, quote, now):
+        """Return True if the quote should be written, now in seconds."""
+        value = quote.get(self.field)
+        if (
+            self._written is None
+            or self._moved(value)
+            or now - self._written >= self._attribute_interval
+        ):
+            self._value = value
+            self._written = now
+            return True
+        return False
+
+    def delay(self, now):
+        """Return the seconds until attribute changes may be written."""
+        return max(0.0, self._written + self._attribute_interval - now)
+
+
+class QuoteStateWriter:
+    """Write the get_quote_service states, throttled like the quote sensors.
+
+    Each symbol has its own QuoteThrottle, and the changes it holds back
+    are written once the attribute interval has passed.
+    """
+
+    def __init__(
+        self,
+        hass,
+        field=DEFAULT_QUOTE_FIELD,
+        threshold=DEFAULT_QUOTE_THRESHOLD,
+        attribute_interval=DEFAULT_QUOTE_ATTRIBUTE_INTERVAL,
+    ):
+        """Initialize the quote state writer."""
+        self._hass = hass
+        self._options = (field, threshold, attribute_interval)
+        self._throttles = {}
+        self._quotes = {}
+        self._timers = {}
+
+    @callback
+    def async_stop(self):
+        """Cancel the pending writes."""
+        while self._timers:
+            self._timers.popitem()[1]()
+
+    @callback
+    def async_write(self, symbol, quote):
+        """Write the state of a quote if it changed enough."""
+        throttle = self._throttles.get(symbol)
+        if throttle is None:
+            throttle = self._throttles[symbol] = QuoteThrottle(*self._options)
+        self._quotes[symbol] = quote
+        now = time.monotonic()
+        if throttle.should_write(quote, now):
+            if symbol in self._timers:
+                self._timers.pop(symbol)()
+            self._hass.states.async_set(
+                f"get_quote_service.{symbol}", quote.get(throttle.field), quote
+            )
+        elif symbol not in self._timers:
+
+            @callback
+            def _async_write_pending(_now):
+                """Write the quote changes held back by the throttle."""
+                del self._timers[symbol]
+                self.async_write(symbol, self._quotes[symbol])
+
+            self._timers[symbol] = async_call_later(
+                self._hass, throttle.delay(now), _async_write_pending
+            )
@@ -0,0 +1,108 @@
+"""Retry backoff and circuit breaking for the TDAmeritrade API client."""
+import asyncio
+import logging
+import random
+import time
+
+from aiohttp.client_exceptions import ClientError, ClientResponseError
+
+from .const import BREAKER_THRESHOLD, BREAKER_RESET
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CircuitOpenError(ClientError):
+    """Raised instead of sending a request while the circuit is open."""
+
+
+def backoff(attempt, minimum, maximum):
+    """Return the jittered delay before retry number attempt (from 0)."""
+    delay = min(maximum, minimum * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def is_transient(error):
+    """Return True if a failed request may succeed when retried."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (ClientError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """Stop calling an endpoint after repeated failures.
+
+    The circuit opens after threshold consecutive failures and rejects
+    calls for reset_timeout seconds, then lets a single trial call through
+    which closes it again on success.
+    """
+
+    def __init__(self, name, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        """Initialize the circuit breaker."""
+        self._name = name
+        self._threshold = threshold
+        self._reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._opens = 0
+
+    @property
+    def state(self):
+        """Return the state of the circuit."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def metrics(self):
+        """Return the state and counters of the circuit."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opens": self._opens,
+        }
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may be made now."""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._trial:
+            self._trial = True
+            return
+        raise CircuitOpenError(f"Circuit for {self._name} is open")
+
+    def record_success(self):
+        """Close the circuit."""
+        if self._state != CLOSED:
+            _LOGGER.info("%s recovered, closing the circuit", self._name)
+        self._state = CLOSED
+        self._failures = 0
+        self._trial = False
+
+    def record_failure(self):
+        """Count a failure, opening the circuit at the threshold."""
+        self._failures += 1
+        if self._trial or (self._state == CLOSED and self._failures >= self._threshold):
+            if self._state == CLOSED:
+                _LOGGER.warning(
+                    "%s failed %s times in a row, pausing requests for %s seconds",
+                    self._name,
+                    self._failures,
+                    self._reset_timeout,
+                )
+                self._opens += 1
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._trial = False
+
+    def record_cancelled(self):
+        """End a trial call that was cancelled before it completed."""
+        self._trial = False
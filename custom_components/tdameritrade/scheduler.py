@@ -0,0 +1,109 @@
+"""Market aware refresh scheduling for the TDAmeritrade accounts."""
+import asyncio
+import logging
+import random
+
+from datetime import timedelta
+
+from aiohttp.client_exceptions import ClientError
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_point_in_time
+from homeassistant.util import dt
+
+from .const import (
+    OPEN_SCAN_INTERVAL,
+    CLOSED_SCAN_INTERVAL,
+    SCAN_JITTER,
+    PRE_MARKET,
+    REG_MARKET,
+    POST_MARKET,
+)
+
+SESSIONS = [PRE_MARKET, REG_MARKET, POST_MARKET]
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ScanScheduler:
+    """Refresh the accounts coordinator on the market session schedule.
+
+    Polls every OPEN_SCAN_INTERVAL seconds during the pre, regular and post
+    market sessions and every CLOSED_SCAN_INTERVAL seconds otherwise, and
+    not at all on days without a session, after the first refresh.
+    """
+
+    def __init__(self, hass, coordinator, market_hours):
+        """Initialize the scan scheduler."""
+        self._hass = hass
+        self._coordinator = coordinator
+        self._market_hours = market_hours
+        self._remove_timer = None
+
+    @callback
+    def async_start(self, delay=None):
+        """Schedule the first refresh, after delay if given."""
+        if delay is None:
+            delay = self._next_interval(dt.now())
+        self._async_schedule(delay)
+
+    @callback
+    def async_stop(self):
+        """Cancel the scheduled refresh."""
+        if self._remove_timer:
+            self._remove_timer()
+            self._remove_timer = None
+
+    @callback
+    def _async_schedule(self, interval):
+        """Schedule the next refresh after interval, with jitter."""
+        self.async_stop()
+        interval *= 1 + random.uniform(0, SCAN_JITTER)
+        next_refresh = dt.now() + interval
+        _LOGGER.debug("Next account refresh at %s", next_refresh)
+        self._remove_timer = async_track_point_in_time(
+            self._hass, self._async_refresh, next_refresh
+        )
+
+    async def _async_refresh(self, now=None):
+        """Refresh the accounts if the market has a session today.
+
+        The accounts are always loaded once, so the sensors have data on
+        days without a session too.  The next refresh is scheduled whatever
+        happens, so one failed refresh can't end the refresh loop.
+        """
+        self._remove_timer = None
+        try:
+            try:
+                await self._market_hours.async_refresh()
+            except (ClientError, asyncio.TimeoutError) as error:
+                _LOGGER.warning("Client Exception: %s", error)
+
+            if (
+                self._coordinator.data is None
+                or not self._market_hours.loaded
+                or self._market_hours.is_trading_day()
+            ):
+                await self._coordinator.async_refresh()
+            else:
+                _LOGGER.debug("No market session today, skipping account refresh")
+        finally:
+            self._async_schedule(self._next_interval(dt.now()))
+
+    def _next_interval(self, now):
+        """Return the time until the next refresh."""
+        if not self._market_hours.loaded:
+            return timedelta(seconds=CLOSED_SCAN_INTERVAL)
+
+        tomorrow = dt.start_of_local_day() + timedelta(days=1)
+        if not self._market_hours.is_trading_day():
+            return tomorrow - now
+
+        if any(self._market_hours.is_session_open(session, now) for session in SESSIONS):
+            return timedelta(seconds=OPEN_SCAN_INTERVAL)
+
+        next_refresh = now + timedelta(seconds=CLOSED_SCAN_INTERVAL)
+        transition = self._market_hours.next_transition(now)
+        if transition is not None:
+            next_refresh = min(next_refresh, transition)
+        return min(next_refresh, tomorrow) - now
@@ -1,27 +1,95 @@
 """Support for the TDAmeritrade sensors."""
 import logging
+import time
 
-from homeassistant.helpers.entity import Entity
-from datetime import timedelta
+from collections import Counter
+
+from homeassistant.const import (
+    ATTR_FRIENDLY_NAME,
+    ATTR_ICON,
+    ATTR_UNIT_OF_MEASUREMENT,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+)
 from homeassistant.core import callback
-from aiohttp.client_exceptions import ClientConnectorError, ClientResponseError, ServerDisconnectedError
-from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers import entity_registry
+from homeassistant.helpers.dispatcher import (
+    async_dispatcher_connect,
+    async_dispatcher_send,
+)
+from homeassistant.helpers.entity import Entity, EntityCategory
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt
 
 from .const import (
     CONF_ACCOUNTS,
+    CONF_WATCHLIST,
+    CONF_ACCOUNT_ATTRIBUTES,
+    DEFAULT_ACCOUNT_ATTRIBUTES,
+    OPTIONS,
     DOMAIN,
-    CLOSED_SCAN_INTERVAL,
-    OPEN_SCAN_INTERVAL,
     AVAILABLE_FUNDS,
     CURRENT_BALANCES,
+    POSITIONS,
+    INSTRUMENT,
+    SYMBOL,
+    LONG_QUANTITY,
+    SHORT_QUANTITY,
+    MARKET_VALUE,
+    AVERAGE_PRICE,
+    CURRENT_DAY_PROFIT_LOSS,
     SECURITIES_ACCOUNT,
+    ACCOUNT_ID,
     CASH_AVAILABLE_FOR_TRADEING,
     TYPE,
     MARGIN,
     CASH,
+    COORDINATOR,
+    STREAMER,
+    SIGNAL_QUOTE_UPDATE,
+    HISTORY_COORDINATOR,
+    CONF_PRICE_HISTORY,
+    INDICATOR_ENGINE,
+    CONF_INDICATORS,
+    SIGNAL_INDICATOR_UPDATE,
+    CONF_DEBUG_SENSORS,
     CLIENT,
+    OPTION_COORDINATOR,
+    CONF_OPTION_CONTRACTS,
+    UNIQUE_ID_SUFFIX,
+    CONF_QUOTE_FIELD,
+    CONF_QUOTE_THRESHOLD,
+    CONF_QUOTE_ATTRIBUTE_INTERVAL,
+    DEFAULT_QUOTE_FIELD,
+    DEFAULT_QUOTE_THRESHOLD,
+    DEFAULT_QUOTE_ATTRIBUTE_INTERVAL,
+    PORTFOLIO,
+    SIGNAL_PORTFOLIO_UPDATE,
+    CONF_IMPORT_WATCHLISTS,
+    CONF_MOVERS,
+    IMPORT_COORDINATOR,
+    IMPORT_QUOTES_COORDINATOR,
 )
-from homeassistant.const import STATE_OFF, STATE_ON
+from .indicators import INDICATORS, format_indicator_option
+from .portfolio import BUYING_POWER, DAY_CHANGE, LIQUIDATION_VALUE
+from .quotes import QuoteThrottle
+
+# Position sensor kind: (name, unit, icon)
+POSITION_SENSORS = {
+    MARKET_VALUE: ("Market Value", "Dollars", "mdi:cash"),
+    "quantity": ("Quantity", "Shares", "mdi:numeric"),
+    CURRENT_DAY_PROFIT_LOSS: ("Day P&L", "Dollars", "mdi:chart-line"),
+    AVERAGE_PRICE: ("Average Price", "Dollars", "mdi:cash"),
+}
+
+# Portfolio total: (name, icon)
+PORTFOLIO_SENSORS = {
+    LIQUIDATION_VALUE: ("Liquidation Value", "mdi:cash-multiple"),
+    BUYING_POWER: ("Buying Power", "mdi:cash-plus"),
+    DAY_CHANGE: ("Day Change", "mdi:chart-line"),
+}
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -29,34 +97,394 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up the TDAmeritrade sensor platform."""
     config = hass.data[DOMAIN][config_entry.entry_id]
-    accounts = config_entry.data[CONF_ACCOUNTS]
+    accounts = config_entry.data[CONF_ACCOUNTS] or []
+    attributes = config[OPTIONS].get(CONF_ACCOUNT_ATTRIBUTES)
     sensors = [
-        AccountValueSensor(config[CLIENT], account_id) for account_id in accounts
+        AccountValueSensor(config[COORDINATOR], account_id, attributes)
+        for account_id in accounts
+    ]
+    suffix = config[UNIQUE_ID_SUFFIX]
+    options = config[OPTIONS]
+
+    def quote_sensor(source, symbol):
+        """Return a quote sensor throttled as configured."""
+        return QuoteSensor(
+            source,
+            symbol,
+            suffix,
+            QuoteThrottle(
+                options.get(CONF_QUOTE_FIELD, DEFAULT_QUOTE_FIELD),
+                options.get(CONF_QUOTE_THRESHOLD, DEFAULT_QUOTE_THRESHOLD),
+                options.get(
+                    CONF_QUOTE_ATTRIBUTE_INTERVAL, DEFAULT_QUOTE_ATTRIBUTE_INTERVAL
+                ),
+            ),
+        )
+
+    sensors += [quote_sensor(config[STREAMER], x) for x in config[CONF_WATCHLIST]]
+    sensors += [
+        PriceHistorySensor(config[HISTORY_COORDINATOR], symbol, frequency, suffix)
+        for symbol, frequency in config[CONF_PRICE_HISTORY]
+    ]
+    sensors += [
+        IndicatorSensor(config[INDICATOR_ENGINE], key, suffix)
+        for key in config[CONF_INDICATORS]
+    ]
+    sensors += [
+        OptionContractSensor(config[OPTION_COORDINATOR], symbol, suffix)
+        for symbol in config[CONF_OPTION_CONTRACTS]
     ]
+    if accounts:
+        sensors += [
+            PortfolioSensor(config[PORTFOLIO], config_entry.entry_id, kind, suffix)
+            for kind in PORTFOLIO_SENSORS
+        ]
+        sensors.append(
+            PortfolioAllocationSensor(config[PORTFOLIO], config_entry.entry_id, suffix)
+        )
+    if config[OPTIONS].get(CONF_DEBUG_SENSORS):
+        sensors.append(RequestsSensor(config[CLIENT], config_entry.entry_id))
     async_add_entities(sensors)
+
+    tracker = PositionTracker(config[COORDINATOR], async_add_entities)
+    config_entry.async_on_unload(
+        config[COORDINATOR].async_add_listener(tracker.async_update)
+    )
+    tracker.async_update()
+
+    if options.get(CONF_IMPORT_WATCHLISTS) or options.get(CONF_MOVERS):
+        imported = ImportedQuoteTracker(
+            config[IMPORT_COORDINATOR],
+            config[IMPORT_QUOTES_COORDINATOR],
+            config[STREAMER],
+            config[CONF_WATCHLIST],
+            quote_sensor,
+            async_add_entities,
+        )
+        config_entry.async_on_unload(
+            config[IMPORT_COORDINATOR].async_add_listener(imported.async_update)
+        )
+        config_entry.async_on_unload(
+            config[IMPORT_QUOTES_COORDINATOR].async_add_listener(
+                imported.async_update_quotes
+            )
+        )
+        imported.async_update()
     return True
 
 
-class AccountValueSensor(Entity):
+def _net_quantity(position):
+    """Return the long quantity less the short quantity of a position."""
+    return position.get(LONG_QUANTITY, 0) - position.get(SHORT_QUANTITY, 0)
+
+
+def _attribute_names(fields):
+    """Return the attribute name of each field, its last key if unique.
+
+    Fields sharing a last key, like currentBalances.liquidationValue and
+    initialBalances.liquidationValue, keep their full dotted path.
+    """
+    leaves = Counter(field.rsplit(".", 1)[-1] for field in fields)
+    return {
+        field: field
+        if leaves[field.rsplit(".", 1)[-1]] > 1
+        else field.rsplit(".", 1)[-1]
+        for field in fields
+    }
+
+
+def _project_account(account, fields):
+    """Return the allow-listed fields of an account and a positions summary."""
+    attributes = {}
+    for field, name in _attribute_names(fields).items():
+        value = account
+        for key in field.split("."):
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            attributes[name] = value
+    if POSITIONS in account:
+        attributes[POSITIONS] = {
+            position[INSTRUMENT][SYMBOL]: _net_quantity(position)
+            for position in account[POSITIONS]
+        }
+    return attributes
+
+
+class PositionTracker:
+    """Create, update and remove position sensors from the account data."""
+
+    def __init__(self, coordinator, async_add_entities):
+        """Initialize the position tracker."""
+        self._coordinator = coordinator
+        self._async_add_entities = async_add_entities
+        self._positions = {}
+        self._sensors = {}
+
+    @callback
+    def async_update(self):
+        """Diff the positions against the previous update."""
+        data = self._coordinator.data
+        if not self._coordinator.last_update_success or not data:
+            return
+
+        positions = {
+            key: position
+            for key, position in self._positions.items()
+            if key[0] not in data
+        }
+        for account_id, account in data.items():
+            for position in account[SECURITIES_ACCOUNT].get(POSITIONS, []):
+                symbol = position[INSTRUMENT][SYMBOL]
+                positions[(account_id, symbol)] = position
+
+        new_sensors = []
+        for key, position in positions.items():
+            previous = self._positions.get(key)
+            if previous is None:
+                self._sensors[key] = [
+                    PositionSensor(key[0], key[1], kind, position)
+                    for kind in POSITION_SENSORS
+                ]
+                new_sensors += self._sensors[key]
+            elif previous != position:
+                for sensor in self._sensors[key]:
+                    sensor.async_set_position(position)
+
+        for key in self._positions.keys() - positions.keys():
+            _LOGGER.debug("Position %s closed, removing sensors", key)
+            for sensor in self._sensors.pop(key):
+                self._coordinator.hass.async_create_task(
+                    sensor.async_remove_position()
+                )
+
+        self._positions = positions
+        if new_sensors:
+            self._async_add_entities(new_sensors)
+
+
+async def _async_remove_entity(entity):
+    """Remove an entity that is no longer backed by any data."""
+    if entity.hass is None:
+        return
+    registry = entity_registry.async_get(entity.hass)
+    if entity.entity_id and registry.async_get(entity.entity_id):
+        registry.async_remove(entity.entity_id)
+    else:
+        await entity.async_remove()
+
+
+class ImportedQuoteTracker:
+    """Create and remove quote sensors for the imported symbols.
+
+    The imported symbols are diffed against the previous refresh, so only
+    added symbols create sensors and only removed ones delete them.  Polled
+    quotes are passed on when they change, like streamed ones.
+    """
+
+    def __init__(
+        self,
+        symbols_coordinator,
+        quotes_coordinator,
+        streamer,
+        watchlist,
+        quote_sensor,
+        async_add_entities,
+    ):
+        """Initialize the imported quote tracker."""
+        self._symbols_coordinator = symbols_coordinator
+        self._quotes_coordinator = quotes_coordinator
+        self._streamer = streamer
+        self._watchlist = set(watchlist)
+        self._quote_sensor = quote_sensor
+        self._async_add_entities = async_add_entities
+        self._sensors = {}
+        self._quotes = {}
+
+    @callback
+    def async_update(self):
+        """Diff the imported symbols against the previous refresh."""
+        data = self._symbols_coordinator.data
+        if not self._symbols_coordinator.last_update_success or data is None:
+            return
+
+        # The configured watchlist already has sensors.
+        symbols = [symbol for symbol in data if symbol not in self._watchlist]
+        new_sensors = []
+        for symbol in symbols:
+            if symbol in self._sensors:
+                continue
+            source = self._quotes_coordinator
+            if symbol in self._streamer.symbols:
+                source = self._streamer
+            self._sensors[symbol] = self._quote_sensor(source, symbol)
+            new_sensors.append(self._sensors[symbol])
+
+        hass = self._symbols_coordinator.hass
+        for symbol in self._sensors.keys() - set(symbols):
+            _LOGGER.debug("%s no longer imported, removing its sensor", symbol)
+            self._quotes.pop(symbol, None)
+            hass.async_create_task(_async_remove_entity(self._sensors.pop(symbol)))
+
+        if new_sensors:
+            self._async_add_entities(new_sensors)
+            hass.async_create_task(self._quotes_coordinator.async_request_refresh())
+
+    @callback
+    def async_update_quotes(self):
+        """Pass on the polled quotes that changed."""
+        for symbol, quote in self._quotes_coordinator.quotes.items():
+            if symbol not in self._sensors or self._quotes.get(symbol) == quote:
+                continue
+            self._quotes[symbol] = quote
+            async_dispatcher_send(
+                self._quotes_coordinator.hass, SIGNAL_QUOTE_UPDATE.format(symbol), quote
+            )
+
+
+class PositionSensor(Entity):
+    """Representation of a value of a single holding."""
+
+    def __init__(self, account_id, symbol, kind, position):
+        """Initialize of a position sensor."""
+        self._account_id = account_id
+        self._symbol = symbol
+        self._kind = kind
+        self._name, self._unit, self._icon = POSITION_SENSORS[kind]
+        self._current_value = self._value(position)
+
+    def _value(self, position):
+        """Return this sensor's value from a position."""
+        if self._kind == "quantity":
+            return _net_quantity(position)
+        return position.get(self._kind)
+
+    @callback
+    def async_set_position(self, position):
+        """Write the state if this sensor's value changed."""
+        value = self._value(position)
+        if value == self._current_value:
+            return
+        self._current_value = value
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+    async def async_remove_position(self):
+        """Remove the sensor once the holding is closed."""
+        await _async_remove_entity(self)
+
+    @property
+    def should_poll(self):
+        """Return False, positions are updated from the account data."""
+        return False
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return self._current_value
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._symbol} {self._name} #--{self._account_id[-4:]}"
+
+    @property
+    def unique_id(self):
+        """Return the unique_id of the sensor."""
+        return f"{DOMAIN}.position_{self._account_id}_{self._symbol}_{self._kind}"
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit_of_measurement of the device."""
+        return self._unit
+
+    @property
+    def extra_state_attributes(self):
+        """Return device specific state attributes."""
+        return {ACCOUNT_ID: self._account_id, SYMBOL: self._symbol}
+
+    @property
+    def icon(self):
+        """Return the class of this sensor."""
+        return self._icon
+
+
+class AccountValueSensor(CoordinatorEntity, RestoreEntity):
     """Representation of Available Funds sensors."""
 
-    def __init__(self, client, account_id):
+    def __init__(self, coordinator, account_id, attributes=None):
         """Initialize of a account sensor."""
+        super().__init__(coordinator)
         self._name = "Available Funds"
-        self._client = client
         self._account_id = account_id
+        self._fields = attributes or DEFAULT_ACCOUNT_ATTRIBUTES
         self._current_value = None
         self._attributes = {}
         self._available = False
-        self._last_updated = None
-        self._interval = timedelta(seconds=10)
-        self._remove_update_interval = None
-        self._should_poll = False
+        self._update_from_data()
 
-    @property
-    def should_poll(self):
-        """Return if this sensor should pull."""
-        return self._should_poll
+    def _update_from_data(self):
+        """Project the coordinator data, return True if anything changed."""
+        resp = None
+        if self.coordinator.data:
+            resp = self.coordinator.data.get(self._account_id)
+        available = self.coordinator.last_update_success and resp is not None
+        if not resp:
+            changed = available != self._available
+            self._available = available
+            return changed
+
+        if resp[SECURITIES_ACCOUNT][TYPE] == MARGIN:
+            current_value = resp[SECURITIES_ACCOUNT][CURRENT_BALANCES][
+                AVAILABLE_FUNDS
+            ]
+        elif resp[SECURITIES_ACCOUNT][TYPE] == CASH:
+            current_value = resp[SECURITIES_ACCOUNT][CURRENT_BALANCES][
+                CASH_AVAILABLE_FOR_TRADEING
+            ]
+        else:
+            current_value = 0.00
+        attributes = _project_account(resp[SECURITIES_ACCOUNT], self._fields)
+        if self.coordinator.stale:
+            attributes["stale"] = True
+
+        changed = (
+            available != self._available
+            or current_value != self._current_value
+            or attributes != self._attributes
+        )
+        self._available = available
+        self._current_value = current_value
+        self._attributes = attributes
+        return changed
+
+    async def async_added_to_hass(self):
+        """Show the last known value until the first update."""
+        await super().async_added_to_hass()
+        if self.coordinator.data is not None:
+            return
+        last_state = await self.async_get_last_state()
+        if last_state is None or last_state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+            return
+        try:
+            self._current_value = float(last_state.state)
+        except ValueError:
+            return
+        self._attributes = {
+            key: value
+            for key, value in last_state.attributes.items()
+            if key not in (ATTR_FRIENDLY_NAME, ATTR_ICON, ATTR_UNIT_OF_MEASUREMENT)
+        }
+        self._attributes["restored"] = True
+        self._available = True
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Only write the state when the projected values changed."""
+        if self._update_from_data():
+            self.async_write_ha_state()
 
     @property
     def state(self):
@@ -98,68 +526,501 @@ class AccountValueSensor(Entity):
         """Return the class of this sensor."""
         return "mdi:cash"
 
-    @callback
-    async def async_schedule_update(self, event_time=None):
-        """Update the entity."""
-        self.async_schedule_update_ha_state(True)
+
+class QuoteSensor(RestoreEntity):
+    """Representation of a streamed or polled quote sensor.
+
+    The state is written when the quote field moves past the throttle's
+    threshold, other quote changes at most once per attribute interval.
+    """
+
+    def __init__(self, streamer, symbol, unique_id_suffix="", throttle=None):
+        """Initialize of a quote sensor."""
+        self._name = "Quote"
+        self._streamer = streamer
+        self._symbol = symbol
+        self._unique_id_suffix = unique_id_suffix
+        self._throttle = throttle or QuoteThrottle()
+        self._quote = streamer.quotes.get(symbol)
+        self._remove_timer = None
+
+    @property
+    def should_poll(self):
+        """Return False, quotes are pushed by the streamer or the poller."""
+        return False
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        if not self._quote:
+            return None
+        return self._quote.get(self._throttle.field)
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._symbol} {self._name}"
+
+    @property
+    def unique_id(self):
+        """Return the unique_id of the sensor."""
+        return f"{DOMAIN}.{self._name}_{self._symbol}{self._unique_id_suffix}"
+
+    @property
+    def available(self):
+        """Return the availability of the sensor."""
+        return self._quote is not None
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit_of_measurement of the device."""
+        return "Dollars"
+
+    @property
+    def extra_state_attributes(self):
+        """Return device specific state attributes."""
+        return self._quote or {}
+
+    @property
+    def icon(self):
+        """Return the class of this sensor."""
+        return "mdi:chart-line"
 
     async def async_added_to_hass(self):
-        """Start custom polling."""
-        self._remove_update_interval = async_track_time_interval(
-            self.hass, self.async_schedule_update, self._interval
+        """Subscribe to streamed quotes for this symbol."""
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_QUOTE_UPDATE.format(self._symbol),
+                self._async_handle_quote,
+            )
         )
+        self.async_on_remove(self._async_cancel_timer)
+        if self._quote is not None:
+            return
+        last_state = await self.async_get_last_state()
+        if last_state is None or last_state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+            return
+        self._quote = {
+            key: value
+            for key, value in last_state.attributes.items()
+            if key not in (ATTR_FRIENDLY_NAME, ATTR_ICON, ATTR_UNIT_OF_MEASUREMENT)
+        }
+        self._quote["restored"] = True
 
-    async def async_will_remove_from_hass(self):
-        """Stop custom polling."""
-        self._remove_update_interval()
+    @callback
+    def _async_cancel_timer(self):
+        """Cancel a pending write."""
+        if self._remove_timer is not None:
+            self._remove_timer()
+            self._remove_timer = None
 
-    async def async_update(self):
-        """Update the state from the sensor."""
-        _LOGGER.debug("Updating sensor: %s, id: %s", self._name, self.entity_id)
-        resp = None
-        try:
-            resp = await self._client.async_get_account(self._account_id)
-        except (ClientConnectorError, ClientResponseError, ServerDisconnectedError) as error:
-            _LOGGER.warning("Client Exception: %s", error)
-        if resp:
-            self._available = True
-            self._attributes = resp[SECURITIES_ACCOUNT]
-            if resp[SECURITIES_ACCOUNT][TYPE] == MARGIN:
-                self._current_value = resp[SECURITIES_ACCOUNT][CURRENT_BALANCES][
-                    AVAILABLE_FUNDS
-                ]
-            elif resp[SECURITIES_ACCOUNT][TYPE] == CASH:
-                self._current_value = resp[SECURITIES_ACCOUNT][CURRENT_BALANCES][
-                    CASH_AVAILABLE_FOR_TRADEING
-                ]
-            else:
-                self._current_value = 0.00
-        else:
-            self._available = False
-
-        if (
-            self._interval != timedelta(seconds=CLOSED_SCAN_INTERVAL)
-            and self.hass.states.get("binary_sensor.market").state == STATE_OFF
-        ):
-            _LOGGER.debug(
-                "Market is closed, setting scan inteval to %s minutes.",
-                CLOSED_SCAN_INTERVAL / 60,
-            )
-            self._interval = timedelta(seconds=CLOSED_SCAN_INTERVAL)
-            self._remove_update_interval()
-            self._remove_update_interval = async_track_time_interval(
-                self.hass, self.async_schedule_update, self._interval
+    @callback
+    def _async_handle_quote(self, quote):
+        """Write the latest quote if it changed enough."""
+        self._quote = quote
+        now = time.monotonic()
+        if self._throttle.should_write(quote, now):
+            self._async_cancel_timer()
+            self.async_write_ha_state()
+        elif self._remove_timer is None:
+            self._remove_timer = async_call_later(
+                self.hass, self._throttle.delay(now), self._async_write_pending
             )
-        elif (
-            self._interval != timedelta(seconds=OPEN_SCAN_INTERVAL)
-            and self.hass.states.get("binary_sensor.market").state == STATE_ON
-        ):
-            _LOGGER.debug(
-                "Market is open, setting scan inteval to %s seconds.",
-                OPEN_SCAN_INTERVAL,
+
+    @callback
+    def _async_write_pending(self, _now):
+        """Write the quote changes held back by the throttle."""
+        self._remove_timer = None
+        self._async_handle_quote(self._quote)
+
+
+class PriceHistorySensor(CoordinatorEntity):
+    """Representation of the latest candle of a price history series."""
+
+    def __init__(self, coordinator, symbol, frequency, unique_id_suffix=""):
+        """Initialize of a price history sensor."""
+        super().__init__(coordinator)
+        self._name = "Close"
+        self._symbol = symbol
+        self._frequency = frequency
+        self._unique_id_suffix = unique_id_suffix
+
+    @property
+    def _candles(self):
+        """Return this series from the coordinator data."""
+        if not self.coordinator.data:
+            return None
+        return self.coordinator.data.get((self._symbol, self._frequency))
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        candles = self._candles
+        if candles is None or not len(candles):
+            return None
+        return float(candles["close"][-1])
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._symbol} {self._frequency} {self._name}"
+
+    @property
+    def unique_id(self):
+        """Return the unique_id of the sensor."""
+        return (
+            f"{DOMAIN}.history_{self._symbol}_{self._frequency}"
+            f"{self._unique_id_suffix}"
+        )
+
+    @property
+    def available(self):
+        """Return the availability of the sensor."""
+        return self.coordinator.last_update_success and self._candles is not None
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit_of_measurement of the device."""
+        return "Dollars"
+
+    @property
+    def extra_state_attributes(self):
+        """Return device specific state attributes."""
+        candles = self._candles
+        attributes = {SYMBOL: self._symbol, "frequency": self._frequency}
+        if self.coordinator.stale:
+            attributes["stale"] = True
+        if candles is not None and len(candles):
+            attributes["candles"] = len(candles)
+            attributes["first"] = dt.utc_from_timestamp(
+                candles["datetime"][0] / 1000
+            ).isoformat()
+            attributes["last"] = dt.utc_from_timestamp(
+                candles["datetime"][-1] / 1000
+            ).isoformat()
+        return attributes
+
+    @property
+    def icon(self):
+        """Return the class of this sensor."""
+        return "mdi:chart-timeline-variant"
+
+
+class IndicatorSensor(Entity):
+    """Representation of a technical indicator sensor."""
+
+    def __init__(self, engine, key, unique_id_suffix=""):
+        """Initialize of an indicator sensor."""
+        self._engine = engine
+        self._key = key
+        self._unique_id_suffix = unique_id_suffix
+        self._symbol, self._frequency, self._indicator, self._window = key
+
+    @property
+    def should_poll(self):
+        """Return False, values are pushed by the indicator engine."""
+        return False
+
+    @property
+    def _value(self):
+        """Return the value and attributes of this indicator."""
+        return self._engine.values.get(self._key, (None, {}))
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        value = self._value[0]
+        return None if value is None else round(value, 4)
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        name = f"{self._symbol} {self._frequency} {self._indicator.upper()}"
+        if self._window is not None:
+            name = f"{name} {self._window}"
+        return name
+
+    @property
+    def unique_id(self):
+        """Return the unique_id of the sensor."""
+        return (
+            f"{DOMAIN}.indicator_{format_indicator_option(self._key)}"
+            f"{self._unique_id_suffix}"
+        )
+
+    @property
+    def available(self):
+        """Return the availability of the sensor."""
+        return self._value[0] is not None
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit_of_measurement of the device."""
+        return INDICATORS[self._indicator].unit
+
+    @property
+    def extra_state_attributes(self):
+        """Return device specific state attributes."""
+        attributes = {
+            SYMBOL: self._symbol,
+            "frequency": self._frequency,
+            "indicator": self._indicator,
+            "window": self._window,
+        }
+        attributes.update(
+            (name, round(value, 4)) for name, value in self._value[1].items()
+        )
+        return attributes
+
+    @property
+    def icon(self):
+        """Return the class of this sensor."""
+        return "mdi:chart-bell-curve-cumulative"
+
+    async def async_added_to_hass(self):
+        """Subscribe to updates of this indicator."""
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_INDICATOR_UPDATE.format(format_indicator_option(self._key)),
+                self.async_write_ha_state,
             )
-            self._interval = timedelta(seconds=OPEN_SCAN_INTERVAL)
-            self._remove_update_interval()
-            self._remove_update_interval = async_track_time_interval(
-                self.hass, self.async_schedule_update, self._interval
+        )
+
+
+class OptionContractSensor(CoordinatorEntity):
+    """Representation of an option contract sensor."""
+
+    ATTRIBUTES = [
+        "underlying",
+        "put_call",
+        "strike",
+        "expiration",
+        "days_to_expiration",
+        "bid",
+        "ask",
+        "last",
+        "volume",
+        "open_interest",
+        "volatility",
+        "delta",
+        "gamma",
+        "theta",
+        "vega",
+        "rho",
+    ]
+
+    def __init__(self, coordinator, symbol, unique_id_suffix=""):
+        """Initialize of an option contract sensor."""
+        super().__init__(coordinator)
+        self._symbol = symbol
+        self._unique_id_suffix = unique_id_suffix
+
+    @property
+    def _contract(self):
+        """Return this contract from the coordinator data."""
+        if not self.coordinator.data:
+            return None
+        return self.coordinator.data.get(self._symbol)
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        contract = self._contract
+        return None if contract is None else contract["mark"]
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._symbol} Option"
+
+    @property
+    def unique_id(self):
+        """Return the unique_id of the sensor."""
+        return f"{DOMAIN}.option_{self._symbol}{self._unique_id_suffix}"
+
+    @property
+    def available(self):
+        """Return the availability of the sensor."""
+        return self.coordinator.last_update_success and self._contract is not None
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit_of_measurement of the device."""
+        return "Dollars"
+
+    @property
+    def extra_state_attributes(self):
+        """Return device specific state attributes."""
+        contract = self._contract or {}
+        attributes = {SYMBOL: self._symbol}
+        attributes.update((key, contract.get(key)) for key in self.ATTRIBUTES)
+        if self.coordinator.stale:
+            attributes["stale"] = True
+        return attributes
+
+    @property
+    def icon(self):
+        """Return the class of this sensor."""
+        return "mdi:chart-box-outline"
+
+
+class RequestsSensor(Entity):
+    """Representation of the API request counters, for debugging."""
+
+    def __init__(self, client, entry_id):
+        """Initialize of a requests sensor."""
+        self._name = "API Requests"
+        self._client = client
+        self._entry_id = entry_id
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return self._client.metrics.totals["requests"]
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"TDAmeritrade {self._name}"
+
+    @property
+    def unique_id(self):
+        """Return the unique_id of the sensor."""
+        return f"{DOMAIN}.requests_{self._entry_id}"
+
+    @property
+    def entity_category(self):
+        """Return the category of the sensor."""
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit_of_measurement of the device."""
+        return "requests"
+
+    @property
+    def extra_state_attributes(self):
+        """Return the counters of each endpoint."""
+        attributes = dict(self._client.metrics.totals)
+        for name, metrics in self._client.metrics.as_dict().items():
+            attributes[name] = {
+                key: metrics[key]
+                for key in (
+                    "calls",
+                    "requests",
+                    "errors",
+                    "throttled",
+                    "p50_latency",
+                    "p95_latency",
+                )
+            }
+        attributes["limiter"] = self._client.limiter.metrics
+        attributes["token_refresh"] = self._client.auth.metrics
+        return attributes
+
+    @property
+    def icon(self):
+        """Return the class of this sensor."""
+        return "mdi:counter"
+
+
+class PortfolioSensor(Entity):
+    """Representation of a total across the accounts of a login."""
+
+    def __init__(self, portfolio, entry_id, kind, unique_id_suffix=""):
+        """Initialize of a portfolio sensor."""
+        self._portfolio = portfolio
+        self._entry_id = entry_id
+        self._kind = kind
+        self._name, self._icon = PORTFOLIO_SENSORS[kind]
+        self._unique_id_suffix = unique_id_suffix
+
+    @property
+    def should_poll(self):
+        """Return False, totals are pushed as accounts update."""
+        return False
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return round(self._portfolio.totals[self._kind], 2)
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"Portfolio {self._name}"
+
+    @property
+    def unique_id(self):
+        """Return the unique_id of the sensor."""
+        return f"{DOMAIN}.portfolio_{self._kind}{self._unique_id_suffix}"
+
+    @property
+    def available(self):
+        """Return the availability of the sensor."""
+        return self._portfolio.loaded
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit_of_measurement of the device."""
+        return "Dollars"
+
+    @property
+    def icon(self):
+        """Return the class of this sensor."""
+        return self._icon
+
+    async def async_added_to_hass(self):
+        """Subscribe to portfolio updates."""
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_PORTFOLIO_UPDATE.format(self._entry_id),
+                self.async_write_ha_state,
             )
+        )
+
+
+class PortfolioAllocationSensor(PortfolioSensor):
+    """Representation of the allocation of a portfolio by asset type.
+
+    The state is the largest asset type, the attributes the percentage of
+    the liquidation value in each asset type, cash included.
+    """
+
+    def __init__(self, portfolio, entry_id, unique_id_suffix=""):
+        """Initialize of a portfolio allocation sensor."""
+        super().__init__(portfolio, entry_id, LIQUIDATION_VALUE, unique_id_suffix)
+        self._name = "Allocation"
+        self._icon = "mdi:chart-pie"
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        allocation = self._portfolio.allocation
+        if not allocation:
+            return None
+        return max(allocation, key=allocation.get)
+
+    @property
+    def unique_id(self):
+        """Return the unique_id of the sensor."""
+        return f"{DOMAIN}.portfolio_allocation{self._unique_id_suffix}"
+
+    @property
+    def unit_of_measurement(self):
+        """Return None, the state is an asset type."""
+        return None
+
+    @property
+    def extra_state_attributes(self):
+        """Return the percentage in each asset type."""
+        total = self._portfolio.totals[LIQUIDATION_VALUE]
+        if not total:
+            return {}
+        return {
+            asset_type: round(value / total * 100, 2)
+            for asset_type, value in sorted(self._portfolio.allocation.items())
+        }
@@ -0,0 +1,330 @@
+"""Services of the TDAmeritrade integration.
+
+The services are registered once and shared by every config entry.  Calls
+for an account are routed to the entry whose login holds it; market data
+calls go to the entry of the optional account_id, or to any entry.
+"""
+import asyncio
+import logging
+import time
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.util import dt
+
+from .chains import GET_OPTION_CHAIN_SCHEMA, GET_OPTION_CONTRACTS_SCHEMA
+from .history import FREQUENCIES
+from .orders import PLACE_ORDERS_SCHEMA
+from .timeseries import RESOLUTIONS, SERIES_NAME
+from .const import (
+    DOMAIN,
+    CONF_ACCOUNTS,
+    CLIENT,
+    COORDINATOR,
+    QUOTE_CACHE,
+    QUOTE_STATES,
+    ORDER_SUBMITTER,
+    ORDER_TRACKER,
+    PRICE_HISTORY,
+    OPTION_CHAINS,
+    EVENT_ORDERS_PLACED,
+    EVENT_PRICE_HISTORY,
+    EVENT_OPTION_CHAIN,
+    EVENT_OPTION_CONTRACTS,
+    SIGNAL_QUOTE_UPDATE,
+    TIMESERIES,
+    EVENT_HISTORY,
+)
+
+ACCOUNT_ID = {vol.Optional("account_id"): cv.string}
+
+GET_PRICE_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required("symbol"): vol.Any(cv.string, [cv.string]),
+        vol.Optional("frequency", default="daily"): vol.All(
+            vol.Lower, vol.In(FREQUENCIES)
+        ),
+        vol.Optional("days"): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        **ACCOUNT_ID,
+    }
+)
+
+GET_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required("series"): vol.All(
+            cv.ensure_list, [vol.All(cv.string, vol.Match(SERIES_NAME))]
+        ),
+        vol.Optional("start"): cv.datetime,
+        vol.Optional("end"): cv.datetime,
+        vol.Optional("resolution"): vol.In(list(RESOLUTIONS)),
+        vol.Optional("max_points", default=1000): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+    }
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _parse_symbols(symbols):
+    """Return the symbols of a list or comma separated string, upper cased."""
+    if not isinstance(symbols, list):
+        symbols = str(symbols).split(",")
+    return [x.strip().upper() for x in symbols if x.strip()]
+
+
+def _timestamp(value, default):
+    """Return a datetime from a service call as a timestamp."""
+    if value is None:
+        return default
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.DEFAULT_TIME_ZONE)
+    return int(value.timestamp())
+
+
+def async_get_entry_data(hass: HomeAssistant, account_id=None):
+    """Return the data of the loaded entry an account belongs to.
+
+    Without an account_id, or with only one entry loaded, any loaded entry
+    will do.
+    """
+    entries = [
+        hass.data[DOMAIN][entry.entry_id]
+        for entry in hass.config_entries.async_entries(DOMAIN)
+        if entry.entry_id in hass.data.get(DOMAIN, {})
+    ]
+    if not entries:
+        raise HomeAssistantError("No TDAmeritrade login is set up")
+    if account_id is None or len(entries) == 1:
+        return entries[0]
+    account_id = str(account_id)
+    for data in entries:
+        if account_id in (data[CONF_ACCOUNTS] or []) or account_id in (
+            data[COORDINATOR].data or {}
+        ):
+            return data
+    raise HomeAssistantError(f"Account {account_id} is not set up")
+
+
+def async_setup_services(hass: HomeAssistant):
+    """Register the services of the integration."""
+
+    async def place_order_service(call):
+        """Handle a place trade service call."""
+
+        price = call.data["price"]
+        instruction = call.data["instruction"]
+        quantity = call.data["quantity"]
+        symbol = call.data["symbol"]
+        account_id = call.data["account_id"]
+        order_type = call.data["order_type"]
+        session = call.data["session"]
+        duration = call.data["duration"]
+        order_strategy_type = call.data["orderStrategyType"]
+        asset_type = call.data["assetType"]
+
+        data = async_get_entry_data(hass, account_id)
+        order_id = await data[CLIENT].async_place_order(
+            price,
+            instruction,
+            quantity,
+            symbol,
+            account_id,
+            order_type=order_type,
+            session=session,
+            duration=duration,
+            orderStrategyType=order_strategy_type,
+            assetType=asset_type,
+        )
+        data[ORDER_TRACKER].async_track(account_id, order_id)
+        return {"order_id": order_id}
+
+    async def place_orders_service(call):
+        """Handle a place orders service call."""
+        orders = call.data["orders"]
+        submitters = [
+            async_get_entry_data(hass, order["account_id"])[ORDER_SUBMITTER]
+            for order in orders
+        ]
+        results = list(
+            await asyncio.gather(
+                *[
+                    submitter.async_place_order(order)
+                    for submitter, order in zip(submitters, orders)
+                ]
+            )
+        )
+        hass.bus.async_fire(EVENT_ORDERS_PLACED, {"results": results})
+        return {"results": results}
+
+    async def get_quote_service(call):
+        """Handle a get quote service call."""
+        symbols = _parse_symbols(call.data["symbol"])
+        data = async_get_entry_data(hass, call.data.get("account_id"))
+        res = await data[QUOTE_CACHE].async_get_quotes(symbols)
+
+        quotes = {}
+        for symbol in symbols:
+            if symbol not in res:
+                _LOGGER.warning("No quote returned for %s", symbol)
+                continue
+            # Quote sensors throttle their own writes.
+            async_dispatcher_send(hass, SIGNAL_QUOTE_UPDATE.format(symbol), res[symbol])
+            data[QUOTE_STATES].async_write(symbol, res[symbol])
+            quotes[symbol] = res[symbol]
+
+        return {"quotes": quotes}
+
+    async def get_price_history_service(call):
+        """Handle a get price history service call."""
+        symbols = _parse_symbols(call.data["symbol"])
+        frequency = call.data["frequency"]
+        price_history = async_get_entry_data(hass, call.data.get("account_id"))[
+            PRICE_HISTORY
+        ]
+        results = await asyncio.gather(
+            *[
+                price_history.async_update(symbol, frequency, call.data.get("days"))
+                for symbol in symbols
+            ],
+            return_exceptions=True,
+        )
+
+        summaries = []
+        for symbol, candles in zip(symbols, results):
+            if isinstance(candles, Exception):
+                _LOGGER.warning("Failed to get price history for %s: %s", symbol, candles)
+                continue
+            summary = {"symbol": symbol, "frequency": frequency, "candles": len(candles)}
+            if len(candles):
+                summary.update(
+                    first=int(candles["datetime"][0]),
+                    last=int(candles["datetime"][-1]),
+                    close=float(candles["close"][-1]),
+                )
+            summaries.append(summary)
+        hass.bus.async_fire(EVENT_PRICE_HISTORY, {"results": summaries})
+        return {"results": summaries}
+
+    async def get_option_chain_service(call):
+        """Handle a get option chain service call."""
+        option_chains = async_get_entry_data(hass, call.data.get("account_id"))[
+            OPTION_CHAINS
+        ]
+        chain = await option_chains.async_fetch(
+            call.data["symbol"],
+            contract_type=call.data["contract_type"],
+            strike_count=call.data.get("strike_count"),
+            strike_range=call.data["strike_range"],
+            from_date=call.data.get("from_date"),
+            to_date=call.data.get("to_date"),
+        )
+        hass.bus.async_fire(EVENT_OPTION_CHAIN, chain.summary)
+        return chain.summary
+
+    async def get_option_contracts_service(call):
+        """Handle a get option contracts service call."""
+        symbol = call.data["symbol"]
+        option_chains = async_get_entry_data(hass, call.data.get("account_id"))[
+            OPTION_CHAINS
+        ]
+        chain = option_chains.chain(symbol)
+        if chain is None:
+            chain = await option_chains.async_fetch(
+                symbol,
+                contract_type=call.data["contract_type"],
+                from_date=call.data.get("expiration"),
+                to_date=call.data.get("expiration"),
+            )
+        if call.data.get("contracts"):
+            contracts = [chain.contract(x) for x in call.data["contracts"]]
+            contracts = [x for x in contracts if x is not None]
+        else:
+            contracts = chain.query(
+                contract_type=call.data["contract_type"],
+                expiration=call.data.get("expiration"),
+                min_strike=call.data.get("min_strike"),
+                max_strike=call.data.get("max_strike"),
+            )
+        result = {"symbol": symbol, "contracts": contracts}
+        hass.bus.async_fire(EVENT_OPTION_CONTRACTS, result)
+        return result
+
+    async def get_history_service(call):
+        """Handle a get history service call."""
+        store = hass.data[DOMAIN][TIMESERIES]
+        now = int(time.time())
+        end = _timestamp(call.data.get("end"), now)
+        start = _timestamp(call.data.get("start"), end - 86400)
+        results = []
+        for series in call.data["series"]:
+            resolution, records = await store.async_query(
+                series,
+                start,
+                end,
+                call.data.get("resolution"),
+                call.data["max_points"],
+            )
+            results.append(
+                {
+                    "series": series,
+                    "resolution": resolution,
+                    "points": [list(record) for record in records.tolist()],
+                }
+            )
+        hass.bus.async_fire(EVENT_HISTORY, {"results": results})
+        return {"results": results}
+
+    # Every service also returns its result when called with a response.
+    _LOGGER.debug("Registering Services")
+    hass.services.async_register(
+        DOMAIN,
+        "place_order",
+        place_order_service,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "place_orders",
+        place_orders_service,
+        schema=PLACE_ORDERS_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "get_quote",
+        get_quote_service,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "get_price_history",
+        get_price_history_service,
+        schema=GET_PRICE_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "get_option_chain",
+        get_option_chain_service,
+        schema=GET_OPTION_CHAIN_SCHEMA.extend(ACCOUNT_ID),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "get_option_contracts",
+        get_option_contracts_service,
+        schema=GET_OPTION_CONTRACTS_SCHEMA.extend(ACCOUNT_ID),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "get_history",
+        get_history_service,
+        schema=GET_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
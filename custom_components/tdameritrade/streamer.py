@@ -0,0 +1,220 @@
+"""Streaming quotes from the TDAmeritrade WebSocket streamer."""
+import asyncio
+import json
+import logging
+import random
+
+from urllib.parse import urlencode
+
+from aiohttp import WSMsgType
+from aiohttp.client_exceptions import ClientError
+
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.util import dt
+
+from .const import DOMAIN, SIGNAL_QUOTE_UPDATE
+
+LEVELONE_EQUITIES = "LEVELONE_EQUITIES"
+
+# Streamer field numbers mapped to the names used by the REST quote endpoint.
+LEVELONE_FIELDS = {
+    "1": "bidPrice",
+    "2": "askPrice",
+    "3": "lastPrice",
+    "4": "bidSize",
+    "5": "askSize",
+    "8": "totalVolume",
+    "9": "lastSize",
+    "12": "highPrice",
+    "13": "lowPrice",
+    "15": "closePrice",
+    "28": "openPrice",
+    "29": "netChange",
+    "30": "52WkHigh",
+    "31": "52WkLow",
+}
+
+RECONNECT_MIN = 1
+RECONNECT_MAX = 300
+HEARTBEAT = 30
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class StreamerError(Exception):
+    """Raised when the streamer rejects a request."""
+
+
+class QuoteStreamer:
+    """Keep a LEVELONE_EQUITIES subscription open for a watchlist."""
+
+    def __init__(self, hass, client, symbols):
+        """Initialize the quote streamer."""
+        self._hass = hass
+        self._client = client
+        self._symbols = [symbol.upper() for symbol in symbols]
+        self._quotes = {}
+        self._task = None
+        self._request_id = 0
+        self._delay = RECONNECT_MIN
+
+    @property
+    def symbols(self):
+        """Return the subscribed symbols."""
+        return self._symbols
+
+    @property
+    def quotes(self):
+        """Return the latest quote received for each symbol."""
+        return self._quotes
+
+    def async_start(self):
+        """Start streaming in the background."""
+        if self._task is None and self._symbols:
+            self._task = self._hass.async_create_background_task(
+                self._async_run(), f"{DOMAIN} quote streamer"
+            )
+
+    async def async_stop(self):
+        """Stop streaming."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _async_run(self):
+        """Connect, and reconnect with backoff whenever the stream drops."""
+        while True:
+            try:
+                await self._async_stream()
+                _LOGGER.debug("Streamer closed the connection")
+            except (
+                ClientError,
+                asyncio.TimeoutError,
+                StreamerError,
+                KeyError,
+                ValueError,
+            ) as error:
+                _LOGGER.warning("Streamer error: %s", error)
+            except Exception:  # pylint: disable=broad-except
+                # A malformed frame must not end the reconnect loop.
+                _LOGGER.exception("Unexpected streamer error")
+            wait = self._delay * (1 + random.random())
+            _LOGGER.debug("Reconnecting to streamer in %.1f seconds", wait)
+            await asyncio.sleep(wait)
+            self._delay = min(self._delay * 2, RECONNECT_MAX)
+
+    async def _async_stream(self):
+        """Log in, subscribe and dispatch updates until the socket closes."""
+        principals = await self._client.async_get_user_principals(
+            "streamerSubscriptionKeys,streamerConnectionInfo"
+        )
+        info = principals["streamerInfo"]
+        account = principals["accounts"][0]
+        url = f"wss://{info['streamerSocketUrl']}/ws"
+
+        async with self._client.auth.websession.ws_connect(
+            url, heartbeat=HEARTBEAT
+        ) as websocket:
+            await websocket.send_str(
+                self._request(info, account, "ADMIN", "LOGIN", self._login(info, account))
+            )
+            await self._async_wait_login(websocket)
+            _LOGGER.debug("Logged in to streamer, subscribing to %s", self._symbols)
+            self._delay = RECONNECT_MIN
+            await websocket.send_str(
+                self._request(
+                    info,
+                    account,
+                    LEVELONE_EQUITIES,
+                    "SUBS",
+                    {
+                        "keys": ",".join(self._symbols),
+                        "fields": ",".join(["0", *LEVELONE_FIELDS]),
+                    },
+                )
+            )
+            async for msg in websocket:
+                if msg.type == WSMsgType.TEXT:
+                    try:
+                        self._handle_message(json.loads(msg.data))
+                    except (ValueError, KeyError, TypeError, AttributeError) as error:
+                        _LOGGER.warning("Skipping malformed message: %s", error)
+                elif msg.type == WSMsgType.ERROR:
+                    raise StreamerError(websocket.exception())
+
+    async def _async_wait_login(self, websocket):
+        """Wait for the LOGIN response."""
+        async for msg in websocket:
+            if msg.type != WSMsgType.TEXT:
+                break
+            for response in json.loads(msg.data).get("response", []):
+                if response.get("command") == "LOGIN":
+                    content = response.get("content", {})
+                    if content.get("code") != 0:
+                        raise StreamerError(content.get("msg"))
+                    return
+        raise StreamerError("Connection closed before login completed")
+
+    def _request(self, info, account, service, command, parameters):
+        """Build a streamer request."""
+        self._request_id += 1
+        return json.dumps(
+            {
+                "requests": [
+                    {
+                        "service": service,
+                        "command": command,
+                        "requestid": self._request_id,
+                        "account": account["accountId"],
+                        "source": info["appId"],
+                        "parameters": parameters,
+                    }
+                ]
+            }
+        )
+
+    @staticmethod
+    def _login(info, account):
+        """Build the LOGIN parameters from the user principals."""
+        timestamp = dt.parse_datetime(info["tokenTimestamp"])
+        credentials = {
+            "userid": account["accountId"],
+            "token": info["token"],
+            "company": account["company"],
+            "segment": account["segment"],
+            "cddomain": account["accountCdDomainId"],
+            "usergroup": info["userGroup"],
+            "accesslevel": info["accessLevel"],
+            "authorized": "Y",
+            "timestamp": int(timestamp.timestamp() * 1000),
+            "appid": info["appId"],
+            "acl": info["acl"],
+        }
+        return {
+            "credential": urlencode(credentials),
+            "token": info["token"],
+            "version": "1.0",
+        }
+
+    def _handle_message(self, payload):
+        """Merge LEVELONE_EQUITIES deltas and notify the quote entities."""
+        for data in payload.get("data", []):
+            if data.get("service") != LEVELONE_EQUITIES:
+                continue
+            for content in data.get("content", []):
+                symbol = content.get("key")
+                if symbol is None:
+                    continue
+                quote = self._quotes.setdefault(symbol, {"symbol": symbol})
+                for field, value in content.items():
+                    name = LEVELONE_FIELDS.get(field)
+                    if name is not None:
+                        quote[name] = value
+                async_dispatcher_send(
+                    self._hass, SIGNAL_QUOTE_UPDATE.format(symbol), quote
+                )
@@ -0,0 +1,281 @@
+"""Local time series of balances and prices for the TDAmeritrade integration."""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+
+from datetime import timedelta
+
+import numpy as np
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .const import (
+    DOMAIN,
+    SECURITIES_ACCOUNT,
+    TYPE,
+    MARGIN,
+    CASH,
+    CURRENT_BALANCES,
+    AVAILABLE_FUNDS,
+    CASH_AVAILABLE_FOR_TRADEING,
+    SIGNAL_QUOTE_UPDATE,
+    TIMESERIES_FLUSH_INTERVAL,
+    TIMESERIES_COMPACT_INTERVAL,
+)
+
+RECORD_DTYPE = np.dtype([("timestamp", "<i8"), ("value", "<f8")])
+
+RAW = "raw"
+# Resolution: (bucket seconds, seconds kept before rolling into the next)
+RESOLUTIONS = {
+    RAW: (0, 86400),
+    "1m": (60, 7 * 86400),
+    "1h": (3600, 90 * 86400),
+    "1d": (86400, None),
+}
+
+SERIES_NAME = re.compile(r"^[A-Za-z0-9_.$/-]+$")
+UNSAFE_CHARACTERS = re.compile(r"[^A-Za-z0-9_]+")
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def file_name(series):
+    """Return the file name of a series, without the resolution.
+
+    Series with characters other than letters, digits and underscores,
+    like $SPX.X or BRK/B, are named with those replaced and a hash of the
+    series after a dash, so they can't leave the directory or collide.
+    """
+    name = UNSAFE_CHARACTERS.sub("_", series)
+    if name != series:
+        name = f"{name}-{hashlib.sha256(series.encode()).hexdigest()[:8]}"
+    return name
+
+
+def downsample(records, bucket):
+    """Return the last record of each bucket, timestamped at its start."""
+    if not bucket or not len(records):
+        return records
+    buckets = records["timestamp"] // bucket * bucket
+    last = np.flatnonzero(np.append(buckets[1:] != buckets[:-1], True))
+    result = records[last].copy()
+    result["timestamp"] = buckets[last]
+    return result
+
+
+class TimeSeriesStore:
+    """Keep (timestamp, value) series in append-only files under .storage.
+
+    Each series has a file per resolution of fixed-width records.  New
+    records are buffered and appended in batches in the executor, and
+    records older than a resolution's retention are rolled up into the
+    buckets of the next one, so every point in time is in one file.
+    """
+
+    def __init__(self, hass):
+        """Initialize the time series store."""
+        self._hass = hass
+        self._path = hass.config.path(STORAGE_DIR, f"{DOMAIN}_timeseries")
+        self._pending = {}
+        self._last = {}
+        self._lock = asyncio.Lock()
+        self._compacted = time.monotonic()
+        self._unsubs = []
+
+    @callback
+    def async_start(self):
+        """Flush the buffered records periodically and when HA stops."""
+        self._unsubs.append(
+            async_track_time_interval(
+                self._hass,
+                self.async_flush,
+                timedelta(seconds=TIMESERIES_FLUSH_INTERVAL),
+            )
+        )
+        self._unsubs.append(
+            self._hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self.async_flush)
+        )
+
+    @callback
+    def async_stop(self):
+        """Stop flushing."""
+        while self._unsubs:
+            self._unsubs.pop()()
+
+    @callback
+    def async_record(self, series, value, timestamp=None):
+        """Buffer a value, unless it is the series' last one."""
+        if not isinstance(value, (int, float)) or self._last.get(series) == value:
+            return
+        self._last[series] = value
+        self._pending.setdefault(series, []).append(
+            (int(timestamp or time.time()), value)
+        )
+
+    async def async_flush(self, _now=None):
+        """Write the buffered records, rolling up old ones once in a while.
+
+        The buffer is swapped out under the lock, so a query sees the
+        records either in the buffer or in the files.
+        """
+        async with self._lock:
+            compact = time.monotonic() - self._compacted >= TIMESERIES_COMPACT_INTERVAL
+            if not self._pending and not compact:
+                return
+            pending, self._pending = self._pending, {}
+            if compact:
+                self._compacted = time.monotonic()
+            await self._hass.async_add_executor_job(
+                self._write, pending, compact, int(time.time())
+            )
+
+    async def async_query(self, series, start, end, resolution=None, max_points=None):
+        """Return the (resolution, records) of a series between two timestamps.
+
+        Without a resolution the finest one giving at most max_points
+        records is used.
+        """
+        async with self._lock:
+            pending = list(self._pending.get(series, []))
+            records = await self._hass.async_add_executor_job(
+                self._read_range, series, start, end, pending
+            )
+        if resolution is None:
+            resolution = RAW
+            for name, (bucket, _) in RESOLUTIONS.items():
+                resolution = name
+                if not max_points or len(downsample(records, bucket)) <= max_points:
+                    break
+        return resolution, downsample(records, RESOLUTIONS[resolution][0])
+
+    def _file(self, name, resolution):
+        """Return the path of a series file name at a resolution."""
+        return os.path.join(self._path, f"{name}.{resolution}")
+
+    def _read(self, name, resolution):
+        """Read a series file."""
+        try:
+            return np.fromfile(self._file(name, resolution), dtype=RECORD_DTYPE)
+        except FileNotFoundError:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+    def _append(self, name, resolution, records):
+        """Append records to a series file."""
+        with open(self._file(name, resolution), "ab") as file:
+            records.tofile(file)
+
+    def _rewrite(self, name, resolution, records):
+        """Replace a series file atomically."""
+        path = self._file(name, resolution)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            records.tofile(file)
+        os.replace(tmp_path, path)
+
+    def _write(self, pending, compact, now):
+        """Append the pending records, then roll up the old ones."""
+        os.makedirs(self._path, exist_ok=True)
+        for series, rows in pending.items():
+            self._append(file_name(series), RAW, np.array(rows, dtype=RECORD_DTYPE))
+        if not compact:
+            return
+        for file in os.listdir(self._path):
+            name, _, resolution = file.rpartition(".")
+            if resolution == RAW:
+                self._compact(name, now)
+
+    def _compact(self, name, now):
+        """Roll records past each resolution's retention into the next."""
+        resolutions = list(RESOLUTIONS.items())
+        for (finer, (_, keep)), (coarser, (bucket, _)) in zip(
+            resolutions, resolutions[1:]
+        ):
+            records = self._read(name, finer)
+            # Only whole buckets of the coarser resolution are rolled up.
+            cutoff = (now - keep) // bucket * bucket
+            old = records["timestamp"] < cutoff
+            if not old.any():
+                continue
+            self._append(name, coarser, downsample(records[old], bucket))
+            self._rewrite(name, finer, records[~old])
+            _LOGGER.debug(
+                "Rolled %s %s records of %s into %s", old.sum(), finer, name, coarser
+            )
+
+    def _read_range(self, series, start, end, pending):
+        """Return the records of a series between two timestamps."""
+        name = file_name(series)
+        parts = [self._read(name, resolution) for resolution in reversed(RESOLUTIONS)]
+        parts.append(np.array(pending, dtype=RECORD_DTYPE))
+        records = np.concatenate(parts)
+        records = records[
+            (records["timestamp"] >= start) & (records["timestamp"] <= end)
+        ]
+        return np.sort(records, order="timestamp", kind="stable")
+
+
+class TimeSeriesRecorder:
+    """Record the balances of a login's accounts and its watchlist prices."""
+
+    def __init__(self, hass, store, coordinator, symbols):
+        """Initialize the recorder."""
+        self._hass = hass
+        self._store = store
+        self._coordinator = coordinator
+        self._symbols = symbols
+        self._unsubs = []
+
+    @callback
+    def async_start(self):
+        """Listen for account updates and quotes."""
+        self._unsubs.append(
+            self._coordinator.async_add_listener(self._async_handle_accounts)
+        )
+        for symbol in self._symbols:
+            self._unsubs.append(
+                async_dispatcher_connect(
+                    self._hass,
+                    SIGNAL_QUOTE_UPDATE.format(symbol),
+                    self._async_handle_quote,
+                )
+            )
+
+    @callback
+    def async_stop(self):
+        """Stop listening."""
+        while self._unsubs:
+            self._unsubs.pop()()
+
+    @callback
+    def _async_handle_accounts(self):
+        """Record the balances of every account."""
+        if self._coordinator.stale:
+            return
+        for account_id, resp in (self._coordinator.data or {}).items():
+            account = resp[SECURITIES_ACCOUNT]
+            balances = account.get(CURRENT_BALANCES, {})
+            self._store.async_record(
+                f"{account_id}_liquidation_value", balances.get("liquidationValue")
+            )
+            if account.get(TYPE) == MARGIN:
+                available = balances.get(AVAILABLE_FUNDS)
+            elif account.get(TYPE) == CASH:
+                available = balances.get(CASH_AVAILABLE_FOR_TRADEING)
+            else:
+                continue
+            self._store.async_record(f"{account_id}_available_funds", available)
+
+    @callback
+    def _async_handle_quote(self, quote):
+        """Record the last price of a symbol."""
+        symbol = quote.get("symbol")
+        if symbol:
+            self._store.async_record(symbol, quote.get("lastPrice"))
@@ -0,0 +1,47 @@
+"""Symbols imported from TDAmeritrade watchlists and market movers."""
+from .const import INSTRUMENT, SYMBOL
+
+MOVERS_INDEXES = ["$COMPX", "$DJI", "$SPX.X"]
+MOVERS_DIRECTIONS = ["up", "down"]
+
+
+def parse_movers_option(value):
+    """Return the (index, direction) of INDEX or INDEX:direction.
+
+    Without a direction both the top gainers and losers are imported.
+    """
+    index, _, direction = value.partition(":")
+    index = index.strip().upper()
+    direction = direction.strip().lower() or None
+    if index not in MOVERS_INDEXES:
+        raise ValueError(f"Unknown movers index {index}")
+    if direction is not None and direction not in MOVERS_DIRECTIONS:
+        raise ValueError(f"Unknown movers direction {direction}")
+    return index, direction
+
+
+def format_movers_option(key):
+    """Return the option string of a movers key."""
+    index, direction = key
+    return f"{index}:{direction}" if direction else index
+
+
+def add_watchlist_symbols(symbols, watchlists):
+    """Add the symbols of watchlist responses to a symbol: sources dict."""
+    for watchlist in watchlists or []:
+        source = f"watchlist {watchlist.get('name', watchlist.get('watchlistId'))}"
+        for item in watchlist.get("watchlistItems", []):
+            symbol = item.get(INSTRUMENT, {}).get(SYMBOL)
+            if symbol:
+                symbols.setdefault(symbol.upper(), []).append(source)
+    return symbols
+
+
+def add_movers_symbols(symbols, key, movers):
+    """Add the symbols of a movers response to a symbol: sources dict."""
+    source = f"{format_movers_option(key)} movers"
+    for mover in movers or []:
+        symbol = mover.get(SYMBOL)
+        if symbol:
+            symbols.setdefault(symbol.upper(), []).append(source)
+    return symbols
@@ -0,0 +1,48 @@
+"""Tests for the alert threshold index."""
+from custom_components.tdameritrade.alerts import ThresholdIndex
+
+
+def test_first_value_crosses_nothing():
+    """The first value only sets the starting point."""
+    index = ThresholdIndex([10, 20])
+    assert index.update(15) == ([], [])
+
+
+def test_crossing_up_and_down():
+    """Thresholds between the last and new value are returned once."""
+    index = ThresholdIndex([30, 10, 20, 20])
+    index.update(5)
+    assert index.update(25) == ([10, 20], [])
+    assert index.update(26) == ([], [])
+    assert index.update(15) == ([], [20])
+    assert index.update(5) == ([], [10])
+
+
+def test_touching_a_threshold():
+    """Reaching a threshold crosses it, leaving it again crosses back."""
+    index = ThresholdIndex([10])
+    index.update(9)
+    assert index.update(10) == ([10], [])
+    assert index.update(10) == ([], [])
+    assert index.update(9.5) == ([], [10])
+    index.update(11)
+    assert index.update(10) == ([], [])
+    assert index.update(11) == ([], [])
+
+
+def test_rearms_after_crossing_back():
+    """A threshold is crossed again only after crossing back."""
+    index = ThresholdIndex([10])
+    index.update(9)
+    assert index.update(11) == ([10], [])
+    assert index.update(12) == ([], [])
+    assert index.update(9) == ([], [10])
+    assert index.update(11) == ([10], [])
+
+
+def test_missing_value_keeps_nothing():
+    """A missing value restarts from the next value."""
+    index = ThresholdIndex([10])
+    index.update(9)
+    assert index.update(None) == ([], [])
+    assert index.update(11) == ([], [])
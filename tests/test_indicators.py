@@ -0,0 +1,208 @@
+"""Tests for the indicators against plain reference computations."""
+import numpy as np
+import pytest
+
+from custom_components.tdameritrade.history import CANDLE_DTYPE
+from custom_components.tdameritrade.indicators import (
+    ATR,
+    EMA,
+    RSI,
+    SMA,
+    VWAP,
+    Bollinger,
+    Indicator,
+    IndicatorEngine,
+)
+
+MINUTE_MS = 60 * 1000
+# 2024-01-02 09:30 America/New_York
+OPEN_MS = 1704205800 * 1000
+
+
+def make_candles(count, start=OPEN_MS, seed=0):
+    """Return count one minute candles of a random walk."""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    candles = np.empty(count, dtype=CANDLE_DTYPE)
+    candles["datetime"] = start + np.arange(count) * MINUTE_MS
+    candles["open"] = close + rng.normal(0, 0.5, count)
+    candles["high"] = np.maximum(close, candles["open"]) + rng.uniform(0, 1, count)
+    candles["low"] = np.minimum(close, candles["open"]) - rng.uniform(0, 1, count)
+    candles["close"] = close
+    candles["volume"] = rng.integers(100, 1000, count)
+    return candles
+
+
+def reference_ewm(values, alpha):
+    """Return the exponentially weighted mean seeded with the first value."""
+    mean = values[0]
+    for value in values[1:]:
+        mean = alpha * value + (1 - alpha) * mean
+    return mean
+
+
+def reference_rsi(closes, window):
+    """Return Wilder's relative strength index of the closes."""
+    gain = loss = None
+    for previous, close in zip(closes, closes[1:]):
+        change = close - previous
+        up, down = max(change, 0), max(-change, 0)
+        if gain is None:
+            gain, loss = up, down
+        else:
+            gain = (up + (window - 1) * gain) / window
+            loss = (down + (window - 1) * loss) / window
+    return 100 - 100 / (1 + gain / loss)
+
+
+def reference_atr(candles, window):
+    """Return Wilder's average true range of the candles."""
+    ranges = [candles["high"][0] - candles["low"][0]]
+    for previous, candle in zip(candles, candles[1:]):
+        ranges.append(
+            max(
+                candle["high"] - candle["low"],
+                abs(candle["high"] - previous["close"]),
+                abs(candle["low"] - previous["close"]),
+            )
+        )
+    return reference_ewm(ranges, 1 / window)
+
+
+def test_sma():
+    """The average of the last window closes, forming bar included."""
+    candles = make_candles(50)
+    value, _ = SMA(20).update(candles)
+    assert value == pytest.approx(candles["close"][-20:].mean())
+
+
+def test_sma_not_enough_bars():
+    """No value until there are window bars."""
+    assert SMA(20).update(make_candles(19)) == (None, {})
+
+
+def test_sma_evaluate_at_price():
+    """A streamed price replaces the close of the forming bar."""
+    candles = make_candles(50)
+    sma = SMA(20)
+    sma.update(candles)
+    value, _ = sma.evaluate(150.0)
+    closes = np.append(candles["close"][-20:-1], 150.0)
+    assert value == pytest.approx(closes.mean())
+
+
+def test_sma_incremental():
+    """Updating with new bars matches computing from scratch."""
+    candles = make_candles(80)
+    sma = SMA(20)
+    sma.update(candles[:40])
+    sma.update(candles[:41])
+    value, _ = sma.update(candles)
+    assert value == pytest.approx(SMA(20).update(candles)[0])
+    assert value == pytest.approx(candles["close"][-20:].mean())
+
+
+def test_bollinger():
+    """Bands two population standard deviations around the average."""
+    candles = make_candles(50)
+    value, attributes = Bollinger(20).update(candles)
+    closes = candles["close"][-20:]
+    width = 2 * np.sqrt(((closes - closes.mean()) ** 2).mean())
+    assert value == pytest.approx(closes.mean())
+    assert attributes["upper"] == pytest.approx(closes.mean() + width)
+    assert attributes["lower"] == pytest.approx(closes.mean() - width)
+
+
+def test_ema():
+    """Seeded with the first close of the lookback."""
+    candles = make_candles(300)
+    ema = EMA(10)
+    value, _ = ema.update(candles)
+    expected = reference_ewm(candles["close"][-101:], 2 / 11)
+    assert value == pytest.approx(expected)
+
+
+def test_ema_incremental():
+    """New bars continue the average from its seed."""
+    candles = make_candles(300)
+    ema = EMA(10)
+    ema.update(candles[:200])
+    value, _ = ema.update(candles)
+    assert value == pytest.approx(reference_ewm(candles["close"][99:], 2 / 11))
+    value, _ = ema.evaluate(150.0)
+    closes = np.append(candles["close"][99:-1], 150.0)
+    assert value == pytest.approx(reference_ewm(closes, 2 / 11))
+
+
+def test_rsi():
+    """Wilder's smoothing of the gains and losses."""
+    candles = make_candles(300)
+    value, _ = RSI(14).update(candles)
+    assert value == pytest.approx(reference_rsi(candles["close"][-141:], 14))
+
+
+def test_rsi_incremental():
+    """New bars continue the averages from their seed."""
+    candles = make_candles(300)
+    rsi = RSI(14)
+    rsi.update(candles[:200])
+    value, _ = rsi.update(candles)
+    assert value == pytest.approx(reference_rsi(candles["close"][59:], 14))
+
+
+def test_rsi_without_losses():
+    """Only gains is an index of 100."""
+    candles = make_candles(50)
+    candles["close"] = np.arange(50, dtype=float)
+    assert RSI(14).update(candles) == (100.0, {})
+
+
+def test_atr():
+    """Wilder's smoothing of the true ranges."""
+    candles = make_candles(300)
+    value, _ = ATR(14).update(candles)
+    assert value == pytest.approx(reference_atr(candles[-141:], 14))
+
+
+def test_vwap_since_the_open():
+    """Only the bars of the current exchange day are averaged."""
+    yesterday = make_candles(30, start=OPEN_MS - 86400 * 1000 + 360 * MINUTE_MS)
+    today = make_candles(60, seed=1)
+    candles = np.concatenate([yesterday, today])
+    value, _ = VWAP().update(candles)
+    typical = (today["high"] + today["low"] + today["close"]) / 3
+    expected = (typical * today["volume"]).sum() / today["volume"].sum()
+    assert value == pytest.approx(expected)
+
+
+def test_vwap_new_day():
+    """The average starts over with the first bar of a new day."""
+    vwap = VWAP()
+    vwap.update(make_candles(60))
+    tomorrow = make_candles(2, start=OPEN_MS + 86400 * 1000, seed=1)
+    value, _ = vwap.update(np.concatenate([make_candles(60), tomorrow]))
+    typical = (tomorrow["high"] + tomorrow["low"] + tomorrow["close"]) / 3
+    expected = (typical * tomorrow["volume"]).sum() / tomorrow["volume"].sum()
+    assert value == pytest.approx(expected)
+
+
+def test_engine_update_leaves_the_state_to_the_loop():
+    """The executor part returns the changed values without storing them."""
+    candles = make_candles(50)
+    engine = IndicatorEngine(None, None, [("SPY", "daily", "sma", 20)])
+    key = ("SPY", "daily", "sma", 20)
+    changed = engine._update({("SPY", "daily"): candles}, {})
+    assert changed == {key: (pytest.approx(candles["close"][-20:].mean()), {})}
+    assert engine.values == {}
+    assert engine._candles == {}
+
+
+def test_indicator_without_evaluate_fails_to_build():
+    """A subclass missing an override can't be created."""
+
+    class Incomplete(Indicator):
+        def _commit(self, bars):
+            """Fold nothing."""
+
+    with pytest.raises(TypeError):
+        Incomplete(20)
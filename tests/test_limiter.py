@@ -0,0 +1,65 @@
+"""Tests for the request limiter."""
+import asyncio
+
+from custom_components.tdameritrade.limiter import RequestLimiter
+
+
+def test_releases_waiters_in_priority_order():
+    """Queued requests get tokens lowest priority number first."""
+
+    async def run():
+        limiter = RequestLimiter(rate=50, burst=1)
+        await limiter.async_acquire(0)
+        order = []
+
+        async def request(priority):
+            await limiter.async_acquire(priority)
+            order.append(priority)
+
+        await asyncio.gather(*(request(priority) for priority in [3, 1, 2, 1]))
+        return order
+
+    assert asyncio.run(run()) == [1, 1, 2, 3]
+
+
+def test_coalesces_calls_sharing_a_key():
+    """Calls with the key of an in-flight call share its result."""
+
+    async def run():
+        limiter = RequestLimiter(rate=50, burst=5)
+        calls = []
+
+        async def func():
+            calls.append(None)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        results = await asyncio.gather(
+            limiter.async_call(1, func, key="quotes"),
+            limiter.async_call(1, func, key="quotes"),
+            limiter.async_call(1, func, key="other"),
+        )
+        return results, len(calls), limiter.metrics["coalesced"]
+
+    results, calls, coalesced = asyncio.run(run())
+    assert results[0] == results[1]
+    assert calls == 2
+    assert coalesced == 1
+
+
+def test_key_is_released_after_the_call():
+    """A key is only coalesced while its call is in flight."""
+
+    async def run():
+        limiter = RequestLimiter(rate=50, burst=5)
+        calls = []
+
+        async def func():
+            calls.append(None)
+            return len(calls)
+
+        first = await limiter.async_call(1, func, key="quotes")
+        second = await limiter.async_call(1, func, key="quotes")
+        return first, second
+
+    assert asyncio.run(run()) == (1, 2)
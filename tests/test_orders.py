@@ -0,0 +1,80 @@
+"""Tests for the order tracker."""
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from homeassistant.util import dt
+
+from custom_components.tdameritrade import orders
+from custom_components.tdameritrade.const import ORDER_ENTERED_SLACK
+from custom_components.tdameritrade.orders import OrderTracker
+
+
+class FakeClient:
+    """Return the orders of an account and record the queries."""
+
+    def __init__(self):
+        """Initialize the client."""
+        self.orders = {}
+        self.queries = []
+
+    async def async_get_orders(self, account_id, from_entered_time=None, status=None):
+        """Return the orders of an account."""
+        self.queries.append((account_id, from_entered_time))
+        return [
+            {"orderId": int(order_id), "status": status}
+            for order_id, status in self.orders.items()
+        ]
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    """Return an order tracker that doesn't schedule its polls."""
+    monkeypatch.setattr(orders, "async_call_later", lambda *args: lambda: None)
+    events = []
+    hass = SimpleNamespace(
+        bus=SimpleNamespace(async_fire=lambda event, data: events.append(data))
+    )
+    tracker = OrderTracker(hass, FakeClient())
+    tracker.events = events
+    return tracker
+
+
+def test_lists_orders_since_the_oldest_tracked_one(tracker):
+    """The window starts at the oldest order still tracked."""
+    client = tracker._client
+    start = dt.utcnow()
+    tracker.async_track("123", "1001")
+    tracker.async_track("123", "1002")
+    tracker.open_orders["1001"]["entered"] = start - timedelta(hours=2)
+    tracker.open_orders["1002"]["entered"] = start - timedelta(hours=1)
+    client.orders = {"1001": "WORKING", "1002": "WORKING"}
+
+    asyncio.run(tracker._async_poll())
+    oldest = (start - timedelta(hours=2)).isoformat(timespec="seconds")
+    assert client.queries[-1] == ("123", oldest)
+
+    client.orders = {"1001": "FILLED", "1002": "WORKING"}
+    asyncio.run(tracker._async_poll())
+    assert "1001" not in tracker.open_orders
+    assert [event["status"] for event in tracker.events] == [
+        "WORKING",
+        "WORKING",
+        "FILLED",
+    ]
+
+    asyncio.run(tracker._async_poll())
+    newer = (start - timedelta(hours=1)).isoformat(timespec="seconds")
+    assert client.queries[-1] == ("123", newer)
+
+
+def test_window_allows_for_clock_skew(tracker):
+    """A new order is listed from a little before it was tracked."""
+    start = dt.utcnow()
+    tracker.async_track("123", "1001")
+    asyncio.run(tracker._async_poll())
+    entered = dt.parse_datetime(tracker._client.queries[-1][1])
+    slack = (start - entered).total_seconds()
+    assert ORDER_ENTERED_SLACK - 1 <= slack <= ORDER_ENTERED_SLACK + 1
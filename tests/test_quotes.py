@@ -0,0 +1,71 @@
+"""Tests for the quote write throttle."""
+import pytest
+
+from custom_components.tdameritrade.quotes import QuoteThrottle, parse_quote_threshold
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("0.05", (0.05, False)),
+        (" 0.5 % ", (0.5, True)),
+        ("", (0.0, False)),
+        (0, (0.0, False)),
+    ],
+)
+def test_parse_quote_threshold(value, expected):
+    """Thresholds are amounts, or percentages with a trailing %."""
+    assert parse_quote_threshold(value) == expected
+
+
+@pytest.mark.parametrize("value", ["abc", "-1", "-1%"])
+def test_parse_quote_threshold_invalid(value):
+    """Malformed and negative thresholds are rejected."""
+    with pytest.raises(ValueError):
+        parse_quote_threshold(value)
+
+
+def test_absolute_threshold():
+    """The field must move by the amount since the last write."""
+    throttle = QuoteThrottle("lastPrice", "0.25", attribute_interval=60)
+    assert throttle.should_write({"lastPrice": 100.0}, 0)
+    assert not throttle.should_write({"lastPrice": 100.125}, 1)
+    assert not throttle.should_write({"lastPrice": 99.875}, 2)
+    assert throttle.should_write({"lastPrice": 100.25}, 3)
+    assert throttle.should_write({"lastPrice": 100.0}, 4)
+
+
+def test_percentage_threshold():
+    """The field must move by the percentage of the last written value."""
+    throttle = QuoteThrottle("lastPrice", "1%", attribute_interval=60)
+    assert throttle.should_write({"lastPrice": 200.0}, 0)
+    assert not throttle.should_write({"lastPrice": 201.9}, 1)
+    assert throttle.should_write({"lastPrice": 202.0}, 2)
+    assert not throttle.should_write({"lastPrice": 200.0}, 3)
+    assert throttle.should_write({"lastPrice": 199.9}, 4)
+
+
+def test_zero_threshold_writes_every_change():
+    """Without a threshold any change of the field is written."""
+    throttle = QuoteThrottle("lastPrice", "0", attribute_interval=60)
+    assert throttle.should_write({"lastPrice": 10.0}, 0)
+    assert not throttle.should_write({"lastPrice": 10.0, "bidPrice": 9.9}, 1)
+    assert throttle.should_write({"lastPrice": 10.01}, 2)
+
+
+def test_attribute_interval():
+    """Other changes are written once the attribute interval has passed."""
+    throttle = QuoteThrottle("lastPrice", "1", attribute_interval=30)
+    assert throttle.should_write({"lastPrice": 10.0}, 100)
+    assert not throttle.should_write({"lastPrice": 10.0, "bidPrice": 9.9}, 110)
+    assert throttle.delay(110) == 20
+    assert throttle.should_write({"lastPrice": 10.0, "bidPrice": 9.9}, 130)
+    assert throttle.delay(200) == 0
+
+
+def test_missing_field():
+    """A field appearing or disappearing counts as a change."""
+    throttle = QuoteThrottle("lastPrice", "1", attribute_interval=60)
+    assert throttle.should_write({}, 0)
+    assert throttle.should_write({"lastPrice": 10.0}, 1)
+    assert throttle.should_write({}, 2)
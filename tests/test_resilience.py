@@ -0,0 +1,80 @@
+"""Tests for the circuit breaker."""
+import pytest
+
+from custom_components.tdameritrade import resilience
+from custom_components.tdameritrade.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Return a list holding the monotonic time seen by the breaker."""
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_at_the_threshold(clock):
+    """The circuit opens after threshold consecutive failures."""
+    breaker = CircuitBreaker("test", threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count(clock):
+    """Only consecutive failures open the circuit."""
+    breaker = CircuitBreaker("test", threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_trial_closes_on_success(clock):
+    """After the reset timeout a single trial call is let through."""
+    breaker = CircuitBreaker("test", threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock[0] += 59
+    assert breaker.state == OPEN
+    clock[0] += 1
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_half_open_trial_reopens_on_failure(clock):
+    """A failed trial call opens the circuit for another reset timeout."""
+    breaker = CircuitBreaker("test", threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock[0] += 60
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.metrics["opens"] == 1
+    clock[0] += 60
+    assert breaker.state == HALF_OPEN
+
+
+def test_cancelled_trial_allows_another(clock):
+    """A cancelled trial call doesn't keep the circuit half open forever."""
+    breaker = CircuitBreaker("test", threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock[0] += 60
+    breaker.before_call()
+    breaker.record_cancelled()
+    breaker.before_call()
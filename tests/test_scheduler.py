@@ -0,0 +1,79 @@
+"""Tests for the market aware account refresh scheduling."""
+import asyncio
+
+import pytest
+
+from custom_components.tdameritrade import scheduler
+from custom_components.tdameritrade.scheduler import ScanScheduler
+
+
+class FakeMarketHours:
+    """Market hours of a day with or without a session."""
+
+    def __init__(self, trading_day):
+        """Initialize the market hours."""
+        self.loaded = True
+        self._trading_day = trading_day
+
+    async def async_refresh(self):
+        """Pretend to fetch the hours."""
+        return True
+
+    def is_trading_day(self):
+        """Return True if the market has a session."""
+        return self._trading_day
+
+    def is_session_open(self, market, now=None):
+        """Return False, no session is in progress."""
+        return False
+
+    def next_transition(self, now=None):
+        """Return None, there are no more boundaries today."""
+        return None
+
+
+class FakeCoordinator:
+    """Count the account refreshes."""
+
+    def __init__(self, data=None):
+        """Initialize the coordinator."""
+        self.data = data
+        self.refreshes = 0
+
+    async def async_refresh(self):
+        """Load the accounts."""
+        self.refreshes += 1
+        self.data = {}
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    """Return the times refreshes were scheduled at."""
+    times = []
+
+    def track(hass, action, point_in_time):
+        times.append(point_in_time)
+        return lambda: None
+
+    monkeypatch.setattr(scheduler, "async_track_point_in_time", track)
+    return times
+
+
+def test_holiday_loads_the_accounts_once(scheduled):
+    """Without data the accounts are refreshed even on a holiday."""
+    coordinator = FakeCoordinator()
+    scan = ScanScheduler(None, coordinator, FakeMarketHours(trading_day=False))
+    asyncio.run(scan._async_refresh())
+    assert coordinator.refreshes == 1
+    asyncio.run(scan._async_refresh())
+    assert coordinator.refreshes == 1
+    assert len(scheduled) == 2
+
+
+def test_trading_day_refreshes(scheduled):
+    """The accounts are refreshed on a trading day."""
+    coordinator = FakeCoordinator(data={})
+    scan = ScanScheduler(None, coordinator, FakeMarketHours(trading_day=True))
+    asyncio.run(scan._async_refresh())
+    asyncio.run(scan._async_refresh())
+    assert coordinator.refreshes == 2
@@ -0,0 +1,114 @@
+"""Tests for the time series compaction."""
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from custom_components.tdameritrade.timeseries import (
+    RAW,
+    RECORD_DTYPE,
+    TimeSeriesStore,
+    downsample,
+    file_name,
+)
+
+DAY = 86400
+# 2024-01-02 00:00 UTC
+NOW = 1704153600
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Return a store writing under tmp_path."""
+    config = SimpleNamespace(path=lambda *parts: os.path.join(tmp_path, *parts))
+    return TimeSeriesStore(SimpleNamespace(config=config))
+
+
+def records(*rows):
+    """Return an array of (timestamp, value) records."""
+    return np.array(list(rows), dtype=RECORD_DTYPE)
+
+
+def test_downsample_keeps_the_last_record_of_each_bucket():
+    """Buckets are timestamped at their start with their last value."""
+    rows = records((0, 1.0), (30, 2.0), (59, 3.0), (60, 4.0), (185, 5.0))
+    result = downsample(rows, 60)
+    assert result.tolist() == [(0, 3.0), (60, 4.0), (180, 5.0)]
+
+
+def test_downsample_raw():
+    """Without a bucket the records are unchanged."""
+    rows = records((0, 1.0), (1, 2.0))
+    assert downsample(rows, 0) is rows
+
+
+def test_compact_rolls_raw_into_minutes(store):
+    """Raw records of whole minutes past a day are rolled into minutes."""
+    start = NOW - DAY - 120
+    store._write(
+        {
+            "price/SPY": [
+                (start, 1.0),
+                (start + 50, 2.0),
+                (start + 60, 3.0),
+                (start + 130, 4.0),
+                (NOW - 10, 5.0),
+            ]
+        },
+        True,
+        NOW,
+    )
+    minutes = store._read(file_name("price/SPY"), "1m")
+    assert minutes.tolist() == [(start, 2.0), (start + 60, 3.0)]
+    raw = store._read(file_name("price/SPY"), RAW)
+    assert raw.tolist() == [(start + 130, 4.0), (NOW - 10, 5.0)]
+
+
+def test_compact_rolls_through_every_resolution(store):
+    """Each resolution's old records roll into the next, kept once."""
+    rows = [
+        (NOW - 200 * DAY, 1.0),
+        (NOW - 200 * DAY + 3600, 2.0),
+        (NOW - 30 * DAY, 3.0),
+        (NOW - 30 * DAY + 60, 4.0),
+        (NOW - 2 * DAY, 5.0),
+        (NOW - 2 * DAY + 30, 6.0),
+        (NOW - 60, 7.0),
+    ]
+    store._write({"balance": rows}, True, NOW)
+    assert store._read(file_name("balance"), "1d").tolist() == [(NOW - 200 * DAY, 2.0)]
+    assert store._read(file_name("balance"), "1h").tolist() == [(NOW - 30 * DAY, 4.0)]
+    assert store._read(file_name("balance"), "1m").tolist() == [(NOW - 2 * DAY, 6.0)]
+    assert store._read(file_name("balance"), RAW).tolist() == [(NOW - 60, 7.0)]
+    everything = store._read_range("balance", 0, NOW, [(NOW, 8.0)])
+    assert everything["value"].tolist() == [2.0, 4.0, 6.0, 7.0, 8.0]
+
+
+def test_compact_is_idempotent(store):
+    """Compacting again moves nothing."""
+    store._write({"balance": [(NOW - 2 * DAY, 1.0), (NOW - 60, 2.0)]}, True, NOW)
+    store._write({}, True, NOW)
+    assert store._read(file_name("balance"), "1m").tolist() == [(NOW - 2 * DAY, 1.0)]
+    assert store._read(file_name("balance"), RAW).tolist() == [(NOW - 60, 2.0)]
+
+
+def test_write_without_compacting(store):
+    """Records are appended to the raw file only."""
+    store._write({"balance": [(NOW - 2 * DAY, 1.0)]}, False, NOW)
+    store._write({"balance": [(NOW - 60, 2.0)]}, False, NOW)
+    assert store._read(file_name("balance"), RAW)["value"].tolist() == [1.0, 2.0]
+    assert not len(store._read(file_name("balance"), "1m"))
+
+
+def test_file_names_stay_apart(store):
+    """Series whose names differ only in unsafe characters don't collide."""
+    names = ["BRK/B", "BRK_B", "BRK.B", "../BRK_B"]
+    assert len({file_name(series) for series in names}) == len(names)
+    assert file_name("123456789_liquidation_value") == "123456789_liquidation_value"
+    for value, series in enumerate(names):
+        store._write({series: [(NOW - 60, float(value))]}, False, NOW)
+    for value, series in enumerate(names):
+        records = store._read_range(series, 0, NOW, [])
+        assert records["value"].tolist() == [float(value)]
+    assert all("/" not in file and ".." not in file for file in os.listdir(store._path))